@@ -0,0 +1,199 @@
+import hashlib
+import marshal
+import os
+import struct
+import sys
+import time
+
+from chip8 import DECODE_CACHE_START, DECODE_CACHE_END
+from disassembler import Disassembler, ENTRY, successors
+from recompiler import Chip8Recompiler, MAX_BLOCK_LENGTH, _Block
+
+# Translations are cached like .pyc files: marshalled code objects keyed by
+# the ROM and the translator, behind a header naming the Python version
+CACHE_MAGIC = b'C8AOT\x01' + sys.implementation.cache_tag.encode() + b'\n'
+
+def default_cache_dir():
+    """$XDG_CACHE_HOME/chip8-aot, ~/.cache/chip8-aot without it."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'chip8-aot')
+
+
+DEFAULT_CACHE_DIR = default_cache_dir()
+
+_translator_hash = None
+
+
+def translator_hash():
+    """sha256 of the sources translations depend on, so editing them drops the cache."""
+    global _translator_hash
+    if _translator_hash is None:
+        digest = hashlib.sha256()
+        for module in ('aot.py', 'recompiler.py', 'chip8.py'):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as f:
+                digest.update(f.read())
+        _translator_hash = digest.hexdigest()
+    return _translator_hash
+
+
+class _Translator(Chip8Recompiler):
+    """Emits blocks as source only: handlers become expressions evaluated at load time."""
+    def _bind(self, opcode):
+        return f'm._bind({opcode:#06x})'
+
+    def _bind_idle_jump(self, address, opcode):
+        if super()._bind_idle_jump(address, opcode) is None:
+            return None
+        # The loading machine may have idle skipping turned off
+        return f'm._bind_idle_jump({address:#05x}, {opcode:#06x}) or m._bind({opcode:#06x})'
+
+
+def translate(code, max_block_length=MAX_BLOCK_LENGTH):
+    """Source of a module translating every block statically reachable from 0x200.
+
+    Its BLOCKS lists (entry, factory, length, end), factory(m, reg) returning
+    the block function for machine m. Blocks start at 0x200 and wherever a block can continue (jump and call
+    targets, return addresses, both sides of skips); indirect jumps (Bnnn)
+    are left to the interpreter.
+    """
+    translator = _Translator(code, max_block_length=max_block_length)
+    reachable = Disassembler(translator.ram, ENTRY, ENTRY + len(code)).trace()
+    lines = [f'# {len(code)} byte CHIP-8 ROM translated ahead of time', '']
+    blocks = {}
+    pending = [ENTRY]
+    while pending:
+        entry = pending.pop()
+        if entry in blocks or entry not in reachable \
+                or not (DECODE_CACHE_START <= entry and entry + 2 <= DECODE_CACHE_END):
+            continue
+        source, namespace, length, end = translator._block_source(entry)
+        blocks[entry] = (length, end)
+        lines.append(f'def block_{entry:03x}(m, reg):')
+        lines.extend(f'    {name} = {expression}' for name, expression in namespace.items())
+        lines.extend(f'    {line}' for line in source.splitlines())
+        lines.append('    return block')
+        lines.append('')
+        last = end - 2
+        pending.extend(successors(last, struct.unpack_from('>H', translator.ram, last)[0]))
+
+    lines.append('BLOCKS = (')
+    lines.extend(f'    ({entry:#05x}, block_{entry:03x}, {length}, {end:#05x}),'
+                 for entry, (length, end) in sorted(blocks.items()))
+    lines.append(')')
+    return '\n'.join(lines) + '\n'
+
+
+def cache_path(cache_dir, code, max_block_length=MAX_BLOCK_LENGTH):
+    digest = hashlib.sha256(code).hexdigest()
+    return os.path.join(cache_dir, f'{digest}-{max_block_length}-{translator_hash()[:16]}.bin')
+
+
+def prune(cache_dir):
+    """Remove the translations made by other versions of the translator."""
+    current = f'-{translator_hash()[:16]}.bin'
+    for name in os.listdir(cache_dir):
+        if name.endswith('.bin') and not name.endswith(current):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def load_translation(code, max_block_length=MAX_BLOCK_LENGTH, cache_dir=DEFAULT_CACHE_DIR):
+    """Compiled translation of code, from cache_dir when it has one (None: no disk cache)."""
+    code = bytes(code)
+    path = None
+    if cache_dir is not None:
+        path = cache_path(cache_dir, code, max_block_length)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data.startswith(CACHE_MAGIC):
+                return marshal.loads(data[len(CACHE_MAGIC):])
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    translation = compile(translate(code, max_block_length),
+                          f'<chip8 aot {hashlib.sha256(code).hexdigest()[:12]}>', 'exec')
+    if path is not None:
+        # Written aside and renamed so parallel runs never read half a file
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(CACHE_MAGIC + marshal.dumps(translation))
+            os.replace(temporary, path)
+            prune(cache_dir)
+        except OSError:
+            pass
+    return translation
+
+
+class Chip8AotEmulator(Chip8Recompiler):
+    """Chip8Recompiler running blocks translated ahead of time.
+
+    Nothing is translated while running: code that was not found statically,
+    or whose block was invalidated by a write, runs on the interpreter.
+    Translated blocks are installed the first time they are entered, so
+    flushing the block cache (as restore() does) costs next to nothing.
+    """
+    def __init__(self, code, audio=None, seed=None, max_block_length=MAX_BLOCK_LENGTH, ram=None, registers=None,
+                 cache_dir=DEFAULT_CACHE_DIR):
+        super().__init__(code, audio, seed, max_block_length, ram, registers)
+        # RAM from ENTRY on as the translation saw it
+        self._image = bytes(code).ljust(DECODE_CACHE_END - ENTRY, b'\0')
+        namespace = {}
+        exec(load_translation(code, max_block_length, cache_dir), namespace)
+        # entry -> (factory, length, end)
+        self._translated = {entry: (factory, length, end) for entry, factory, length, end in namespace['BLOCKS']}
+        # Entries whose RAM no longer matches the translation, until the next flush
+        self._stale = set()
+
+    def flush_block_cache(self):
+        super().flush_block_cache()
+        if getattr(self, '_stale', None) is not None:
+            self._stale.clear()
+
+    def _translate(self, entry):
+        translated = self._translated.get(entry)
+        if translated is None or entry in self._stale:
+            return None
+        factory, length, end = translated
+        # A block is only valid while the RAM it was translated from is untouched
+        if self.ram[entry:end] != self._image[entry - ENTRY:end - ENTRY]:
+            self._stale.add(entry)
+            return None
+        block = _Block(factory(self, self.registers), length, end)
+        self._blocks[entry] = block
+        for i in range(entry, end):
+            self._block_owners.setdefault(i, set()).add(entry)
+        return block
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Translate CHIP-8 ROMs ahead of time into the cache')
+    parser.add_argument('roms', nargs='+')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-block-length', type=int, default=MAX_BLOCK_LENGTH)
+    parser.add_argument('--source', action='store_true', help='print the translated module instead')
+    args = parser.parse_args(argv)
+
+    for path in args.roms:
+        with open(path, 'rb') as f:
+            code = f.read()
+        if args.source:
+            print(translate(code, args.max_block_length), end='')
+            continue
+        cached = os.path.exists(cache_path(args.cache_dir, code, args.max_block_length))
+        start = time.perf_counter()
+        namespace = {}
+        exec(load_translation(code, args.max_block_length, args.cache_dir), namespace)
+        print(f'{os.path.basename(path):<12} {len(namespace["BLOCKS"]):>4} blocks  '
+              f'{(time.perf_counter() - start) * 1000:7.2f} ms  {"cached" if cached else "translated"}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
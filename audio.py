@@ -0,0 +1,82 @@
+import array
+
+
+class AudioBackend:
+    """Buzzer output.
+
+    start/stop receive the emulated time as the number of 60 Hz timer
+    ticks so far, the resolution of the sound timer itself.
+    """
+    def start(self, time):
+        pass
+
+    def stop(self, time):
+        pass
+
+
+class NullAudio(AudioBackend):
+    pass
+
+
+class RecordingAudio(AudioBackend):
+    """Keeps the (start, stop) tick of every buzzer interval."""
+    def __init__(self):
+        self.intervals = []
+        self.started_at = None
+
+    def start(self, time):
+        if self.started_at is None:
+            self.started_at = time
+
+    def stop(self, time):
+        if self.started_at is not None:
+            self.intervals.append((self.started_at, time))
+            self.started_at = None
+
+
+class PygameAudio(AudioBackend):
+    """Loops a precomputed square wave on the pygame mixer while the buzzer is on."""
+    def __init__(self, frequency=440, volume=0.2):
+        import pygame
+
+        self.sound = None
+        self.playing = False
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(size=-16)
+            sample_rate, _, channels = pygame.mixer.get_init()
+        except pygame.error as e:
+            print(f'Audio disabled : {e}')
+            return
+
+        period = max(sample_rate // frequency, 2)
+        amplitude = int(0x7fff * volume)
+        wave = array.array('h')
+        # About 100 ms of whole periods, looped for as long as the buzzer is on
+        for i in range(period * max(frequency // 10, 1)):
+            sample = amplitude if (i % period) < period // 2 else -amplitude
+            wave.extend([sample] * channels)
+        self.sound = pygame.mixer.Sound(buffer=wave.tobytes())
+
+    def start(self, time):
+        if self.sound is not None and not self.playing:
+            self.sound.play(loops=-1)
+            self.playing = True
+
+    def stop(self, time):
+        if self.sound is not None and self.playing:
+            self.sound.stop()
+            self.playing = False
+
+
+AUDIO_BACKENDS = {
+    'null': NullAudio,
+    'recording': RecordingAudio,
+    'pygame': PygameAudio,
+}
+
+
+def create_audio_backend(name, **kwargs):
+    if name not in AUDIO_BACKENDS:
+        raise ValueError(f'Unknown audio backend : {name}')
+    return AUDIO_BACKENDS[name](**kwargs)
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from chip8 import Chip8Emulator, HardFaultError
+from headless import ENGINES, DEFAULT_PROGRAMS, find_roms
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+SUITES = ('rom', 'opcode', 'draw', 'render', 'startup')
+
+# Representative opcode for every family in opcode_handler/misc_opcode_handler
+OPCODES = {
+    '00E0': 0x00e0, '00EE': 0x00ee, '1nnn': 0x1300, '2nnn': 0x2200,
+    '3xnn': 0x3012, '4xnn': 0x4012, '5xy0': 0x5010, '6xnn': 0x6012,
+    '7xnn': 0x7012, '8xy0': 0x8010, '8xy1': 0x8011, '8xy2': 0x8012,
+    '8xy3': 0x8013, '8xy4': 0x8014, '8xy5': 0x8015, '8xy6': 0x8016,
+    '8xy7': 0x8017, '8xyE': 0x801e, '9xy0': 0x9010, 'Annn': 0xa300,
+    'Bnnn': 0xb200, 'Cxnn': 0xc0ff, 'Dxyn': 0xd015, 'Ex9E': 0xe09e,
+    'ExA1': 0xe0a1, 'Fx07': 0xf007, 'Fx0A': 0xf00a, 'Fx15': 0xf015,
+    'Fx18': 0xf018, 'Fx1E': 0xf01e, 'Fx29': 0xf029, 'Fx33': 0xf033,
+    'Fx55': 0xff55, 'Fx65': 0xff65,
+}
+
+# name -> (x, y, sprite height)
+DRAWS = {
+    'aligned_8x1': (0, 0, 1),
+    'aligned_8x15': (0, 0, 15),
+    'unaligned_8x15': (13, 5, 15),
+    'wrapped_8x15': (60, 25, 15),
+}
+
+
+class Result:
+    def __init__(self, unit, samples, higher_is_better=False, fault=None):
+        self.unit = unit
+        self.samples = samples
+        self.higher_is_better = higher_is_better
+        # Why the measured run stopped early, if it did
+        self.fault = fault
+
+    def to_dict(self):
+        return {
+            'unit': self.unit,
+            'higher_is_better': self.higher_is_better,
+            'fault': self.fault,
+            'median': statistics.median(self.samples),
+            'mean': statistics.mean(self.samples),
+            'stdev': statistics.stdev(self.samples) if len(self.samples) > 1 else 0.0,
+            'min': min(self.samples),
+            'max': max(self.samples),
+            'samples': self.samples,
+        }
+
+
+def _per_call_ns(stmt, namespace, number, repeat):
+    timer = timeit.Timer(stmt, globals=namespace)
+    return [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+
+
+def bench_roms(roms, engine, cycles, repeat):
+    results = {}
+    for rom in roms:
+        with open(rom, 'rb') as f:
+            code = bytearray(f.read())
+        samples = []
+        fault = None
+        for _ in range(repeat):
+            machine = ENGINES[engine](code, seed=0)
+            scheduler = Scheduler(machine, DEFAULT_CPU_HZ)
+            start = time.perf_counter()
+            try:
+                scheduler.run_cycles(cycles)
+            except HardFaultError as e:
+                fault = f'Hard fault at cycle {machine.cycles} : {e.msg}'
+            samples.append(machine.cycles / (time.perf_counter() - start))
+        results[f'rom/{engine}/{os.path.basename(rom)}'] = Result('ips', samples, higher_is_better=True,
+                                                                  fault=fault)
+    return results
+
+
+def bench_opcodes(number, repeat):
+    results = {}
+    for name, opcode in OPCODES.items():
+        machine = Chip8Emulator(opcode.to_bytes(2, 'big'), seed=0)
+        # A return address for 00EE and a pressed key for Fx0A/Ex9E
+        machine._push(0x200)
+        machine.key_down(0)
+        stmt = 'm.pc = 0x200; m.sp = 0xea2; m.I = 0x300; m.run_loop()'
+        samples = _per_call_ns(stmt, {'m': machine}, number, repeat)
+        results[f'opcode/{name}'] = Result('ns', samples)
+    return results
+
+
+def bench_draws(number, repeat):
+    results = {}
+    for name, (x, y, height) in DRAWS.items():
+        machine = Chip8Emulator(bytes([0xd0, 0x10 | height]), seed=0)
+        machine.registers[0] = x
+        machine.registers[1] = y
+        machine.I = 0x100
+        machine.ram[0x100:0x10f] = bytes(range(0x81, 0x90))
+        samples = _per_call_ns('m.pc = 0x200; m.run_loop()', {'m': machine}, number, repeat)
+        results[f'draw/{name}'] = Result('ns', samples)
+    machine = Chip8Emulator(bytes([0x00, 0xe0]), seed=0)
+    samples = _per_call_ns('m.pc = 0x200; m.run_loop()', {'m': machine}, number, repeat)
+    results['draw/clear_screen'] = Result('ns', samples)
+    return results
+
+
+def bench_render(number, repeat):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from main import Emulator
+
+    with open(os.path.join(DEFAULT_PROGRAMS, 'INVADERS'), 'rb') as f:
+        machine = Chip8Emulator(bytearray(f.read()), seed=0)
+    Scheduler(machine, DEFAULT_CPU_HZ).run_cycles(5000)
+    emulator = Emulator(machine, 1200, 600, 6, 'benchmark')
+    key_status = machine.get_key_status()
+    stmts = {
+        'machine_screen': 'm.needs_to_redraw = True; m.frame_buffer.mark_dirty(); '
+                          'e.draw_machine_screen(e.chip_screen, e.chip_screen_scale)',
+        'machine_screen_uncached': 'e.frame_cache.clear(); m.needs_to_redraw = True; m.frame_buffer.mark_dirty(); '
+                                   'e.draw_machine_screen(e.chip_screen, e.chip_screen_scale)',
+        'machine_screen_sprite': 'm.needs_to_redraw = True; m.frame_buffer.draw(13, 5, b"\\x81" * 15); '
+                                 'e.draw_machine_screen(e.chip_screen, e.chip_screen_scale)',
+        # Panels are redrawn only when their state changed, force it
+        'main_screen': 'e.invalidate_panels(); e.draw_main_screen(e.main_screen)',
+        'keyboard_screen': 'e.invalidate_panels(); e.draw_keyboard_screen(e.keyboard_screen, k)',
+        'memory_screen': 'e.invalidate_panels(); e.draw_memory_screen(e.memory_screen)',
+        'register_screen': 'e.invalidate_panels(); e.draw_register_screen(e.register_screen)',
+        'instruction_screen': 'e.invalidate_panels(); e.draw_instruction_screen(e.instruction_screen)',
+        'unchanged_panels': 'e.draw_main_screen(e.main_screen); e.draw_keyboard_screen(e.keyboard_screen, k); '
+                            'e.draw_memory_screen(e.memory_screen); e.draw_register_screen(e.register_screen); '
+                            'e.draw_instruction_screen(e.instruction_screen)',
+    }
+    namespace = {'e': emulator, 'm': machine, 'k': key_status}
+    return {f'render/{name}': Result('ns', _per_call_ns(stmt, namespace, number, repeat))
+            for name, stmt in stmts.items()}
+
+
+# Programs run in a fresh interpreter: from start-up through the first instruction
+STARTUP = {
+    'core': 'from chip8 import Chip8Emulator\n'
+            'Chip8Emulator(code).run_cycles(1)',
+    'frontend': 'from chip8 import Chip8Emulator\n'
+                'from main import Emulator\n'
+                'Emulator(Chip8Emulator(code), 1200, 600, 6, "startup").scheduler.run_cycles(1)',
+}
+STARTUP.update({engine: 'from headless import ENGINES\n'
+                        f'ENGINES[{engine!r}](code).run_cycles(1)' for engine in ENGINES})
+
+
+def bench_startup(repeat, names=None):
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=root, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy',
+               PYGAME_HIDE_SUPPORT_PROMPT='1')
+    rom = os.path.join(DEFAULT_PROGRAMS, 'PONG')
+    results = {}
+    for name in names or STARTUP:
+        script = f'code = open({rom!r}, "rb").read()\n' + STARTUP[name]
+        samples = []
+        # The first run fills the bytecode and translation caches
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], env=env, cwd=root, check=True)
+            if i:
+                samples.append((time.perf_counter() - start) * 1000)
+        results[f'startup/{name}'] = Result('ms', samples)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return (name, baseline median, median, change) for every regression."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['median']
+        new = result['median']
+        if old == 0:
+            continue
+        change = (new - old) / old
+        if result['higher_is_better']:
+            change = -change
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure emulator and renderer performance')
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help='suite to run, may be repeated (default: all)')
+    parser.add_argument('--roms', nargs='*', default=[DEFAULT_PROGRAMS])
+    parser.add_argument('--engine', choices=sorted(ENGINES), action='append',
+                        help='engine for the rom suite, may be repeated (default: all)')
+    parser.add_argument('--cycles', type=int, default=20_000, help='cycles per rom run')
+    parser.add_argument('--number', type=int, default=2_000, help='calls per micro benchmark sample')
+    parser.add_argument('--repeat', type=int, default=5, help='samples per benchmark')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown of the median counted as a regression')
+    args = parser.parse_args(argv)
+
+    suites = args.suite or SUITES
+    results = {}
+    if 'rom' in suites:
+        roms = find_roms(args.roms)
+        for engine in args.engine or sorted(ENGINES):
+            results.update(bench_roms(roms, engine, args.cycles, args.repeat))
+    if 'opcode' in suites:
+        results.update(bench_opcodes(args.number, args.repeat))
+    if 'draw' in suites:
+        results.update(bench_draws(args.number, args.repeat))
+    if 'render' in suites:
+        results.update(bench_render(max(args.number // 20, 1), args.repeat))
+    if 'startup' in suites:
+        results.update(bench_startup(args.repeat))
+
+    report = {name: result.to_dict() for name, result in results.items()}
+    for name, result in report.items():
+        print(f'{name:<40} {result["median"]:>14.1f} {result["unit"]:<4} '
+              f'(stdev {result["stdev"]:.1f}){"  " + result["fault"] if result["fault"] else ""}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': sys.version,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': report,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f'REGRESSION {name}: {old:.1f} -> {new:.1f} ({change:+.1%})')
+        if regressions:
+            return 1
+        print(f'No regressions against {args.compare}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,3 +1,8 @@
+_MASKS = (
+	0x01, 0x02, 0x04, 0x08,
+	0x10, 0x20, 0x40, 0x80,
+)
+
 class BitBuffer:
 	def __init__(self, buffer:bytes, offset):
 		self.buffer = buffer
@@ -23,8 +28,4 @@ class BitBuffer:
 
 	@staticmethod
 	def get_mask(i):
-		data = [
-			0x01, 0x02, 0x04, 0x08,
-			0x10, 0x20, 0x40, 0x80,
-		]
-		return data[i]
\ No newline at end of file
+		return _MASKS[i]
\ No newline at end of file
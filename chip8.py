@@ -1,10 +1,13 @@
-import random
+import functools
 import struct
-import winsound
+import zlib
 
+from audio import NullAudio
 from font import Font
-from opcode import OpcodeData, OpcodeDesc
+from prng import XorShift32
+from opcodes import OpcodeData, OpcodeDesc
 from bit_buffer import BitBuffer
+from frame_buffer import FrameBuffer
 
 # Memory layout
 # ----------0x1000------------
@@ -21,10 +24,39 @@ from bit_buffer import BitBuffer
 # |         Font             |
 # ----------0x000-------------
 
+# Decoded instructions are only cached for the code region. Everything above
+# it (stack and frame buffer) is rewritten as a side effect of normal
+# execution, so instructions fetched from there are decoded every time.
+DECODE_CACHE_START = 0x200
+DECODE_CACHE_END = 0xea0
+
+# Snapshot layout: header, then a verbatim copy of ram.
+# magic, version, pc, sp, I, delay, sound, timer ticks, cycles, registers,
+# PRNG state
+SNAPSHOT_MAGIC = b'C8ST'
+SNAPSHOT_VERSION = 2
+_SNAPSHOT_HEADER = struct.Struct('<4sBxHHIBBQQ16sI')
+
 class HardFaultError(BaseException):
    def __init__(self, msg):
       self.msg = msg
 
+# A backward 1nnn over at most this many instructions that only read the
+# delay timer, set constants or skip is checked for being an idle loop
+MAX_IDLE_LOOP_BODY = 8
+_IDLE_LOOP_FAMILIES = (0x3, 0x4, 0x5, 0x6, 0x9)
+
+class _IdleLoop(Exception):
+    """Raised by an instruction that will repeat itself until the batch ends.
+
+    Timers tick and keys change only between run_cycles batches, so once a
+    loop is at a fixed point every further iteration in the batch is the
+    same; run_cycles skips them instead of executing them.
+    """
+    def __init__(self, length, registers=None):
+        self.length = length
+        self.registers = registers
+
 class _Handler:
     def __init__(self, handler, get_desc):
         self.handler = handler
@@ -32,26 +64,41 @@ class _Handler:
 
 
 class Chip8Emulator:
-    def __init__(self, code):
+    def __init__(self, code, audio=None, seed=None, ram=None, registers=None):
+        """ram (0x1000 bytes) and registers (16 bytes) may be supplied to back
+        the machine with an existing writable buffer, e.g. shared memory.
+        """
         self.screen_width = 64
         self.screen_height = 32
         self.pending_clear_screren_buffer = bytearray(
             self.screen_width * self.screen_height)
         self.needs_to_redraw = True
         # Registers
-        self.registers = bytearray(16)
+        self.registers = self._zeroed(registers, 16)
         self.I = 0
         self.pc = 0x200
         self.sp = 0xea0
         # RAM
-        self.ram = bytearray(0x1000)
+        self.ram = self._zeroed(ram, 0x1000)
         self.screen_buffer = BitBuffer(self.ram, 0xf00)
+        self.frame_buffer = FrameBuffer(self.ram, 0xf00, self.screen_width, self.screen_height)
         self.key_buffer = BitBuffer(self.ram, 0x50)
         # Timer
         self.delay_count = 0
         self.sound_count = 0
+        self.timer_ticks = 0
+        self.audio = audio if audio is not None else NullAudio()
+        self.rng = XorShift32(seed)
+        # Number of instructions executed so far
+        self.cycles = 0
+        # Fast-forward idle loops (Fx0A, delay timer polling) in run_cycles
+        self.skip_idle_loops = True
 
         self.ram[self.pc:self.pc + len(code)] = code
+        # Per-address cache of handlers with their OpcodeData already bound
+        self._decoded = [None] * len(self.ram)
+        # Idle loop jump address -> (start, end) of the loop body
+        self._idle_jumps = {}
 
         self.opcode_handler = {
             0x0: _Handler(self._clear_or_return, OpcodeDesc.clear_or_return),
@@ -102,14 +149,91 @@ class Chip8Emulator:
         return buffer
 
     def run_loop(self):
-        opcode = struct.unpack_from('>H', self.ram, self.pc)[0]
-        self.pc += 2
-        data = OpcodeData(opcode)
-        something = opcode >> 12
-        if something in self.opcode_handler:
-            return self.opcode_handler[something].handler(data)
+        self.cycles += 1
+        pc = self.pc
+        op = self._decoded[pc]
+        self.pc = pc + 2
+        if op is None:
+            op = self._decode(pc)
+        try:
+            return op()
+        except _IdleLoop:
+            pass
+
+    def run_cycles(self, count):
+        decoded = self._decoded
+        remaining = count
+        try:
+            while remaining > 0:
+                try:
+                    while remaining > 0:
+                        remaining -= 1
+                        pc = self.pc
+                        op = decoded[pc]
+                        self.pc = pc + 2
+                        if op is None:
+                            op = self._decode(pc)
+                        op()
+                except _IdleLoop as idle:
+                    remaining = self._skip_idle_loop(idle, remaining)
+        finally:
+            self.cycles += count - remaining
+        return count
+
+    def flush_decode_cache(self):
+        self._decoded[:] = [None] * len(self._decoded)
+        self._idle_jumps.clear()
+
+    def snapshot(self):
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.pc, self.sp, self.I,
+            self.delay_count, self.sound_count, self.timer_ticks, self.cycles,
+            bytes(self.registers), self.rng.state)
+        return b''.join((header, self.ram))
+
+    def restore(self, snapshot):
+        view = memoryview(snapshot)
+        expected = _SNAPSHOT_HEADER.size + len(self.ram)
+        if len(view) != expected:
+            raise ValueError(f'Invalid snapshot size : {len(view)}')
+        magic, version, pc, sp, I, delay_count, sound_count, timer_ticks, cycles, \
+            registers, rng_state = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported snapshot : {magic}, version {version}')
+
+        # Copy into the existing buffers so BitBuffer views and anyone else
+        # holding ram or registers keep seeing the live machine
+        self.ram[:] = view[_SNAPSHOT_HEADER.size:]
+        self.registers[:] = registers
+        self.pc = pc
+        self.sp = sp
+        self.I = I
+        self.delay_count = delay_count
+        self.sound_count = sound_count
+        self.timer_ticks = timer_ticks
+        self.cycles = cycles
+        self.rng.state = rng_state
+        self.needs_to_redraw = True
+        self.frame_buffer.mark_dirty()
+        self.flush_decode_cache()
+        if self.sound_count > 0:
+            self.audio.start(self.timer_ticks)
         else:
-            raise HardFaultError(f'Unknown opcode : {opcode}')
+            self.audio.stop(self.timer_ticks)
+
+    def save_snapshot(self, path, compress=False):
+        data = self.snapshot()
+        if compress:
+            data = zlib.compress(data)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def load_snapshot(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            data = zlib.decompress(data)
+        self.restore(data)
 
     def get_description(self, opcode):
         data = OpcodeData(opcode)
@@ -117,13 +241,117 @@ class Chip8Emulator:
         return self.opcode_handler[something].get_desc(data)
 
     def tick60Hz(self):
+        self.timer_ticks += 1
         if self.delay_count > 0:
             self.delay_count -= 1
         if self.sound_count > 0:
             self.sound_count -= 1
             if self.sound_count == 0:
-                winsound.Beep(32000, 100)
-        
+                self.audio.stop(self.timer_ticks)
+
+    @staticmethod
+    def _zeroed(buffer, size):
+        if buffer is None:
+            return bytearray(size)
+        if len(buffer) != size:
+            raise ValueError(f'Expected a buffer of {size} bytes, got {len(buffer)}')
+        buffer[:] = bytes(size)
+        return buffer
+
+    def _bind(self, opcode):
+        data = OpcodeData(opcode)
+        something = opcode >> 12
+        if something == 0xf and data.NN in self.misc_opcode_handler:
+            handler = self.misc_opcode_handler[data.NN]
+        elif something in self.opcode_handler:
+            handler = self.opcode_handler[something].handler
+        else:
+            raise HardFaultError(f'Unknown opcode : {opcode}')
+        return functools.partial(handler, data)
+
+    def _decode(self, address):
+        opcode = struct.unpack_from('>H', self.ram, address)[0]
+        op = None
+        if opcode >> 12 == 0x1:
+            op = self._bind_idle_jump(address, opcode)
+        if op is None:
+            op = self._bind(opcode)
+        if DECODE_CACHE_START <= address and address + 2 <= DECODE_CACHE_END:
+            self._decoded[address] = op
+        return op
+
+    def _invalidate(self, address, length):
+        # An instruction starting one byte before the write overlaps it too
+        start = max(address - 1, DECODE_CACHE_START)
+        end = min(address + length, DECODE_CACHE_END)
+        if start < end:
+            self._decoded[start:end] = [None] * (end - start)
+        frame_buffer = self.frame_buffer
+        if address < frame_buffer.offset + frame_buffer.size and frame_buffer.offset < address + length:
+            frame_buffer.mark_bytes_dirty(address, length)
+            self.needs_to_redraw = True
+        if self._idle_jumps:
+            for jump, (body_start, body_end) in list(self._idle_jumps.items()):
+                if address < body_end and body_start < address + length:
+                    del self._idle_jumps[jump]
+                    self._invalidate(jump, 2)
+
+    def _bind_idle_jump(self, address, opcode):
+        """Handler for a jump that closes a possible idle loop, or None."""
+        target = opcode & 0xfff
+        if not self.skip_idle_loops or not target <= address \
+                or address - target > 2 * MAX_IDLE_LOOP_BODY or (address - target) % 2:
+            return None
+        body = []
+        for pc in range(target, address, 2):
+            data = OpcodeData(struct.unpack_from('>H', self.ram, pc)[0])
+            family = data.opcode >> 12
+            if family in _IDLE_LOOP_FAMILIES or (family == 0xf and data.NN == 0x07):
+                body.append(data)
+            else:
+                return None
+        if not DECODE_CACHE_START <= address < DECODE_CACHE_END:
+            return None
+        self._idle_jumps[address] = (target, address)
+        return functools.partial(self._idle_jump, OpcodeData(opcode), tuple(body))
+
+    def _idle_jump(self, data, body):
+        self.pc = data.NNN
+        # Two iterations reach the fixed point: every write is a constant or
+        # the delay timer, which only changes between batches
+        registers = bytearray(self.registers)
+        if self._run_idle_body(body, registers) and self._run_idle_body(body, registers):
+            raise _IdleLoop(len(body) + 1, registers)
+
+    def _run_idle_body(self, body, registers):
+        """Apply one loop iteration to registers, False if it would skip."""
+        for data in body:
+            family = data.opcode >> 12
+            if family == 0x6:
+                registers[data.X] = data.NN
+            elif family == 0xf:
+                registers[data.X] = self.delay_count
+            elif family == 0x3:
+                if registers[data.X] == data.NN:
+                    return False
+            elif family == 0x4:
+                if registers[data.X] != data.NN:
+                    return False
+            elif family == 0x5:
+                if registers[data.X] == registers[data.Y]:
+                    return False
+            elif registers[data.X] != registers[data.Y]:
+                return False
+        return True
+
+    def _skip_idle_loop(self, idle, remaining):
+        """Skip whole iterations of idle, return the cycles still to run."""
+        iterations = remaining // idle.length
+        if iterations:
+            remaining -= iterations * idle.length
+            if idle.registers is not None:
+                self.registers[:] = idle.registers
+        return remaining
 
     def _init_font(self):
         ptr = 0
@@ -144,6 +372,9 @@ class Chip8Emulator:
 
     def _push(self, value):
         struct.pack_into('>H', self.ram, self.sp, value)
+        # A runaway stack can grow over code or into the frame buffer
+        if self.sp < DECODE_CACHE_END or self.sp + 2 > self.frame_buffer.offset:
+            self._invalidate(self.sp, 2)
         self.sp += 2
 
     def _pop(self):
@@ -152,8 +383,8 @@ class Chip8Emulator:
 
     def _clear_or_return(self, data):
         if data.NN == 0xe0:
-            for i in range(self.screen_width * self.screen_height):
-                self.screen_buffer[i] = 0
+            self.frame_buffer.clear()
+            self.needs_to_redraw = True
         elif data.NN == 0xee:
             self.pc = self._pop()
         else:
@@ -229,34 +460,22 @@ class Chip8Emulator:
         self.pc = data.NNN + self.registers[0]
 
     def _rnd(self, data):
-        self.registers[data.X] = random.randint(0, 0xff) & data.NN
+        self.registers[data.X] = self.rng.randbyte() & data.NN
 
     def _draw_sprite(self, data):
         start_x = self.registers[data.X]
         start_y = self.registers[data.Y]
-        self.registers[0xf] = 0
-        for i in range(data.N):
-            sprite_line = self.ram[self.I + i]
-
-            for bit in range(8):
-                x = (start_x + bit) % self.screen_width
-                y = (start_y + i) % self.screen_height
-
-                index = y * self.screen_width + x
-                sprite_bit = (sprite_line >> (7 - bit)) & 1
-                old_bit = self.screen_buffer[index]
-
-                if old_bit != sprite_bit:
-                    self.needs_to_redraw = True
-
-                new_bit = old_bit ^ sprite_bit
-
-                if new_bit != 0:
-                    self.screen_buffer[index] = 1
-                else:
-                    self.screen_buffer[index] = 0
-                if old_bit != 0 and new_bit == 0:
-                    self.registers[0xf] = 1
+        # A view rather than a copy: rows are read as they are drawn, so a
+        # sprite inside the frame buffer sees the rows drawn before it
+        with memoryview(self.ram)[self.I:self.I + data.N] as sprite:
+            # Rows only change once a non-zero row was drawn, so this is the
+            # same before and after
+            if any(sprite):
+                self.needs_to_redraw = True
+            collision = self.frame_buffer.draw(start_x, start_y, sprite)
+            self.registers[0xf] = 1 if collision else 0
+            if len(sprite) < data.N:
+                raise IndexError('sprite runs past the end of RAM')
 
     def _skip_on_key(self, data):
         x = self.registers[data.X]
@@ -283,12 +502,19 @@ class Chip8Emulator:
                 break
         if not find:
             self.pc -= 2
+            if self.skip_idle_loops:
+                # Nothing can press a key before the batch ends
+                raise _IdleLoop(1)
 
     def _set_delay(self, data):
         self.delay_count = self.registers[data.X]
 
     def _set_sound(self, data):
         self.sound_count = self.registers[data.X]
+        if self.sound_count > 0:
+            self.audio.start(self.timer_ticks)
+        else:
+            self.audio.stop(self.timer_ticks)
 
     def _add_to_I(self, data):
         self.I += self.registers[data.X]
@@ -300,10 +526,12 @@ class Chip8Emulator:
         self.ram[self.I + 0] = (self.registers[data.X] // 100) % 10
         self.ram[self.I + 1] = (self.registers[data.X] // 10) % 10
         self.ram[self.I + 2] = (self.registers[data.X] // 1) % 10
+        self._invalidate(self.I, 3)
 
     def _save_x(self, data):
         for i in range(data.X + 1):
             self.ram[self.I + i] = self.registers[i]
+        self._invalidate(self.I, data.X + 1)
 
     def _load_x(self, data):
         for i in range(data.X + 1):
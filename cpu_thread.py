@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+
+from frame_buffer import dirty_rects
+
+# Host time the CPU thread emulates between two looks at its command queue
+DEFAULT_SLICE = 0.002
+
+
+class FrameExchange:
+    """Hands completed frames from the CPU thread to the render thread.
+
+    publish() copies the frame buffer into the back buffer without holding
+    the lock and only takes it to flip buffers and merge the dirty rows, so
+    neither side ever waits on the other's copy or render.
+    """
+    def __init__(self, frame_buffer):
+        self.frame_buffer = frame_buffer
+        self.generation = 0
+        self._buffers = [bytearray(frame_buffer.size), bytearray(frame_buffer.size)]
+        self._front = 0
+        self._dirty = [0] * frame_buffer.height
+        self._taken = 0
+        self._lock = threading.Lock()
+
+    def publish(self):
+        """Called by the CPU thread, True if the frame changed."""
+        frame_buffer = self.frame_buffer
+        dirty = frame_buffer.dirty
+        if not any(dirty):
+            return False
+        back = self._buffers[1 - self._front]
+        back[:] = frame_buffer.buffer[frame_buffer.offset:frame_buffer.offset + frame_buffer.size]
+        with self._lock:
+            self._front = 1 - self._front
+            self._dirty = [old | new for old, new in zip(self._dirty, dirty)]
+            self.generation += 1
+        dirty[:] = [0] * frame_buffer.height
+        return True
+
+    def take(self):
+        """(frame bytes, dirty rects) published since the last take, or None."""
+        with self._lock:
+            if self._taken == self.generation:
+                return None
+            self._taken = self.generation
+            frame = bytes(self._buffers[self._front])
+            dirty = self._dirty
+            self._dirty = [0] * self.frame_buffer.height
+        return frame, dirty_rects(dirty)
+
+
+class CpuThread(threading.Thread):
+    """Runs emulate(elapsed) off the render thread.
+
+    Anything that changes the machine (key events, frequency, debugger
+    commands) is passed through call() and runs on this thread between two
+    slices, so it lands on an instruction boundary.
+    """
+    def __init__(self, emulate, frames, slice_time=DEFAULT_SLICE):
+        super().__init__(name='chip8-cpu', daemon=True)
+        self.emulate = emulate
+        self.frames = frames
+        self.slice_time = slice_time
+        self.commands = queue.SimpleQueue()
+        self._stopping = threading.Event()
+
+    def call(self, function, *args):
+        self.commands.put((function, args))
+
+    def stop(self):
+        self._stopping.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stopping.is_set():
+            while True:
+                try:
+                    function, args = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                function(*args)
+            now = time.perf_counter()
+            self.emulate(now - last)
+            last = now
+            self.frames.publish()
+            spare = self.slice_time - (time.perf_counter() - now)
+            if spare > 0:
+                self._stopping.wait(spare)
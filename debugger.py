@@ -0,0 +1,270 @@
+import operator
+import re
+import types
+
+from chip8 import Chip8Emulator, _Handler, DECODE_CACHE_START, DECODE_CACHE_END
+
+KEY_BUFFER = 0x50
+FRAME_BUFFER = 0xf00
+ROW_SIZE = 8
+
+READ = 'read'
+WRITE = 'write'
+
+_CONDITION = re.compile(r'v([0-9a-f])\s*(==|!=|<=|>=|<|>)\s*(?:0x)?([0-9a-f]+)$', re.IGNORECASE)
+_OPERATORS = {
+    '==': operator.eq, '!=': operator.ne, '<=': operator.le,
+    '>=': operator.ge, '<': operator.lt, '>': operator.gt,
+}
+
+
+class DebugBreak(BaseException):
+    """Raised out of run_loop/run_cycles when a breakpoint or watchpoint hits."""
+    def __init__(self, reason, address):
+        super().__init__(reason)
+        self.reason = reason
+        self.address = address
+
+
+class RegisterCondition:
+    def __init__(self, register, op, value):
+        self.register = register
+        self.op = op
+        self.value = value
+
+    @classmethod
+    def parse(cls, text):
+        match = _CONDITION.match(text.strip())
+        if match is None:
+            raise ValueError(f'Invalid condition : {text}')
+        return cls(int(match[1], 16), match[2], int(match[3], 16))
+
+    def __call__(self, machine):
+        return _OPERATORS[self.op](machine.registers[self.register], self.value)
+
+    def __str__(self):
+        return f'V{self.register:X} {self.op} {self.value:#x}'
+
+
+class Watchpoint:
+    def __init__(self, start, length, kinds):
+        self.start = start
+        self.end = start + length
+        self.kinds = kinds
+
+    def hits(self, start, length, kind):
+        return kind in self.kinds and start < self.end and self.start < start + length
+
+    def __str__(self):
+        return f'{"/".join(sorted(self.kinds))} {self.start:03X}-{self.end - 1:03X}'
+
+
+def _memory_accesses(machine, family, data):
+    """(start, length, kind) RAM ranges the instruction is about to touch."""
+    reg = machine.registers
+    if family == 0x0:
+        if data.NN == 0xe0:
+            return ((FRAME_BUFFER, 0x100, WRITE),)
+        if data.NN == 0xee:
+            return ((machine.sp - 2, 2, READ),)
+    elif family == 0x2:
+        return ((machine.sp, 2, WRITE),)
+    elif family == 0xd:
+        y = reg[data.Y]
+        rows = tuple((FRAME_BUFFER + ((y + i) % 32) * ROW_SIZE, ROW_SIZE, WRITE) for i in range(data.N))
+        return ((machine.I, data.N, READ),) + rows
+    elif family == 0xe:
+        return ((KEY_BUFFER, 2, READ),)
+    elif family == 0xf:
+        if data.NN == 0x0a:
+            return ((KEY_BUFFER, 2, READ),)
+        if data.NN == 0x33:
+            return ((machine.I, 3, WRITE),)
+        if data.NN == 0x55:
+            return ((machine.I, data.X + 1, WRITE),)
+        if data.NN == 0x65:
+            return ((machine.I, data.X + 1, READ),)
+    return ()
+
+
+# Opcodes whose handlers touch RAM other than through instruction fetch
+_MEMORY_FAMILIES = (0x0, 0x2, 0xd, 0xe)
+_MEMORY_MISC = (0x0a, 0x33, 0x55, 0x65)
+
+
+class Debugger:
+    """PC breakpoints, register conditions, RAM watchpoints and run-until-return.
+
+    Nothing is instrumented while nothing is armed. A PC breakpoint replaces
+    the decoded instruction at its address only; watchpoints and
+    run-until-return wrap the handlers of the opcodes that touch RAM.
+    A hit raises DebugBreak: breakpoints stop before the instruction runs,
+    watchpoints and returns stop right after it.
+    """
+    def __init__(self, machine):
+        self.machine = machine
+        self.breakpoints = {}
+        self.watchpoints = []
+        self.return_sp = None
+        self._resume_address = None
+        self._saved_tables = None
+        self._saved_skip_idle_loops = None
+
+    @property
+    def armed(self):
+        return bool(self.breakpoints or self.watchpoints or self.return_sp is not None)
+
+    def add_breakpoint(self, address, condition=None):
+        self.breakpoints[address] = condition
+        self._update()
+
+    def remove_breakpoint(self, address):
+        self.breakpoints.pop(address, None)
+        self._update()
+
+    def add_watchpoint(self, start, length=1, read=False, write=True):
+        kinds = frozenset(kind for kind, enabled in ((READ, read), (WRITE, write)) if enabled)
+        self.watchpoints.append(Watchpoint(start, length, kinds))
+        self._update()
+
+    def remove_watchpoints(self, address):
+        self.watchpoints = [w for w in self.watchpoints if not w.start <= address < w.end]
+        self._update()
+
+    def run_until_return(self):
+        """Break once the current subroutine returns to its caller."""
+        self.return_sp = self.machine.sp
+        self.resume()
+        self._update()
+
+    def clear(self):
+        self.breakpoints.clear()
+        self.watchpoints.clear()
+        self.return_sp = None
+        self._update()
+
+    def resume(self):
+        """Let the instruction at pc run even if it has a breakpoint."""
+        pc = self.machine.pc
+        self._resume_address = pc if pc in self.breakpoints else None
+
+    def command(self, text):
+        """Run a debugger command and return a message for the user.
+
+        b ADDR [Vx==NN]   break at ADDR, optionally only when the condition holds
+        w ADDR [LEN]      break after writes to ADDR..ADDR+LEN-1
+        r ADDR [LEN]      break after reads of ADDR..ADDR+LEN-1
+        d [ADDR]          delete breakpoints and watchpoints at ADDR, or all
+        u                 run until the current subroutine returns
+        Addresses and values are hex.
+        """
+        words = text.split()
+        if not words:
+            return ''
+        name, args = words[0].lower(), words[1:]
+        try:
+            if name == 'b' and args:
+                address = int(args[0], 16)
+                condition = RegisterCondition.parse(''.join(args[1:])) if len(args) > 1 else None
+                self.add_breakpoint(address, condition)
+                return f'break {address:03X}' + (f' if {condition}' if condition else '')
+            if name in ('w', 'r') and args:
+                start = int(args[0], 16)
+                length = int(args[1], 16) if len(args) > 1 else 1
+                self.add_watchpoint(start, length, read=name == 'r', write=name == 'w')
+                return f'watch {self.watchpoints[-1]}'
+            if name == 'd':
+                if args:
+                    address = int(args[0], 16)
+                    self.remove_breakpoint(address)
+                    self.remove_watchpoints(address)
+                    return f'deleted {address:03X}'
+                self.clear()
+                return 'deleted all'
+            if name == 'u':
+                self.run_until_return()
+                return f'run until return (sp = {self.return_sp:03X})'
+        except ValueError as e:
+            return str(e)
+        return f'Unknown command : {text}'
+
+    def _update(self):
+        machine = self.machine
+        self._detach()
+        if self.breakpoints:
+            machine._decode = self._decode
+        if self.watchpoints or self.return_sp is not None:
+            self._saved_tables = (machine.opcode_handler, machine.misc_opcode_handler)
+            machine.opcode_handler = dict(machine.opcode_handler)
+            machine.misc_opcode_handler = dict(machine.misc_opcode_handler)
+            for family in _MEMORY_FAMILIES:
+                entry = machine.opcode_handler[family]
+                machine.opcode_handler[family] = _Handler(self._watch(entry.handler, family), entry.get_desc)
+            for key in _MEMORY_MISC:
+                machine.misc_opcode_handler[key] = self._watch(machine.misc_opcode_handler[key], 0xf)
+        if self.armed:
+            # Fast-forwarded loop iterations would jump over breakpoints
+            self._saved_skip_idle_loops = machine.skip_idle_loops
+            machine.skip_idle_loops = False
+            # Translated blocks bypass the decode cache and dispatch tables
+            if type(machine).run_cycles is not Chip8Emulator.run_cycles:
+                machine.run_cycles = types.MethodType(Chip8Emulator.run_cycles, machine)
+            machine.flush_decode_cache()
+
+    def _detach(self):
+        machine = self.machine
+        changed = False
+        for name in ('_decode', 'run_cycles'):
+            changed |= machine.__dict__.pop(name, None) is not None
+        if self._saved_tables is not None:
+            machine.opcode_handler, machine.misc_opcode_handler = self._saved_tables
+            self._saved_tables = None
+            changed = True
+        if self._saved_skip_idle_loops is not None:
+            machine.skip_idle_loops = self._saved_skip_idle_loops
+            self._saved_skip_idle_loops = None
+            changed = True
+        if changed:
+            machine.flush_decode_cache()
+
+    def _decode(self, address):
+        machine = self.machine
+        op = type(machine)._decode(machine, address)
+        if address not in self.breakpoints:
+            return op
+        condition = self.breakpoints[address]
+
+        def point():
+            if self._resume_address == address:
+                self._resume_address = None
+                return op()
+            if condition is None or condition(machine):
+                # Not executed: undo the fetch
+                machine.pc = address
+                machine.cycles -= 1
+                reason = f'break {address:03X}' + (f' ({condition})' if condition else '')
+                raise DebugBreak(reason, address)
+            return op()
+
+        if DECODE_CACHE_START <= address and address + 2 <= DECODE_CACHE_END:
+            machine._decoded[address] = point
+        return point
+
+    def _watch(self, handler, family):
+        machine = self.machine
+
+        def watched(data):
+            address = machine.pc - 2
+            accesses = _memory_accesses(machine, family, data)
+            handler(data)
+            for start, length, kind in accesses:
+                for watchpoint in self.watchpoints:
+                    if watchpoint.hits(start, length, kind):
+                        raise DebugBreak(f'{kind} {start:03X}-{start + length - 1:03X} '
+                                         f'at {address:03X} ({watchpoint})', address)
+            if family == 0x0 and data.NN == 0xee and self.return_sp is not None \
+                    and machine.sp < self.return_sp:
+                self.return_sp = None
+                self._update()
+                raise DebugBreak(f'return from {address:03X}', address)
+        return watched
@@ -0,0 +1,151 @@
+from opcodes import OpcodeData, FAMILY_DESC, MISC_DESC
+
+ENTRY = 0x200
+
+_VALID_ARITHMETIC = frozenset((0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0xe))
+_SKIPS = frozenset((0x3, 0x4, 0x5, 0x9))
+
+
+def describe(opcode):
+    return FAMILY_DESC[opcode >> 12](OpcodeData(opcode))
+
+
+def is_valid(opcode):
+    """Whether the interpreter can execute opcode without a hard fault."""
+    family = opcode >> 12
+    if family == 0x0:
+        return opcode & 0xff in (0xe0, 0xee)
+    if family == 0x8:
+        return opcode & 0xf in _VALID_ARITHMETIC
+    if family == 0xf:
+        return opcode & 0xff in MISC_DESC
+    return True
+
+
+def successors(address, opcode):
+    """Addresses execution can continue at after the instruction at address."""
+    family = opcode >> 12
+    following = address + 2
+    if family == 0x0:
+        return () if opcode & 0xff == 0xee else (following,)
+    if family == 0x1:
+        return (opcode & 0xfff,)
+    if family == 0x2:
+        return (opcode & 0xfff, following)
+    if family in _SKIPS or (family == 0xe and opcode & 0xff in (0x9e, 0xa1)):
+        return (following, following + 2)
+    if family == 0xb:
+        # Target depends on V0
+        return ()
+    return (following,)
+
+
+class Disassembler:
+    """Static disassembly of a CHIP-8 address space.
+
+    trace() walks every path reachable from the entry points to tell code
+    from data. describe() keeps an address -> text cache; each entry remembers
+    the opcode it was built from, so it is rebuilt only after the two bytes
+    at that address are written, whoever wrote them.
+    """
+    def __init__(self, ram, start=ENTRY, end=None):
+        self.ram = ram
+        self.start = start
+        self.end = len(ram) if end is None else end
+        self.code = set()
+        self.calls = set()
+        self.jumps = set()
+        self.indirect = set()
+        self._cache = {}
+
+    @classmethod
+    def from_rom(cls, code):
+        ram = bytearray(0x1000)
+        ram[ENTRY:ENTRY + len(code)] = code
+        return cls(ram, ENTRY, ENTRY + len(code))
+
+    def opcode_at(self, address):
+        return (self.ram[address] << 8) | self.ram[address + 1]
+
+    def describe(self, address):
+        """(opcode, description) of the instruction at address."""
+        opcode = self.opcode_at(address)
+        cached = self._cache.get(address)
+        if cached is None or cached[0] != opcode:
+            cached = self._cache[address] = (opcode, describe(opcode))
+        return cached
+
+    def invalidate(self, address=0, length=None):
+        if length is None:
+            self._cache.clear()
+            return
+        for key in range(address - 1, address + length):
+            self._cache.pop(key, None)
+
+    def trace(self, entries=(ENTRY,)):
+        pending = list(entries)
+        while pending:
+            address = pending.pop()
+            if address in self.code or not 0 <= address < len(self.ram) - 1:
+                continue
+            opcode = self.opcode_at(address)
+            if not is_valid(opcode):
+                continue
+            self.code.add(address)
+            family = opcode >> 12
+            if family == 0x1:
+                self.jumps.add(opcode & 0xfff)
+            elif family == 0x2:
+                self.calls.add(opcode & 0xfff)
+            elif family == 0xb:
+                self.indirect.add(address)
+            pending.extend(successors(address, opcode))
+        return self.code
+
+    def listing(self, start=None, end=None):
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        lines = []
+        address = start
+        while address < end:
+            if address in self.calls:
+                lines.append(f'sub_{address:03X}:')
+            elif address in self.jumps:
+                lines.append(f'loc_{address:03X}:')
+            if address in self.code:
+                opcode, text = self.describe(address)
+                note = '  ; indirect jump' if address in self.indirect else ''
+                lines.append(f'  {address:03X}  {opcode:04X}  {text}{note}')
+                address += 2
+                continue
+            data_start = address
+            while (address < end and address - data_start < 8 and address not in self.code
+                   and (address == data_start or address not in self.calls | self.jumps)):
+                address += 1
+            data = ', '.join(f'0x{byte:02X}' for byte in self.ram[data_start:address])
+            lines.append(f'  {data_start:03X}  db {data}')
+        return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Disassemble a CHIP-8 ROM')
+    parser.add_argument('rom')
+    parser.add_argument('--entry', type=lambda text: int(text, 16), action='append',
+                        help='extra entry point in hex, may be repeated')
+    args = parser.parse_args(argv)
+
+    with open(args.rom, 'rb') as f:
+        disassembler = Disassembler.from_rom(f.read())
+    disassembler.trace([ENTRY] + (args.entry or []))
+    for line in disassembler.listing():
+        print(line)
+    code_bytes = 2 * len(disassembler.code)
+    print(f'; {code_bytes} code bytes, {disassembler.end - disassembler.start - code_bytes} data bytes, '
+          f'{len(disassembler.indirect)} indirect jumps')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+import os
+import random
+
+import numpy as np
+
+from chip8 import Chip8Emulator, HardFaultError
+from prng import XorShift32
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+KEY_COUNT = 16
+# Action that leaves every key released
+NOOP = KEY_COUNT
+ACTION_COUNT = KEY_COUNT + 1
+
+
+class RamDeltaReward:
+    """Reward the change of an unsigned counter stored in RAM since the last step."""
+    def __init__(self, address, length=1, scale=1.0):
+        self.address = address
+        self.length = length
+        self.scale = scale
+        self.last = 0
+
+    def read(self, machine):
+        return int.from_bytes(machine.ram[self.address:self.address + self.length], 'big')
+
+    def reset(self, machine):
+        self.last = self.read(machine)
+
+    def reward(self, machine):
+        value = self.read(machine)
+        delta = value - self.last
+        self.last = value
+        return delta * self.scale
+
+
+# ROM file name -> function returning that ROM's reward hooks
+REWARD_HOOKS = {}
+
+
+def register_reward_hooks(rom_name, factory):
+    REWARD_HOOKS[rom_name] = factory
+
+
+class Chip8Env:
+    """reset()/step() environment around a Chip8Emulator.
+
+    An action is a key index 0-15, held down for the whole step, or NOOP.
+    Each step runs frame_skip 60 Hz ticks of emulated time. Observations
+    are a zero-copy uint8 view over ram[0xf00:0x1000] (so they change as
+    the machine runs), or an unpacked 32x64 array copy when unpacked=True.
+
+    Every reset() gives Cxnn a new random stream, drawn from seed so a run
+    of episodes can be repeated; reset(seed) picks the episode's stream.
+    """
+    def __init__(self, code, frame_skip=4, cpu_hz=DEFAULT_CPU_HZ, reward_hooks=(),
+                 max_steps=None, unpacked=False, seed=None):
+        self.machine = Chip8Emulator(code)
+        self._episode_seeds = random.Random(seed)
+        self.frame_skip = frame_skip
+        self.cpu_hz = cpu_hz
+        self.reward_hooks = list(reward_hooks)
+        self.max_steps = max_steps
+        self.unpacked = unpacked
+        self.steps = 0
+        self.held_key = None
+        self.screen = np.frombuffer(self.machine.ram, dtype=np.uint8)[0xf00:0x1000]
+        self.scheduler = Scheduler(self.machine, cpu_hz)
+        self._initial_state = self.machine.snapshot()
+
+    @classmethod
+    def from_rom(cls, path, **kwargs):
+        with open(path, 'rb') as f:
+            code = bytearray(f.read())
+        factory = REWARD_HOOKS.get(os.path.basename(path))
+        if factory is not None and 'reward_hooks' not in kwargs:
+            kwargs['reward_hooks'] = factory()
+        return cls(code, **kwargs)
+
+    def observation(self):
+        if self.unpacked:
+            return np.unpackbits(self.screen, bitorder='little').reshape(
+                self.machine.screen_height, self.machine.screen_width)
+        return self.screen
+
+    def reset(self, seed=None):
+        self.machine.restore(self._initial_state)
+        # The snapshot brings back the first episode's random state too
+        self.machine.rng = XorShift32(seed if seed is not None else self._episode_seeds.getrandbits(64))
+        self.scheduler = Scheduler(self.machine, self.cpu_hz)
+        self.steps = 0
+        self.held_key = None
+        for hook in self.reward_hooks:
+            hook.reset(self.machine)
+        return self.observation()
+
+    def step(self, action):
+        if not 0 <= action < ACTION_COUNT:
+            raise ValueError(f'Invalid action : {action}')
+        key = None if action == NOOP else action
+        if key != self.held_key:
+            if self.held_key is not None:
+                self.machine.key_up(self.held_key)
+            if key is not None:
+                self.machine.key_down(key)
+            self.held_key = key
+
+        info = {}
+        done = False
+        try:
+            self.scheduler.run_ticks(self.frame_skip)
+        except HardFaultError as e:
+            info['fault'] = e.msg
+            done = True
+        self.steps += 1
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            done = True
+        reward = sum(hook.reward(self.machine) for hook in self.reward_hooks)
+        return self.observation(), reward, done, info
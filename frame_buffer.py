@@ -0,0 +1,102 @@
+# Sprite bytes keep their leftmost pixel in bit 7, while the frame buffer
+# keeps pixel x of a row in bit x (see BitBuffer), so sprite rows are
+# bit reversed before they are shifted into place.
+_REVERSED = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+
+
+def dirty_rects(masks):
+    """(x, y, width, height) rects covering per-row masks of changed pixels.
+
+    Consecutive dirty rows are merged into one rect spanning the union of
+    their changed columns.
+    """
+    rects = []
+    band = None
+    for y, mask in enumerate(masks):
+        if not mask:
+            band = None
+            continue
+        left = (mask & -mask).bit_length() - 1
+        right = mask.bit_length()
+        if band is None:
+            band = [left, y, right, y + 1]
+            rects.append(band)
+        else:
+            band[0] = min(band[0], left)
+            band[2] = max(band[2], right)
+            band[3] = y + 1
+    return [(left, top, right - left, bottom - top) for left, top, right, bottom in rects]
+
+
+class FrameBuffer:
+    """Monochrome frame buffer drawn one row at a time.
+
+    Rows live in buffer[offset:] with the same layout BitBuffer uses, and
+    each row is handled as a single little endian integer. dirty[y] holds
+    the pixels of row y that changed since the last take_dirty_rects().
+    """
+    def __init__(self, buffer, offset, width, height):
+        self.buffer = buffer
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.row_size = width // 8
+        self.size = self.row_size * height
+        self.row_mask = (1 << width) - 1
+        self.dirty = [self.row_mask] * height
+
+    def clear(self):
+        dirty = self.dirty
+        for y in range(self.height):
+            dirty[y] |= self.get_row(y)
+        self.buffer[self.offset:self.offset + self.size] = bytes(self.size)
+
+    def mark_dirty(self):
+        """Redraw everything, e.g. after the buffer was written behind our back."""
+        self.dirty[:] = [self.row_mask] * self.height
+
+    def mark_bytes_dirty(self, address, length):
+        """Redraw the rows holding buffer[address:address + length]."""
+        start = max(address, self.offset) - self.offset
+        end = min(address + length, self.offset + self.size) - self.offset
+        if start >= end:
+            return
+        for y in range(start // self.row_size, (end - 1) // self.row_size + 1):
+            self.dirty[y] = self.row_mask
+
+    def take_dirty_rects(self):
+        """Return and reset the changed area, see dirty_rects()."""
+        rects = dirty_rects(self.dirty)
+        self.dirty[:] = [0] * self.height
+        return rects
+
+    def get_row(self, y):
+        start = self.offset + y * self.row_size
+        return int.from_bytes(self.buffer[start:start + self.row_size], 'little')
+
+    def draw(self, x, y, sprite):
+        """XOR sprite rows onto the screen at (x, y) with wraparound.
+
+        Returns True if any pixel was switched off.
+        """
+        buffer = self.buffer
+        width = self.width
+        row_size = self.row_size
+        dirty = self.dirty
+        x %= width
+        collision = False
+        for i, line in enumerate(sprite):
+            if line == 0:
+                continue
+            bits = _REVERSED[line] << x
+            bits = (bits | (bits >> width)) & self.row_mask
+
+            row_index = (y + i) % self.height
+            start = self.offset + row_index * row_size
+            end = start + row_size
+            row = int.from_bytes(buffer[start:end], 'little')
+            if row & bits:
+                collision = True
+            buffer[start:end] = (row ^ bits).to_bytes(row_size, 'little')
+            dirty[row_index] |= bits
+        return collision
@@ -0,0 +1,63 @@
+import collections
+
+DEFAULT_BUDGET = 16 * 1024 * 1024
+# Frames remembered by worth_keeping() that were not cached yet
+MISSED_LIMIT = 1024
+
+
+class FrameCache:
+    """Bounded LRU cache of whatever was rendered for a frame buffer.
+
+    Keys are the frame buffer bytes, so a screen the game showed before
+    (title screens, blinking sprites) is found again however it came back.
+    Every entry is charged the size it was put with; when the total exceeds
+    budget the least recently used entries are dropped.
+    """
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        # Frame -> misses, for frames that are not cached
+        self._missed = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._missed.clear()
+        self.size = 0
+
+    def get(self, frame):
+        """What was put for frame, or None."""
+        key = bytes(frame)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            self._missed[key] = self._missed.pop(key, 0) + 1
+            if len(self._missed) > MISSED_LIMIT:
+                self._missed.popitem(last=False)
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def worth_keeping(self, frame):
+        """Whether frame missed before: frames shown only once are not worth a copy."""
+        return self._missed.get(bytes(frame), 0) > 1
+
+    def put(self, frame, value, size):
+        key = bytes(frame)
+        self._missed.pop(key, None)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        if size > self.budget:
+            return
+        self._entries[key] = (value, size)
+        self.size += size
+        while self.size > self.budget:
+            _, (_, dropped) = self._entries.popitem(last=False)
+            self.size -= dropped
@@ -0,0 +1,277 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chip8 import Chip8Emulator, HardFaultError
+from disassembler import describe, ENTRY
+import headless
+from headless import DEFAULT_PROGRAMS, find_roms
+from opcodes import MISC_DESC
+from recompiler import MAX_BLOCK_LENGTH
+
+DEFAULT_CYCLES = 2_000
+MAX_PROGRAM_LENGTH = 64
+# 8000 (V0 = V0) changes nothing, the shrinker uses it to blank instructions
+NOP = b'\x80\x00'
+
+
+def _vector(code, seed):
+    # Imported here: only this engine needs numpy
+    from vector import VectorLane
+    return VectorLane(code, seed=seed)
+
+
+ENGINES = dict(headless.ENGINES, vector=_vector)
+# Throwaway programs are not worth a file in the translation cache
+ENGINE_OPTIONS = {'aot': {'cache_dir': None}}
+
+_ARITHMETIC = (0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0xe)
+_MISC = tuple(sorted(MISC_DESC))
+# Register arithmetic is where fast paths diverge most easily, control flow
+# mostly needs to keep programs running
+_FAMILIES = (0x0, 0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x6, 0x6, 0x7, 0x7, 0x7, 0x8, 0x8, 0x8, 0x8,
+             0x8, 0x9, 0xa, 0xa, 0xb, 0xc, 0xd, 0xe, 0xf, 0xf, 0xf)
+
+
+def reference(code, seed):
+    """Today's interpreter handlers, one instruction at a time."""
+    machine = Chip8Emulator(code, seed=seed)
+    machine.skip_idle_loops = False
+    return machine
+
+
+def random_opcode(rng, end):
+    """Mostly valid opcodes whose jumps and I tend to land inside [ENTRY, end)."""
+    family = rng.choice(_FAMILIES)
+    x, y = rng.randrange(16), rng.randrange(16)
+    target = rng.randrange(ENTRY, max(end, ENTRY + 2), 2)
+    if rng.randrange(128) == 0:
+        return rng.randrange(0x10000)
+    if family == 0x0:
+        return rng.choice((0x00e0, 0x00ee))
+    if family in (0x1, 0x2):
+        return family << 12 | target
+    if family == 0x8:
+        return 0x8000 | x << 8 | y << 4 | rng.choice(_ARITHMETIC)
+    if family == 0xa:
+        # Anywhere, or in the frame buffer, where loads and stores fault at the end of RAM
+        return 0xa000 | rng.choice((target, target, rng.randrange(0x1000), rng.randrange(0xf00, 0x1000)))
+    if family == 0xb:
+        return 0xb000 | max(target - rng.randrange(0x20) * 2, ENTRY)
+    if family == 0xe:
+        return 0xe000 | x << 8 | rng.choice((0x9e, 0xa1))
+    if family == 0xf:
+        return 0xf000 | x << 8 | rng.choice(_MISC)
+    return family << 12 | x << 8 | rng.randrange(0x100)
+
+
+def random_program(rng):
+    length = rng.randrange(1, MAX_PROGRAM_LENGTH + 1)
+    end = ENTRY + 2 * length
+    opcodes = [random_opcode(rng, end) for _ in range(length - 1)]
+    # Loop back instead of running off into empty RAM
+    opcodes.append(0x1000 | rng.randrange(ENTRY, end, 2))
+    return b''.join(opcode.to_bytes(2, 'big') for opcode in opcodes)
+
+
+def mutate(rng, code):
+    """A few random instruction replacements, bit flips and copies in code."""
+    code = bytearray(code[:2 * MAX_PROGRAM_LENGTH * 4])
+    end = ENTRY + len(code)
+    for _ in range(rng.randrange(1, 9)):
+        i = rng.randrange(0, max(len(code) - 1, 1), 2)
+        kind = rng.randrange(3)
+        if kind == 0:
+            code[i:i + 2] = random_opcode(rng, end).to_bytes(2, 'big')
+        elif kind == 1 and code:
+            code[i] ^= 1 << rng.randrange(8)
+        else:
+            j = rng.randrange(0, max(len(code) - 1, 1), 2)
+            code[j:j + 2] = code[i:i + 2]
+    return bytes(code)
+
+
+def generate_case(base_seed, index, corpus=()):
+    """(code, seed) of case index, the same for a given base seed and corpus."""
+    rng = random.Random(base_seed << 32 | index)
+    if corpus and rng.randrange(2):
+        code = mutate(rng, rng.choice(corpus))
+    else:
+        code = random_program(rng)
+    return code, rng.randrange(1 << 32)
+
+
+def compare(expected, actual):
+    """First difference between two machines, or None."""
+    for name in ('pc', 'I', 'sp', 'cycles', 'delay_count', 'sound_count'):
+        if getattr(expected, name) != getattr(actual, name):
+            return f'{name} {getattr(actual, name):#x} != {getattr(expected, name):#x}'
+    for i in range(16):
+        if expected.registers[i] != actual.registers[i]:
+            return f'V{i:X} {actual.registers[i]:#x} != {expected.registers[i]:#x}'
+    if expected.ram != actual.ram:
+        address = next(i for i, (a, b) in enumerate(zip(expected.ram, actual.ram)) if a != b)
+        return f'ram[{address:#x}] {actual.ram[address]:#x} != {expected.ram[address]:#x}'
+    return None
+
+
+def _fault(machine, count):
+    try:
+        machine.run_cycles(count)
+    except HardFaultError as e:
+        return f'HardFaultError : {e.msg}'
+    except Exception as e:
+        return f'{type(e).__name__} : {e}'
+    return None
+
+
+def run_case(engine, code, seed, cycles=DEFAULT_CYCLES):
+    """Run code on the reference and on engine in lockstep.
+
+    Both run the same randomly sized steps (so blocks are sometimes cut
+    short), with the same key changes and timer ticks between steps, and
+    are compared after each. Faults must match and do not end the run: like
+    the frontend, both carry on after the faulting instruction. Returns
+    (cycle, difference) or None.
+    """
+    expected = reference(code, seed)
+    actual = ENGINES[engine](code, seed=seed, **ENGINE_OPTIONS.get(engine, {}))
+    rng = random.Random(seed)
+    while expected.cycles < cycles:
+        event = rng.randrange(8)
+        if event == 0:
+            expected.tick60Hz()
+            actual.tick60Hz()
+        elif event == 1:
+            key = rng.randrange(16)
+            pressed = not expected.key_buffer[key]
+            for machine in (expected, actual):
+                if pressed:
+                    machine.key_down(key)
+                else:
+                    machine.key_up(key)
+
+        step = min(rng.randrange(1, 2 * MAX_BLOCK_LENGTH + 1), cycles - expected.cycles)
+        cycle = expected.cycles
+        expected_fault = _fault(expected, step)
+        actual_fault = _fault(actual, step)
+        # Messages are worded differently by VectorChip8, only compare whether both faulted
+        if (expected_fault is None) != (actual_fault is None):
+            return cycle, f'fault {actual_fault} != {expected_fault}'
+        difference = compare(expected, actual)
+        if difference is not None:
+            return expected.cycles, difference
+    return None
+
+
+def shrink(engine, code, seed, cycles=DEFAULT_CYCLES):
+    """Smallest program (by instructions, then non-NOPs) that still diverges."""
+    def fails(words):
+        return run_case(engine, b''.join(words), seed, cycles) is not None
+
+    words = [code[i:i + 2] for i in range(0, len(code), 2)]
+    # Delta debugging over whole instructions
+    parts = 2
+    while len(words) >= 2:
+        size = -(-len(words) // parts)
+        for start in range(0, len(words), size):
+            candidate = words[:start] + words[start + size:]
+            if fails(candidate):
+                words = candidate
+                parts = max(parts - 1, 2)
+                break
+        else:
+            if parts >= len(words):
+                break
+            parts = min(parts * 2, len(words))
+    for i, word in enumerate(words):
+        if word != NOP and fails(words[:i] + [NOP] + words[i + 1:]):
+            words[i] = NOP
+    return b''.join(words)
+
+
+class Failure:
+    def __init__(self, engine, index, seed, code, cycle, difference):
+        self.engine = engine
+        self.index = index
+        self.seed = seed
+        self.code = code
+        self.cycle = cycle
+        self.difference = difference
+
+    def listing(self):
+        """Disassembly of the reproducer, without the NOPs it was padded with."""
+        lines = []
+        for address in range(0, len(self.code) - 1, 2):
+            word = self.code[address:address + 2]
+            if word != NOP:
+                opcode = int.from_bytes(word, 'big')
+                lines.append(f'{ENTRY + address:03X}: {opcode:04X}  {describe(opcode)}')
+        return '\n'.join(lines)
+
+
+def _fuzz_batch(job):
+    engine, base_seed, indices, corpus, cycles = job
+    failures = []
+    for index in indices:
+        code, seed = generate_case(base_seed, index, corpus)
+        if run_case(engine, code, seed, cycles) is not None:
+            code = shrink(engine, code, seed, cycles)
+            cycle, difference = run_case(engine, code, seed, cycles)
+            failures.append(Failure(engine, index, seed, code, cycle, difference))
+    return failures
+
+
+def fuzz(engine, cases, base_seed=0, corpus=(), cycles=DEFAULT_CYCLES, jobs=None):
+    """Failures (already shrunk) among cases generated from base_seed."""
+    workers = jobs or os.cpu_count() or 1
+    batches = [range(start, cases, workers * 4) for start in range(min(workers * 4, cases))]
+    work = [(engine, base_seed, batch, tuple(corpus), cycles) for batch in batches]
+    if jobs == 1:
+        results = [_fuzz_batch(job) for job in work]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_fuzz_batch, work))
+    return sorted((failure for result in results for failure in result), key=lambda f: f.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fuzz engines against the reference interpreter')
+    parser.add_argument('--engine', choices=sorted(ENGINES), action='append',
+                        help='engine to fuzz, may be repeated (default: all)')
+    parser.add_argument('--cases', type=int, default=1000, help='programs per engine')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cycles', type=int, default=DEFAULT_CYCLES, help='instructions per program')
+    parser.add_argument('--corpus', nargs='*', default=[DEFAULT_PROGRAMS],
+                        help='ROMs or directories to mutate (default: programs/)')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--save', help='write each reproducer to this directory')
+    args = parser.parse_args(argv)
+
+    corpus = []
+    for path in find_roms(args.corpus):
+        with open(path, 'rb') as f:
+            corpus.append(f.read())
+
+    failures = 0
+    for engine in args.engine or sorted(ENGINES):
+        start = time.perf_counter()
+        found = fuzz(engine, args.cases, args.seed, corpus, args.cycles, args.jobs)
+        for failure in found:
+            print(f'{engine} case {failure.index} (seed {failure.seed}) at cycle {failure.cycle} : '
+                  f'{failure.difference}')
+            print(failure.listing())
+            if args.save:
+                os.makedirs(args.save, exist_ok=True)
+                name = f'{engine}-{args.seed}-{failure.index}.ch8'
+                with open(os.path.join(args.save, name), 'wb') as f:
+                    f.write(failure.code)
+        failures += len(found)
+        print(f'{engine:<12} {args.cases} cases, {len(found)} failures in {time.perf_counter() - start:.2f}s')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chip8 import HardFaultError
+from headless import ENGINES, DEFAULT_PROGRAMS, find_roms, frame_hash
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'golden.json')
+DEFAULT_CHECKPOINTS = tuple(range(2_000, 20_001, 2_000))
+# (cycle, key, pressed): enough to get past title screens and move around
+DEFAULT_INPUTS = (
+    (3_000, 0x5, True), (3_600, 0x5, False),
+    (5_000, 0x4, True), (8_000, 0x4, False),
+    (9_000, 0x6, True), (12_000, 0x6, False),
+    (13_000, 0x1, True), (14_000, 0x1, False),
+    (15_000, 0xc, True), (17_000, 0xc, False),
+)
+
+
+def run_checkpoints(code, inputs, checkpoints, engine='interpreter', cpu_hz=DEFAULT_CPU_HZ, seed=0,
+                    engine_options=None):
+    """Return [(cycle, frame sha1, ram sha1)] at every checkpoint reached and the fault, if any."""
+    machine = ENGINES[engine](code, seed=seed, **(engine_options or {}).get(engine, {}))
+    scheduler = Scheduler(machine, cpu_hz)
+    events = sorted([(cycle, 1, key, pressed) for cycle, key, pressed in inputs] +
+                    [(cycle, 0, None, None) for cycle in checkpoints])
+    hashes = []
+    try:
+        for cycle, is_input, key, pressed in events:
+            scheduler.run_cycles(cycle - machine.cycles)
+            if not is_input:
+                hashes.append((cycle, frame_hash(machine), hashlib.sha1(machine.ram).hexdigest()))
+            elif pressed:
+                machine.key_down(key)
+            else:
+                machine.key_up(key)
+    except HardFaultError as e:
+        return hashes, f'Hard fault at cycle {machine.cycles} : {e.msg}'
+    except Exception as e:
+        return hashes, f'{type(e).__name__} at cycle {machine.cycles} : {e}'
+    return hashes, None
+
+
+def _run_job(job):
+    path, entry, engine, cpu_hz, seed, engine_options = job
+    with open(path, 'rb') as f:
+        code = bytearray(f.read())
+    checkpoints = [checkpoint['cycle'] for checkpoint in entry['checkpoints']]
+    hashes, fault = run_checkpoints(code, entry['inputs'], checkpoints, engine, cpu_hz, seed, engine_options)
+    return {
+        'inputs': entry['inputs'],
+        'checkpoints': [{'cycle': cycle, 'frame': frame, 'ram': ram} for cycle, frame, ram in hashes],
+        'fault': fault,
+    }
+
+
+def _run_jobs(jobs, workers):
+    if workers == 1:
+        return [_run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_job, jobs))
+
+
+def first_difference(expected, actual):
+    """Describe where actual first diverges from the golden entry, or None."""
+    for want, got in zip(expected['checkpoints'], actual['checkpoints']):
+        for field in ('frame', 'ram'):
+            if want[field] != got[field]:
+                return f'{field} differs at cycle {want["cycle"]}'
+    if len(actual['checkpoints']) < len(expected['checkpoints']):
+        cycle = expected['checkpoints'][len(actual['checkpoints'])]['cycle']
+        return f'stopped before cycle {cycle} : {actual["fault"]}'
+    if actual['fault'] != expected['fault']:
+        return f'fault differs : {actual["fault"]} != {expected["fault"]}'
+    return None
+
+
+def generate(paths, engine='interpreter', checkpoints=DEFAULT_CHECKPOINTS, inputs=DEFAULT_INPUTS,
+             cpu_hz=DEFAULT_CPU_HZ, seed=0, workers=None):
+    roms = find_roms(paths)
+    entry = {'inputs': [list(event) for event in inputs],
+             'checkpoints': [{'cycle': cycle} for cycle in checkpoints]}
+    results = _run_jobs([(rom, entry, engine, cpu_hz, seed, None) for rom in roms], workers)
+    return {
+        'cpu_hz': cpu_hz,
+        'seed': seed,
+        'roms': {os.path.basename(rom): result for rom, result in zip(roms, results)},
+    }
+
+
+def check(manifest, programs=DEFAULT_PROGRAMS, engine='interpreter', workers=None, engine_options=None):
+    """Return [(rom, first difference or None)] for every ROM in the manifest."""
+    names = sorted(manifest['roms'])
+    jobs = [(os.path.join(programs, name), manifest['roms'][name], engine, manifest['cpu_hz'], manifest['seed'],
+             engine_options) for name in names]
+    results = _run_jobs(jobs, workers)
+    return [(name, first_difference(manifest['roms'][name], result)) for name, result in zip(names, results)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare ROM runs against golden frame and RAM hashes')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    parser.add_argument('--programs', default=DEFAULT_PROGRAMS)
+    parser.add_argument('--engine', choices=sorted(ENGINES), action='append',
+                        help='engine to check, may be repeated (default: all)')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--update', action='store_true',
+                        help='rewrite the manifest from the reference interpreter')
+    args = parser.parse_args(argv)
+
+    if args.update:
+        manifest = generate([args.programs], workers=args.jobs)
+        with open(args.manifest, 'w') as f:
+            json.dump(manifest, f, indent=1)
+            f.write('\n')
+        print(f'Wrote {len(manifest["roms"])} roms to {args.manifest}')
+        return 0
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    failures = 0
+    for engine in args.engine or sorted(ENGINES):
+        start = time.perf_counter()
+        for name, difference in check(manifest, args.programs, engine, args.jobs):
+            if difference is not None:
+                failures += 1
+                print(f'{engine:<12} {name:<12} {difference}')
+        print(f'{engine:<12} {len(manifest["roms"])} roms in {time.perf_counter() - start:.2f}s')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
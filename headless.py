@@ -0,0 +1,160 @@
+import hashlib
+import os
+import time
+
+from aot import Chip8AotEmulator
+from chip8 import Chip8Emulator, HardFaultError
+from recompiler import Chip8Recompiler
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+ENGINES = {
+    'interpreter': Chip8Emulator,
+    'recompiler': Chip8Recompiler,
+    'aot': Chip8AotEmulator,
+}
+
+DEFAULT_PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+DEFAULT_CYCLES = 100_000
+
+
+class RunResult:
+    def __init__(self, rom, cycles, wall_time, frame_hash, fault=None):
+        self.rom = rom
+        self.cycles = cycles
+        self.wall_time = wall_time
+        self.frame_hash = frame_hash
+        self.fault = fault
+
+    def to_dict(self):
+        return {
+            'rom': self.rom,
+            'cycles': self.cycles,
+            'wall_time': self.wall_time,
+            'frame_hash': self.frame_hash,
+            'fault': self.fault,
+        }
+
+
+def frame_hash(machine):
+    return hashlib.sha1(machine.ram[0xf00:0x1000]).hexdigest()
+
+
+def parse_key_event(text):
+    """Parse 'CYCLE:KEY:down' or 'CYCLE:KEY:up', KEY in hex."""
+    try:
+        cycle, key, action = text.split(':')
+        event = (int(cycle), int(key, 16), {'down': True, 'up': False}[action])
+    except (ValueError, KeyError):
+        raise ValueError(f'Invalid key event : {text}')
+    if not 0 <= event[1] < 16:
+        raise ValueError(f'Invalid key : {text}')
+    return event
+
+
+def run_machine(machine, cycles, inputs=(), cpu_hz=DEFAULT_CPU_HZ):
+    """Run machine for cycles instructions, applying (cycle, key, pressed) events."""
+    scheduler = Scheduler(machine, cpu_hz)
+    for cycle, key, pressed in sorted(inputs):
+        if cycle >= cycles:
+            break
+        scheduler.run_cycles(cycle - machine.cycles)
+        if pressed:
+            machine.key_down(key)
+        else:
+            machine.key_up(key)
+    scheduler.run_cycles(cycles - machine.cycles)
+    return scheduler
+
+
+def run_rom(path, cycles=DEFAULT_CYCLES, frames=None, inputs=(), cpu_hz=DEFAULT_CPU_HZ, engine='interpreter', seed=0,
+            engine_options=None):
+    """Run path for cycles instructions, or for frames 60 Hz frames when given.
+
+    engine_options maps engine names to extra constructor arguments.
+    """
+    if frames is not None:
+        cycles = frames * cpu_hz // 60
+    with open(path, 'rb') as f:
+        code = bytearray(f.read())
+
+    start = time.perf_counter()
+    machine = ENGINES[engine](code, seed=seed, **(engine_options or {}).get(engine, {}))
+    fault = None
+    try:
+        run_machine(machine, cycles, inputs, cpu_hz)
+    except HardFaultError as e:
+        fault = f'Hard fault : {e.msg}'
+    except Exception as e:
+        fault = f'{type(e).__name__} : {e}'
+    wall_time = time.perf_counter() - start
+    return RunResult(path, machine.cycles, wall_time, frame_hash(machine), fault)
+
+
+def _run_job(job):
+    path, options = job
+    return run_rom(path, **options)
+
+
+def run_roms(paths, jobs=None, **options):
+    """Run every ROM in paths on a process pool, results in the same order."""
+    work = [(path, options) for path in paths]
+    if jobs == 1:
+        return [_run_job(job) for job in work]
+    # Imported here: worker processes load this module and only need the core
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_run_job, work))
+
+
+def find_roms(paths):
+    roms = []
+    for path in paths:
+        if os.path.isdir(path):
+            roms.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                               if os.path.isfile(os.path.join(path, name))))
+        else:
+            roms.append(path)
+    return roms
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Run CHIP-8 ROMs without a window')
+    parser.add_argument('roms', nargs='*', default=[DEFAULT_PROGRAMS],
+                        help='ROM files or directories (default: programs/)')
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument('--cycles', type=int, help='instructions to run per ROM')
+    budget.add_argument('--frames', type=int, help='60 Hz frames to run per ROM')
+    parser.add_argument('--cpu-hz', type=int, default=DEFAULT_CPU_HZ)
+    parser.add_argument('--seed', type=int, default=0, help='seed for Cxnn random numbers')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='interpreter')
+    parser.add_argument('--key', action='append', default=[], type=parse_key_event,
+                        metavar='CYCLE:KEY:down|up', help='scripted key event, may be repeated')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    options = {'inputs': args.key, 'cpu_hz': args.cpu_hz, 'engine': args.engine, 'seed': args.seed}
+    if args.frames is not None:
+        options['frames'] = args.frames
+    else:
+        options['cycles'] = args.cycles if args.cycles is not None else DEFAULT_CYCLES
+
+    start = time.perf_counter()
+    results = run_roms(find_roms(args.roms), jobs=args.jobs, **options)
+    for result in results:
+        status = result.fault or 'ok'
+        print(f'{os.path.basename(result.rom):<12} {result.cycles:>10} cycles '
+              f'{result.wall_time:8.3f}s  {result.frame_hash[:12]}  {status}')
+    print(f'{len(results)} roms in {time.perf_counter() - start:.3f}s')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+    return 1 if any(result.fault for result in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,31 @@
+import contextlib
+import functools
+import os
 import time
 import string
+import argparse
 from enum import Enum
 
 import pygame
 
+from audio import AUDIO_BACKENDS, create_audio_backend
 from chip8 import Chip8Emulator, HardFaultError
 from color import Color
+from cpu_thread import CpuThread, FrameExchange
+from debugger import Debugger, DebugBreak
+from disassembler import Disassembler
+from frame_cache import FrameCache, DEFAULT_BUDGET as DEFAULT_FRAME_CACHE_BUDGET
+from render import machine_screen_rects, panel_changed, paint_rects, scale_rect
+from replay import InputRecorder
+from rewind import RewindBuffer, DEFAULT_BUDGET, DEFAULT_INTERVAL
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+from shared_state import SharedState
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'Anonymous_Pro.ttf')
+# Rendered strings kept by draw_text
+TEXT_CACHE_SIZE = 1024
+MIN_CPU_HZ = 60
+MAX_CPU_HZ = 8_000_000
 
 class EmulatorControlType(Enum):
     HELP = -1
@@ -15,34 +35,51 @@ class EmulatorControlType(Enum):
     MEMORY = 3
 
 class Emulator:
-    def __init__(self, machine, width, height, screen_scale, caption):
+    def __init__(self, machine, width, height, screen_scale, caption, cpu_hz=DEFAULT_CPU_HZ, target_fps=60,
+                 rewind_budget=DEFAULT_BUDGET, rewind_interval=DEFAULT_INTERVAL, recorder=None, threaded=False,
+                 shared_state=None, frame_cache_budget=DEFAULT_FRAME_CACHE_BUDGET):
         self.machine = machine
+        self.shared_state = shared_state
+        self.disassembler = Disassembler(machine.ram)
+        self.debugger = Debugger(machine)
+        self.recorder = recorder
+        self.scheduler = Scheduler(machine, cpu_hz)
+        self.rewind_buffer = RewindBuffer(rewind_budget, rewind_interval)
+        # With threaded the machine runs on its own thread and only renders here
+        self.cpu = CpuThread(self.emulate, FrameExchange(machine.frame_buffer)) if threaded else None
         self.width = width
         self.height = height
         self.screen_scale = screen_scale
         self.control_type = EmulatorControlType.MAIN
-        pygame.init()
+        self.caption = caption
         self.clock = pygame.time.Clock()
 
-        pygame.display.set_caption(caption)
-        self.screen = pygame.display.set_mode((width, height))
-
+        # The window, font and panel surfaces are created on first use
         self.font_size = 20
-        self.font = pygame.font.Font('resources\\Anonymous_Pro.ttf', self.font_size)
-        self.help_screen = pygame.Surface((width, height))
-        self.chip_screen_scale = pygame.Surface((machine.screen_width * screen_scale, machine.screen_height * screen_scale))
-        self.chip_screen = pygame.Surface((machine.screen_width, machine.screen_height))
-        self.keyboard_screen = pygame.Surface((80, self.chip_screen_scale.get_height()))
-        self.main_screen = pygame.Surface((width // 2, height // 2))
-        self.memory_screen = pygame.Surface((width // 2, height // 2))
-        self.register_screen = pygame.Surface((width // 2, height // 2))
-        self.instruction_screen = pygame.Surface((width // 2, height // 2))
+        self.render_text = functools.lru_cache(maxsize=TEXT_CACHE_SIZE)(self._render_text)
+        # Panel name -> state it was last drawn with
+        self.panel_state = {}
+        # Frame buffer bytes -> scaled machine screen
+        self.frame_cache = FrameCache(frame_cache_budget)
+        # chip_screen is behind chip_screen_scale after a frame came from the cache
+        self.chip_screen_stale = False
+        self.frame_cache_stats = (0, 0, 0)
 
         self.memory_address = 0
         self.memory_address_text = '0000'
         self.step = False
+        # INSTRUCTION mode: run until the next breakpoint instead of stepping
+        self.debug_running = False
+        self.debug_command = ''
+        self.rewind_held = False
+        # scheduler.ticks when the rewind buffer last recorded a frame
+        self.rewind_ticks = 0
+        # Last hard fault printed, so a machine stuck faulting prints it once
+        self.fault = None
+        self.was_running = False
         self.fps = 0
-        self.target_fps = 180
+        self.ips = 0
+        self.target_fps = target_fps
         self.key_mapping = {}
         self.key_mapping[pygame.K_1] = 0x0
         self.key_mapping[pygame.K_2] = 0x1
@@ -61,10 +98,55 @@ class Emulator:
         self.key_mapping[pygame.K_c] = 0xe
         self.key_mapping[pygame.K_v] = 0xf
         
+    @functools.cached_property
+    def screen(self):
+        pygame.display.init()
+        pygame.display.set_caption(self.caption)
+        return pygame.display.set_mode((self.width, self.height))
+
+    @functools.cached_property
+    def font(self):
+        pygame.font.init()
+        return pygame.font.Font(FONT_PATH, self.font_size)
+
+    @functools.cached_property
+    def help_screen(self):
+        return pygame.Surface((self.width, self.height))
+
+    @functools.cached_property
+    def chip_screen_scale(self):
+        return pygame.Surface((self.machine.screen_width * self.screen_scale,
+                               self.machine.screen_height * self.screen_scale))
+
+    @functools.cached_property
+    def chip_screen(self):
+        return pygame.Surface((self.machine.screen_width, self.machine.screen_height))
+
+    @functools.cached_property
+    def keyboard_screen(self):
+        return pygame.Surface((80, self.machine.screen_height * self.screen_scale))
+
+    @functools.cached_property
+    def main_screen(self):
+        return pygame.Surface((self.width // 2, self.height // 2))
+
+    @functools.cached_property
+    def memory_screen(self):
+        return pygame.Surface((self.width // 2, self.height // 2))
+
+    @functools.cached_property
+    def register_screen(self):
+        return pygame.Surface((self.width // 2, self.height // 2))
+
+    @functools.cached_property
+    def instruction_screen(self):
+        return pygame.Surface((self.width // 2, self.height // 2))
+
     def handle_keyboard_input(self, event):
         keys = pygame.key.get_pressed()
         if keys[pygame.K_ESCAPE]:
             self.control_type = EmulatorControlType.MAIN
+            self.debug_running = False
             print('control type = Main')
             return
 
@@ -83,8 +165,17 @@ class Emulator:
                     self.control_type = EmulatorControlType.MEMORY
                     print('control type = Memory')
         elif self.control_type == EmulatorControlType.INSTRUCTION:
-            if keys[pygame.K_s]:
+            if keys[pygame.K_RETURN]:
+                self.on_cpu(self.debugger_command, self.debug_command)
+                self.debug_command = ''
+            elif keys[pygame.K_BACKSPACE]:
+                self.debug_command = self.debug_command[:-1]
+            elif not self.debug_command and keys[pygame.K_s]:
                 self.step = True
+            elif not self.debug_command and keys[pygame.K_c]:
+                self.debug_running = True
+            else:
+                self.debug_command += event.unicode
         elif self.control_type == EmulatorControlType.REGISTER:
             pass
         elif self.control_type == EmulatorControlType.MEMORY:
@@ -103,38 +194,83 @@ class Emulator:
         else:
             raise Exception('Unknown control type')
 
+    def panel_changed(self, name, state):
+        """Remember state for the panel, True if it differs from last time."""
+        return panel_changed(self.panel_state, name, state)
+
+    def invalidate_panels(self):
+        self.panel_state.clear()
+
     def draw_help_screen(self, screen):
+        if not self.panel_changed('help', ()):
+            return
+        screen.fill(Color.BLACK)
         x, y = (10, 30)
         text = [
             'Ctrl + S : Single step instrcution',
+            '  S : Step, C : Continue, Esc : Run',
+            '  b ADDR [Vx==NN] : Breakpoint',
+            '  w/r ADDR [LEN] : Write/read watchpoint',
+            '  u : Run until return, d [ADDR] : Delete',
             'Ctrl + R : Select memory sub screen',
             'Ctrl + M : Select memory sub screen',
+            'O / P : Double / halve cpu frequency',
+            'Hold Backspace : Rewind',
             'Esc to leave',
         ]
         for i in range(len(text)):
             self.draw_text(screen, text[i], x, y + i * self.font_size)
 
     def draw_main_screen(self, screen):
+        state = (self.fps, self.target_fps, self.scheduler.cpu_hz, self.ips, self.frame_cache_stats)
+        if not self.panel_changed('main', state):
+            return
         screen.fill(Color.BLACK)
-        
+
         self.draw_text(screen, f'fps = {self.fps}(target = {self.target_fps})', 10, 200)
+        self.draw_text(screen, f'cpu = {self.scheduler.cpu_hz} Hz({self.ips} ips)', 10, 200 + self.font_size)
+        frames, hits, misses = self.frame_cache_stats
+        self.draw_text(screen, f'frame cache = {frames}({hits} hits, {misses} misses)', 10, 200 + 2 * self.font_size)
 
     def draw_machine_screen(self, screen, screen_scale):
-        if not self.machine.needs_to_redraw:
+        frame_buffer = self.machine.frame_buffer
+        if self.cpu is not None:
+            frame = self.cpu.frames.take()
+            if frame is None:
+                return
+            frame, rects = frame
+        else:
+            if not self.machine.needs_to_redraw:
+                return
+            self.machine.needs_to_redraw = False
+            frame = memoryview(self.machine.ram)[frame_buffer.offset:frame_buffer.offset + frame_buffer.size]
+            rects = frame_buffer.take_dirty_rects()
+        if not rects:
+            return
+        scaled = self.frame_cache.get(frame)
+        if scaled is not None:
+            screen_scale.blit(scaled, (0, 0))
+            self.chip_screen_stale = True
             return
+        rects = machine_screen_rects(rects, self.chip_screen_stale, frame_buffer.width, frame_buffer.height)
+        self.chip_screen_stale = False
 
-        self.machine.needs_to_redraw = False
-        screen.fill(Color.BLACK)
+        import numpy as np
 
-        for y in range(self.machine.screen_height):
-            for x in range(self.machine.screen_width):
-                index = y * self.machine.screen_width + x
-                if self.machine.screen_buffer[index] > 0:
-                    screen.set_at((x, y), Color.GREEN)
-        size = (self.machine.screen_width * self.screen_scale, self.machine.screen_height * self.screen_scale)
-        pygame.transform.scale(screen, size, screen_scale)
+        colors = np.array([screen.map_rgb(Color.BLACK), screen.map_rgb(Color.GREEN)], np.uint32)
+        surface_pixels = pygame.surfarray.pixels2d(screen)
+        paint_rects(surface_pixels, frame, frame_buffer.width, frame_buffer.height, rects, colors)
+        del surface_pixels
+        for rect in rects:
+            scaled_rect = scale_rect(rect, self.screen_scale)
+            pygame.transform.scale(screen.subsurface(rect), scaled_rect[2:], screen_scale.subsurface(scaled_rect))
+        if self.frame_cache.worth_keeping(frame):
+            self.frame_cache.put(frame, screen_scale.copy(),
+                                 screen_scale.get_width() * screen_scale.get_height() * screen_scale.get_bytesize())
 
     def draw_keyboard_screen(self, screen, key_status):
+        if not self.panel_changed('keyboard', tuple(key_status)):
+            return
         screen.fill(Color.BLUE)
         w = screen.get_width() / 2
         h = screen.get_height() / 8
@@ -149,18 +285,28 @@ class Emulator:
             self.draw_text(screen, f'{i:#0{2}}', x, y)
 
     def draw_instruction_screen(self, screen):
+        pc = self.machine.pc
+        state = (pc, bytes(self.machine.ram[pc:pc + 20]), tuple(self.debugger.breakpoints),
+                 self.control_type, self.debug_command)
+        if not self.panel_changed('instruction', state):
+            return
         screen.fill(Color.BLACK)
-        start_address = self.machine.pc
         y_offset = 50
         self.draw_text(screen, 'Instruction', 10, 10)
         for i in range(0, 20, 2):
             address = self.machine.pc + i
-            opcode = (self.machine.ram[address] << 8) | self.machine.ram[address + 1]
-            description = self.machine.get_description(opcode)
+            opcode, description = self.disassembler.describe(address)
             y = i / 2 * self.font_size + y_offset
-            self.draw_text(screen, f'{address:#0{4}x} : {opcode:#0{4}x}({description})', 10, y)
+            marker = '*' if address in self.debugger.breakpoints else ' '
+            self.draw_text(screen, f'{marker}{address:#0{4}x} : {opcode:#0{4}x}({description})', 10, y)
+        if self.control_type == EmulatorControlType.INSTRUCTION:
+            self.draw_text(screen, f'> {self.debug_command}', 10, 11 * self.font_size + y_offset)
 
     def draw_register_screen(self, screen):
+        machine = self.machine
+        state = (bytes(machine.registers), machine.I, machine.pc, machine.sp, self.control_type)
+        if not self.panel_changed('register', state):
+            return
         screen.fill(Color.BLACK)
         self.draw_text(screen, 'Register', 10, 10)
         y_offset = 50
@@ -177,6 +323,11 @@ class Emulator:
         self.draw_text(screen, f'SP = {self.machine.sp:#0{6}x}', 10, 11 * self.font_size + y_offset)
 
     def draw_memory_screen(self, screen):
+        address = self.memory_address
+        state = (address, self.memory_address_text, bytes(self.machine.ram[address:address + 40]),
+                 self.control_type)
+        if not self.panel_changed('memory', state):
+            return
         x = 10
         y_offset = 50
         screen.fill(Color.BLACK)
@@ -202,15 +353,77 @@ class Emulator:
         pygame.draw.line(screen, Color.RED, (width, height), (0, height), border_thickness)
         pygame.draw.line(screen, Color.RED, (0, height), (0, 0), border_thickness)
 
+    def emulate(self, elapsed):
+        """Advance the machine by elapsed seconds of host time as the UI asks."""
+        if self.control_type == EmulatorControlType.HELP:
+            return
+        running = self.control_type != EmulatorControlType.INSTRUCTION or self.debug_running
+        if running and not self.was_running:
+            # Leaving a breakpoint, don't stop on it again right away
+            self.debugger.resume()
+        self.was_running = running
+        try:
+            with self.updating():
+                self.run_machine(elapsed)
+            self.fault = None
+        except HardFaultError as e:
+            if e.msg != self.fault:
+                print(f'Hard fault : {e.msg}')
+                self.fault = e.msg
+        except DebugBreak as e:
+            print(f'Break : {e.reason}')
+            self.control_type = EmulatorControlType.INSTRUCTION
+            self.debug_running = False
+            self.was_running = False
+
+    def run_machine(self, elapsed):
+        if self.control_type == EmulatorControlType.INSTRUCTION:
+            if self.step:
+                self.step = False
+                self.debugger.resume()
+                self.scheduler.run_cycles(1)
+            elif self.debug_running:
+                self.scheduler.advance(elapsed)
+                self.record_rewind_frame()
+        elif not (self.control_type == EmulatorControlType.MAIN and self.rewind_held):
+            # While rewinding the machine stands still, run_ui steps it back
+            self.scheduler.advance(elapsed)
+            self.record_rewind_frame()
+
+    def record_rewind_frame(self):
+        # Frames of emulated time rather than calls: with threaded this runs
+        # every CPU slice, many times per rendered frame
+        if self.scheduler.ticks != self.rewind_ticks:
+            self.rewind_ticks = self.scheduler.ticks
+            self.rewind_buffer.record_frame(self.machine)
+
     def run(self):
-        start_time = time.time()
+        if self.cpu is not None:
+            self.cpu.start()
+        try:
+            self.run_ui()
+        finally:
+            if self.cpu is not None:
+                self.cpu.stop()
+
+    def run_ui(self):
+        # Events need the window
+        self.screen
+        start_time = time.perf_counter()
+        start_cycles = self.machine.cycles
+        last_frame = start_time
         fps = 0
         
         while True:
-            now = time.time()
+            now = time.perf_counter()
+            elapsed = now - last_frame
+            last_frame = now
             if (now - start_time) > 1:
-                start_time = now
                 self.fps = fps
+                self.ips = int((self.machine.cycles - start_cycles) / (now - start_time))
+                self.frame_cache_stats = (len(self.frame_cache), self.frame_cache.hits, self.frame_cache.misses)
+                start_time = now
+                start_cycles = self.machine.cycles
                 fps = 0
 
             for event in pygame.event.get():
@@ -218,33 +431,25 @@ class Emulator:
                     return
                 if event.type == pygame.KEYDOWN:
                     if event.key in self.key_mapping:
-                        self.machine.key_down(self.key_mapping[event.key])
+                        self.on_cpu(self.set_key, self.key_mapping[event.key], True)
                     self.handle_keyboard_input(event)
                     if event.key == pygame.K_o:
-                        if self.target_fps < 250:
-                            self.target_fps += 5
+                        if self.scheduler.cpu_hz * 2 <= MAX_CPU_HZ:
+                            self.on_cpu(self.set_cpu_hz, self.scheduler.cpu_hz * 2)
                     elif event.key == pygame.K_p:
-                        if self.target_fps > 5:
-                            self.target_fps -= 5 
+                        if self.scheduler.cpu_hz // 2 >= MIN_CPU_HZ:
+                            self.on_cpu(self.set_cpu_hz, self.scheduler.cpu_hz // 2)
                         
                 if event.type == pygame.KEYUP:
                     if event.key in self.key_mapping:
-                        self.machine.key_up(self.key_mapping[event.key])
-
-            if self.control_type != EmulatorControlType.HELP:
-                try:
-                    if self.control_type == EmulatorControlType.INSTRUCTION:
-                        if self.step:
-                            self.step = False
-                            self.machine.run_loop()
-                            fps += 1
-                        else:
-                            pass
-                    else:
-                        self.machine.run_loop()
-                        fps += 1
-                except HardFaultError as e:
-                    print(f'Hard fault : {e.msg}')
+                        self.on_cpu(self.set_key, self.key_mapping[event.key], False)
+
+            self.rewind_held = pygame.key.get_pressed()[pygame.K_BACKSPACE]
+            if self.rewind_held and self.control_type == EmulatorControlType.MAIN:
+                # One step back per rendered frame
+                self.on_cpu(self.rewind)
+            if self.cpu is None:
+                self.emulate(elapsed)
             
             if self.control_type == EmulatorControlType.HELP:
                 self.draw_help_screen(self.help_screen)
@@ -272,27 +477,90 @@ class Emulator:
                 self.screen.blit(self.instruction_screen, (self.width // 2, 0))
 
             pygame.display.flip()
-            self.machine.tick60Hz()
+            fps += 1
             self.clock.tick(self.target_fps)
 
+    def updating(self):
+        """Context for changing the machine, readers of the shared state never see it half done."""
+        return self.shared_state.update(self.machine) if self.shared_state else contextlib.nullcontext()
+
+    def on_cpu(self, function, *args):
+        """Call function where the machine runs, so it lands between instructions."""
+        if self.cpu is not None:
+            self.cpu.call(self._update, function, *args)
+        else:
+            self._update(function, *args)
+
+    def _update(self, function, *args):
+        with self.updating():
+            function(*args)
+
+    def debugger_command(self, text):
+        print(self.debugger.command(text))
+        if text.strip().lower() == 'u':
+            self.debug_running = True
+
+    def set_key(self, key, pressed):
+        if pressed:
+            self.machine.key_down(key)
+        else:
+            self.machine.key_up(key)
+        if self.recorder is not None:
+            self.recorder.key(key, pressed)
+
+    def set_cpu_hz(self, cpu_hz):
+        self.scheduler.set_cpu_hz(cpu_hz)
+        if self.recorder is not None:
+            self.recorder.set_cpu_hz(cpu_hz)
+
+    def rewind(self):
+        snapshot = self.rewind_buffer.rewind()
+        if snapshot is not None:
+            self.machine.restore(snapshot)
+            self.scheduler.resync()
+            if self.recorder is not None:
+                self.recorder.rewound()
+
     def draw_text(self, screen, msg, x, y, color = Color.WHITE):
-        text = self.font.render(msg, True, color)
-        text_rect = text.get_rect()
-        text_rect.x = x
-        text_rect.y = y
-        screen.blit(text, text_rect)
+        screen.blit(self.render_text(msg, color), (x, y))
 
+    def _render_text(self, msg, color):
+        return self.font.render(msg, True, color)
 
-def main():
+
+def main(argv=None):
     SCREEN_WIDTH = 1200
     SCREEN_HEIGHT = 600
     SCREEN_SCALE = 6
     TITLE = 'chip8 enumlator'
-    with open(r'programs\PONG2', 'rb') as f:
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument('rom', nargs='?', default=os.path.join('programs', 'PONG2'))
+    parser.add_argument('--cpu-hz', type=int, default=DEFAULT_CPU_HZ)
+    parser.add_argument('--seed', type=int, help='seed for Cxnn random numbers (default: random)')
+    parser.add_argument('--record', help='write the input log of this session to this file')
+    parser.add_argument('--audio', choices=sorted(AUDIO_BACKENDS), default='pygame',
+                        help='buzzer output, null to mute')
+    parser.add_argument('--threaded', action='store_true', help='run the CPU on its own thread')
+    parser.add_argument('--shared-memory', metavar='NAME',
+                        help='expose the machine as shared memory block NAME (see shared_state.py)')
+    args = parser.parse_args(argv)
+
+    with open(args.rom, 'rb') as f:
         code = bytearray(f.read())
-    chip = Chip8Emulator(code)
-    machine = Emulator(chip, SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_SCALE, TITLE)
-    machine.run()
+    seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(4), 'little')
+    shared_state = SharedState(args.shared_memory) if args.shared_memory else None
+    buffers = {'ram': shared_state.ram, 'registers': shared_state.registers} if shared_state else {}
+    chip = Chip8Emulator(code, audio=create_audio_backend(args.audio), seed=seed, **buffers)
+    recorder = InputRecorder(chip, code, seed, args.cpu_hz) if args.record else None
+    machine = Emulator(chip, SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_SCALE, TITLE, cpu_hz=args.cpu_hz, recorder=recorder,
+                       threaded=args.threaded, shared_state=shared_state)
+    try:
+        machine.run()
+    finally:
+        if shared_state is not None:
+            shared_state.shm.unlink()
+    if recorder is not None:
+        recorder.save(args.record)
 
 if __name__ == '__main__':
     main()
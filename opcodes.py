@@ -47,7 +47,10 @@ class OpcodeDesc:
 
     @staticmethod
     def arithmetic(data):
-        return 'arithmetic'
+        if data.N in _ARITHMETIC_DESC:
+            return _ARITHMETIC_DESC[data.N].format(X=data.X, Y=data.Y)
+        else:
+            return f'Unknown arithmetic, data.N = {data.N:X}'
 
     @staticmethod
     def skip_if_x_not_equal_to_y(data):
@@ -67,27 +70,21 @@ class OpcodeDesc:
 
     @staticmethod
     def draw_sprite(data):
-        return 'draw sprite'
+        return f'draw sprite : x = reg[{data.X:x}], y = reg[{data.Y:x}], height = {data.N}'
 
     @staticmethod
     def skip_on_key(data):
-        return 'Skip on key'
+        if data.NN == 0x9e:
+            return f'Skip if key reg[{data.X:x}] down'
+        elif data.NN == 0xa1:
+            return f'Skip if key reg[{data.X:x}] up'
+        else:
+            return 'Skip on key'
 
     @staticmethod
     def misc(data):
-        misc_opcode_get_desc = {
-            0x07: OpcodeDesc.set_x_to_delay,
-            0x0a: OpcodeDesc.wait_for_key,
-            0x15: OpcodeDesc.set_delay,
-            0x18: OpcodeDesc.set_sound,
-            0x1e: OpcodeDesc.add_to_I,
-            0x29: OpcodeDesc.set_I_for_char,
-            0x33: OpcodeDesc.binary_coded_decimal,
-            0x55: OpcodeDesc.save_x,
-            0x65: OpcodeDesc.load_x,
-        }
-        if data.NN in misc_opcode_get_desc:
-            return misc_opcode_get_desc[data.NN](data)
+        if data.NN in MISC_DESC:
+            return MISC_DESC[data.NN](data)
         else:
             return 'Unknown misc opcode'
 
@@ -127,4 +124,47 @@ class OpcodeDesc:
     def load_x(data):
         return f'reg_load(V{data.X},&I)'
 
-    
+
+_ARITHMETIC_DESC = {
+    0x0: 'reg[{X:x}] = reg[{Y:x}]',
+    0x1: 'reg[{X:x}] |= reg[{Y:x}]',
+    0x2: 'reg[{X:x}] &= reg[{Y:x}]',
+    0x3: 'reg[{X:x}] ^= reg[{Y:x}]',
+    0x4: 'reg[{X:x}] += reg[{Y:x}]',
+    0x5: 'reg[{X:x}] -= reg[{Y:x}]',
+    0x6: 'reg[{Y:x}] >>= 1',
+    0x7: 'reg[{Y:x}] = reg[{Y:x}] - reg[{X:x}]',
+    0xe: 'reg[{X:x}] <<= 1',
+}
+
+MISC_DESC = {
+    0x07: OpcodeDesc.set_x_to_delay,
+    0x0a: OpcodeDesc.wait_for_key,
+    0x15: OpcodeDesc.set_delay,
+    0x18: OpcodeDesc.set_sound,
+    0x1e: OpcodeDesc.add_to_I,
+    0x29: OpcodeDesc.set_I_for_char,
+    0x33: OpcodeDesc.binary_coded_decimal,
+    0x55: OpcodeDesc.save_x,
+    0x65: OpcodeDesc.load_x,
+}
+
+# Indexed by the top nibble of the opcode
+FAMILY_DESC = (
+    OpcodeDesc.clear_or_return,
+    OpcodeDesc.jump,
+    OpcodeDesc.call_subroutine,
+    OpcodeDesc.skip_if_x_equal,
+    OpcodeDesc.skip_if_x_not_equal,
+    OpcodeDesc.skip_if_x_equal_to_y,
+    OpcodeDesc.set_x,
+    OpcodeDesc.add_x,
+    OpcodeDesc.arithmetic,
+    OpcodeDesc.skip_if_x_not_equal_to_y,
+    OpcodeDesc.set_I,
+    OpcodeDesc.jump_with_offset,
+    OpcodeDesc.rnd,
+    OpcodeDesc.draw_sprite,
+    OpcodeDesc.skip_on_key,
+    OpcodeDesc.misc,
+)
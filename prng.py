@@ -0,0 +1,29 @@
+import os
+
+MASK32 = 0xffffffff
+
+
+def seed_state(seed):
+    """Turn any integer seed into a non-zero 32-bit xorshift state."""
+    # splitmix32 finaliser, so nearby seeds give unrelated streams
+    x = (seed + 0x9e3779b9) & MASK32
+    x = ((x ^ (x >> 16)) * 0x85ebca6b) & MASK32
+    x = ((x ^ (x >> 13)) * 0xc2b2ae35) & MASK32
+    x ^= x >> 16
+    return x or 1
+
+
+class XorShift32:
+    """Small per-machine PRNG whose whole state is one 32-bit word."""
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'little')
+        self.state = seed_state(seed)
+
+    def randbyte(self):
+        x = self.state
+        x ^= (x << 13) & MASK32
+        x ^= x >> 17
+        x ^= (x << 5) & MASK32
+        self.state = x
+        return x >> 24
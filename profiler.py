@@ -0,0 +1,178 @@
+import argparse
+import json
+import time
+import types
+from collections import Counter
+
+from chip8 import Chip8Emulator, _Handler
+from headless import ENGINES
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+# Shadow call stacks start at the ROM entry point
+ROOT = 0x200
+
+
+class Profiler:
+    """Collects per-handler counts and host time, a PC histogram and call edges.
+
+    attach() swaps instrumented copies of the machine's dispatch tables in and
+    flushes the decode cache, detach() puts the originals back. A machine
+    without a profiler attached runs exactly the same code as before.
+    """
+    def __init__(self, machine):
+        self.machine = machine
+        self.counts = Counter()
+        self.host_time = Counter()
+        self.pc_histogram = [0] * len(machine.ram)
+        self.call_edges = Counter()
+        self.stacks = Counter()
+        self._stack = (ROOT,)
+        self._saved = None
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    @property
+    def attached(self):
+        return self._saved is not None
+
+    def attach(self):
+        if self.attached:
+            return
+        machine = self.machine
+        self._saved = (machine.opcode_handler, machine.misc_opcode_handler, machine.skip_idle_loops)
+        # Count every iteration of idle loops as the ROM executes them
+        machine.skip_idle_loops = False
+        machine.opcode_handler = {
+            key: _Handler(self._wrap(entry.handler, key), entry.get_desc)
+            for key, entry in machine.opcode_handler.items()
+        }
+        machine.misc_opcode_handler = {
+            key: self._wrap(handler) for key, handler in machine.misc_opcode_handler.items()
+        }
+        # Translated blocks inline most instructions, count them in the interpreter
+        if type(machine).run_cycles is not Chip8Emulator.run_cycles:
+            machine.run_cycles = types.MethodType(Chip8Emulator.run_cycles, machine)
+        machine.flush_decode_cache()
+
+    def detach(self):
+        if not self.attached:
+            return
+        machine = self.machine
+        machine.opcode_handler, machine.misc_opcode_handler, machine.skip_idle_loops = self._saved
+        self._saved = None
+        machine.__dict__.pop('run_cycles', None)
+        machine.flush_decode_cache()
+
+    def clear(self):
+        self.counts.clear()
+        self.host_time.clear()
+        self.pc_histogram[:] = [0] * len(self.pc_histogram)
+        self.call_edges.clear()
+        self.stacks.clear()
+        self._stack = (ROOT,)
+
+    def _wrap(self, handler, family=None):
+        name = handler.__name__.lstrip('_')
+        machine = self.machine
+        counts = self.counts
+        host_time = self.host_time
+        pc_histogram = self.pc_histogram
+        stacks = self.stacks
+        clock = time.perf_counter_ns
+
+        def profiled(data):
+            # The PC was already advanced past the instruction
+            pc_histogram[machine.pc - 2] += 1
+            counts[name] += 1
+            stacks[self._stack] += 1
+            start = clock()
+            try:
+                handler(data)
+            finally:
+                host_time[name] += clock() - start
+
+        if family == 0x2:
+            def profiled_call(data):
+                profiled(data)
+                self.call_edges[self._stack[-1], data.NNN] += 1
+                self._stack += (data.NNN,)
+            return profiled_call
+        if family == 0x0:
+            def profiled_return(data):
+                profiled(data)
+                if data.NN == 0xee and len(self._stack) > 1:
+                    self._stack = self._stack[:-1]
+            return profiled_return
+        return profiled
+
+    def hot_pcs(self, limit=None):
+        hot = sorted(((pc, count) for pc, count in enumerate(self.pc_histogram) if count),
+                     key=lambda item: -item[1])
+        return hot[:limit]
+
+    def to_dict(self, limit=None):
+        return {
+            'instructions': sum(self.counts.values()),
+            'handlers': {
+                name: {'count': count, 'host_ns': self.host_time[name]}
+                for name, count in self.counts.most_common()
+            },
+            'hot_pcs': [{'pc': pc, 'count': count} for pc, count in self.hot_pcs(limit)],
+            'call_graph': [
+                {'caller': caller, 'callee': callee, 'count': count}
+                for (caller, callee), count in self.call_edges.most_common()
+            ],
+        }
+
+    def save_json(self, path, limit=None):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(limit), f, indent=2)
+
+    def folded_stacks(self):
+        """Instruction counts per call stack in flame graph 'folded' format."""
+        return ''.join(';'.join(f'0x{address:03X}' for address in stack) + f' {count}\n'
+                       for stack, count in sorted(self.stacks.items()))
+
+    def save_folded(self, path):
+        with open(path, 'w') as f:
+            f.write(self.folded_stacks())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile a CHIP-8 ROM without a window')
+    parser.add_argument('rom')
+    parser.add_argument('--cycles', type=int, default=100_000)
+    parser.add_argument('--cpu-hz', type=int, default=DEFAULT_CPU_HZ)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='interpreter')
+    parser.add_argument('--top', type=int, default=10, help='hot PCs to print')
+    parser.add_argument('--json', help='write the profile to this file')
+    parser.add_argument('--folded', help='write folded call stacks to this file')
+    args = parser.parse_args(argv)
+
+    with open(args.rom, 'rb') as f:
+        machine = ENGINES[args.engine](bytearray(f.read()), seed=args.seed)
+    with Profiler(machine) as profiler:
+        Scheduler(machine, args.cpu_hz).run_cycles(args.cycles)
+
+    total = sum(profiler.counts.values())
+    for name, count in profiler.counts.most_common():
+        print(f'{name:<28} {count:>10} {count / total:7.1%} {profiler.host_time[name] / 1e6:10.3f} ms')
+    print('hot pcs:')
+    for pc, count in profiler.hot_pcs(args.top):
+        print(f'  {pc:03X}  {count:>10}  {machine.get_description(machine.ram[pc] << 8 | machine.ram[pc + 1])}')
+
+    if args.json:
+        profiler.save_json(args.json)
+    if args.folded:
+        profiler.save_folded(args.folded)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
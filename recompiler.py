@@ -0,0 +1,208 @@
+import struct
+
+from chip8 import Chip8Emulator, DECODE_CACHE_START, DECODE_CACHE_END, _IdleLoop
+from opcodes import OpcodeData
+
+# Straight-line runs of instructions are translated into one Python function
+# per run (a "block") and cached by entry PC. A block ends after the first
+# instruction that changes the PC (jump, call, return, skip, Bnnn, Ex9E/ExA1,
+# Fx0A), draws, or writes RAM (Fx33/Fx55), so code it could overwrite is
+# always looked up again.
+MAX_BLOCK_LENGTH = 32
+
+# Misc opcodes that only touch registers, I or the timers
+_INLINE_MISC = {
+    0x07: 'reg[{X}] = m.delay_count',
+    0x15: 'm.delay_count = reg[{X}]',
+    0x1e: 'm.I += reg[{X}]',
+    0x29: 'm.I = reg[{X}] * 5',
+}
+
+_INLINE_ARITHMETIC = {
+    0x0: ['reg[{X}] = reg[{Y}]'],
+    0x1: ['reg[{X}] |= reg[{Y}]'],
+    0x2: ['reg[{X}] &= reg[{Y}]'],
+    0x3: ['reg[{X}] ^= reg[{Y}]'],
+    0x4: ['reg[15] = 1 if reg[{X}] + reg[{Y}] > 0xff else 0',
+          'reg[{X}] = (reg[{X}] + reg[{Y}]) & 0xff'],
+    0x5: ['reg[15] = 1 if reg[{X}] > reg[{Y}] else 0',
+          'reg[{X}] = (reg[{X}] - reg[{Y}]) & 0xff'],
+    0x6: ['reg[15] = reg[{X}] & 0x01',
+          'reg[{Y}] >>= 1'],
+    0x7: ['reg[15] = 1 if reg[{Y}] > reg[{X}] else 0',
+          'reg[{Y}] = (reg[{Y}] - reg[{X}]) & 0xff'],
+    0xe: ['reg[15] = 1 if (reg[{X}] & 0xf) != 0 else 0',
+          'reg[{X}] = (reg[{X}] << 1) & 0xff'],
+}
+
+_SKIP_CONDITION = {
+    0x3: 'reg[{X}] == {NN}',
+    0x4: 'reg[{X}] != {NN}',
+    0x5: 'reg[{X}] == reg[{Y}]',
+    0x9: 'reg[{X}] != reg[{Y}]',
+}
+
+
+class _Block:
+    def __init__(self, function, length, end):
+        self.function = function
+        self.length = length
+        self.end = end
+
+
+class Chip8Recompiler(Chip8Emulator):
+    """Chip8Emulator that runs translated basic blocks in run_cycles.
+
+    run_loop still executes a single instruction through the interpreter,
+    so single stepping behaves exactly as before.
+    """
+    def __init__(self, code, audio=None, seed=None, max_block_length=MAX_BLOCK_LENGTH, ram=None, registers=None):
+        super().__init__(code, audio, seed, ram, registers)
+        self.max_block_length = max_block_length
+        self._blocks = {}
+        # RAM address -> entry PCs of the blocks that cover it
+        self._block_owners = {}
+
+    def run_cycles(self, count):
+        blocks = self._blocks
+        remaining = count
+        try:
+            while remaining > 0:
+                try:
+                    while remaining > 0:
+                        pc = self.pc
+                        block = blocks.get(pc)
+                        if block is None:
+                            block = self._translate(pc)
+                        if block is None or block.length > remaining:
+                            remaining -= 1
+                            op = self._decoded[pc]
+                            self.pc = pc + 2
+                            if op is None:
+                                op = self._decode(pc)
+                            op()
+                        else:
+                            remaining -= block.length
+                            try:
+                                block.function()
+                            except _IdleLoop:
+                                raise
+                            except BaseException:
+                                # Only charge what ran: whatever can fault moves
+                                # the PC past itself first, like the interpreter
+                                remaining += block.length - (self.pc - pc) // 2
+                                raise
+                except _IdleLoop as idle:
+                    # Only ever raised by the last instruction of a block
+                    remaining = self._skip_idle_loop(idle, remaining)
+        finally:
+            self.cycles += count - remaining
+        return count
+
+    def flush_decode_cache(self):
+        super().flush_decode_cache()
+        self.flush_block_cache()
+
+    def flush_block_cache(self):
+        self._blocks.clear()
+        self._block_owners.clear()
+
+    def _invalidate(self, address, length):
+        super()._invalidate(address, length)
+        owners = self._block_owners
+        for i in range(address, address + length):
+            for entry in owners.pop(i, ()):
+                self._blocks.pop(entry, None)
+
+    def _translate(self, entry):
+        if not (DECODE_CACHE_START <= entry and entry + 2 <= DECODE_CACHE_END):
+            return None
+
+        source, namespace, length, address = self._block_source(entry)
+        namespace['m'] = self
+        namespace['reg'] = self.registers
+        exec(compile(source, f'<chip8 block {entry:#x}>', 'exec'), namespace)
+
+        block = _Block(namespace['block'], length, address)
+        self._blocks[entry] = block
+        for i in range(entry, address):
+            self._block_owners.setdefault(i, set()).add(entry)
+        return block
+
+    def _block_source(self, entry):
+        """(source of block(), handlers it refers to, length, end address)."""
+        namespace = {}
+        lines = []
+        address = entry
+        length = 0
+        ended = False
+        while not ended and length < self.max_block_length \
+                and address + 2 <= DECODE_CACHE_END:
+            opcode = struct.unpack_from('>H', self.ram, address)[0]
+            ended = self._emit(lines, namespace, address, opcode)
+            address += 2
+            length += 1
+        if not ended:
+            lines.append(f'm.pc = {address}')
+
+        source = 'def block(m=m, reg=reg):\n' + ''.join(f'    {line}\n' for line in lines)
+        return source, namespace, length, address
+
+    def _emit(self, lines, namespace, address, opcode):
+        """Append the source for one instruction, return True if it ends the block."""
+        data = OpcodeData(opcode)
+        fields = {'X': data.X, 'Y': data.Y, 'NN': data.NN}
+        something = opcode >> 12
+        next_pc = address + 2
+
+        if something == 0x0 and data.NN == 0xee:
+            lines.append(f'm.pc = {next_pc}')
+            lines.append('m.pc = m._pop()')
+            return True
+        elif something == 0x1:
+            idle_jump = self._bind_idle_jump(address, opcode)
+            if idle_jump is not None:
+                namespace[f'idle_jump_{address:x}'] = idle_jump
+                lines.append(f'idle_jump_{address:x}()')
+            else:
+                lines.append(f'm.pc = {data.NNN}')
+            return True
+        elif something == 0x2:
+            lines.append(f'm.pc = {next_pc}')
+            lines.append(f'm._push({next_pc})')
+            lines.append(f'm.pc = {data.NNN}')
+            return True
+        elif something in _SKIP_CONDITION:
+            condition = _SKIP_CONDITION[something].format(**fields)
+            lines.append(f'm.pc = {next_pc + 2} if {condition} else {next_pc}')
+            return True
+        elif something == 0x6:
+            lines.append(f'reg[{data.X}] = {data.NN}')
+            return False
+        elif something == 0x7:
+            lines.append(f'reg[{data.X}] = (reg[{data.X}] + {data.NN}) & 0xff')
+            return False
+        elif something == 0x8 and data.N in _INLINE_ARITHMETIC:
+            lines.extend(line.format(**fields) for line in _INLINE_ARITHMETIC[data.N])
+            return False
+        elif something == 0xa:
+            lines.append(f'm.I = {data.NNN}')
+            return False
+        elif something == 0xb:
+            lines.append(f'm.pc = {data.NNN} + reg[0]')
+            return True
+        elif something == 0xf and data.NN in _INLINE_MISC:
+            lines.append(_INLINE_MISC[data.NN].format(**fields))
+            return False
+
+        # Everything else goes through the interpreter's handler. The PC is
+        # brought up to date first because handlers may read or rewind it
+        # (Ex9E/ExA1, Fx0A) and a HardFaultError must leave it where the
+        # interpreter would.
+        name = f'h{len(namespace)}'
+        namespace[name] = self._bind(opcode)
+        lines.append(f'm.pc = {next_pc}')
+        lines.append(f'{name}()')
+        return not (something == 0x0 and data.NN == 0xe0
+                    or something == 0xc
+                    or something == 0xf and data.NN in (0x18, 0x65))
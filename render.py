@@ -0,0 +1,39 @@
+def panel_changed(panel_state, name, state):
+    """Remember state for panel name in panel_state, True if it differs from last time."""
+    if panel_state.get(name) == state:
+        return False
+    panel_state[name] = state
+    return True
+
+
+def machine_screen_rects(rects, stale, width, height):
+    """Rects of the unscaled machine screen to repaint for the frame's dirty rects.
+
+    A stale screen (behind the scaled one after a frame came from the frame
+    cache) is repainted whole, since the dirty rects only cover what changed
+    since the last frame.
+    """
+    if not rects:
+        return []
+    if stale:
+        return [(0, 0, width, height)]
+    return list(rects)
+
+
+def scale_rect(rect, scale):
+    x, y, width, height = rect
+    return (x * scale, y * scale, width * scale, height * scale)
+
+
+def paint_rects(surface_pixels, frame, width, height, rects, colors):
+    """Paint rects of frame into surface_pixels, indexed [x, y] like pygame.surfarray.
+
+    Row y of the frame keeps pixel x in bit x; colors maps a pixel value to
+    the surface's mapped color.
+    """
+    import numpy as np
+
+    rows = np.frombuffer(frame, np.uint8)
+    pixels = np.unpackbits(rows.reshape(height, width // 8), axis=1, bitorder='little')
+    for x, y, rect_width, rect_height in rects:
+        surface_pixels[x:x + rect_width, y:y + rect_height] = colors[pixels[y:y + rect_height, x:x + rect_width].T]
@@ -0,0 +1,142 @@
+import argparse
+import hashlib
+import struct
+import time
+
+from headless import ENGINES
+from scheduler import Scheduler, DEFAULT_CPU_HZ
+
+# Input log layout: header, then one event record per event.
+# magic, version, ROM sha1, seed, cpu Hz, end cycle, final RAM sha1, event count
+LOG_MAGIC = b'C8IN'
+LOG_VERSION = 1
+_LOG_HEADER = struct.Struct('<4sBx20sQIQ20sI')
+# cycle, kind, value
+_LOG_EVENT = struct.Struct('<QBI')
+
+KEY_UP = 0
+KEY_DOWN = 1
+# The scheduler was switched to another frequency (value)
+SET_CPU_HZ = 2
+# The machine was restored from a snapshot and timer accounting restarted
+RESYNC = 3
+
+
+class InputLog:
+    def __init__(self, rom_hash, seed, cpu_hz=DEFAULT_CPU_HZ, events=None, end_cycle=0, ram_hash=bytes(20)):
+        self.rom_hash = rom_hash
+        self.seed = seed
+        self.cpu_hz = cpu_hz
+        self.events = events if events is not None else []
+        self.end_cycle = end_cycle
+        self.ram_hash = ram_hash
+
+    def to_bytes(self):
+        header = _LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, self.rom_hash, self.seed, self.cpu_hz,
+                                  self.end_cycle, self.ram_hash, len(self.events))
+        return header + b''.join(_LOG_EVENT.pack(*event) for event in self.events)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, rom_hash, seed, cpu_hz, end_cycle, ram_hash, count = \
+            _LOG_HEADER.unpack_from(data)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError(f'Unsupported input log : {magic}, version {version}')
+        if len(data) != _LOG_HEADER.size + count * _LOG_EVENT.size:
+            raise ValueError(f'Invalid input log size : {len(data)}')
+        events = list(_LOG_EVENT.iter_unpack(memoryview(data)[_LOG_HEADER.size:]))
+        return cls(rom_hash, seed, cpu_hz, events, end_cycle, ram_hash)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class InputRecorder:
+    """Stamps key events and frequency changes with machine.cycles."""
+    def __init__(self, machine, code, seed, cpu_hz=DEFAULT_CPU_HZ):
+        self.machine = machine
+        self.cpu_hz = cpu_hz
+        self.log = InputLog(hashlib.sha1(code).digest(), seed, cpu_hz)
+
+    def key(self, key, pressed):
+        self.log.events.append((self.machine.cycles, KEY_DOWN if pressed else KEY_UP, key))
+
+    def set_cpu_hz(self, cpu_hz):
+        self.cpu_hz = cpu_hz
+        self.log.events.append((self.machine.cycles, SET_CPU_HZ, cpu_hz))
+
+    def rewound(self):
+        """Forget events since the restored cycle count."""
+        cycle = self.machine.cycles
+        events = self.log.events
+        # Events on the restored cycle itself may have come before or after
+        # the snapshot, the key state is logged again below instead
+        while events and events[-1][0] >= cycle:
+            events.pop()
+        events.append((cycle, RESYNC, 0))
+        # Rewinding does not undo frequency changes, the scheduler keeps running at the latest one
+        events.append((cycle, SET_CPU_HZ, self.cpu_hz))
+        key_buffer = self.machine.key_buffer
+        events.extend((cycle, KEY_DOWN if key_buffer[key] else KEY_UP, key) for key in range(16))
+
+    def save(self, path):
+        self.log.end_cycle = self.machine.cycles
+        self.log.ram_hash = hashlib.sha1(self.machine.ram).digest()
+        self.log.save(path)
+
+
+def replay(code, log, engine='interpreter'):
+    """Run code as fast as possible through every event in log."""
+    if hashlib.sha1(code).digest() != log.rom_hash:
+        raise ValueError('Input log was recorded with a different ROM')
+    machine = ENGINES[engine](code, seed=log.seed)
+    scheduler = Scheduler(machine, log.cpu_hz)
+    for cycle, kind, value in log.events:
+        scheduler.run_cycles(cycle - machine.cycles)
+        if kind == KEY_DOWN:
+            machine.key_down(value)
+        elif kind == KEY_UP:
+            machine.key_up(value)
+        elif kind == SET_CPU_HZ:
+            scheduler.set_cpu_hz(value)
+        elif kind == RESYNC:
+            scheduler.resync()
+        else:
+            raise ValueError(f'Unknown input event : {kind}')
+    scheduler.run_cycles(log.end_cycle - machine.cycles)
+    return machine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded input log without a window')
+    parser.add_argument('rom')
+    parser.add_argument('log')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='interpreter')
+    args = parser.parse_args(argv)
+
+    with open(args.rom, 'rb') as f:
+        code = bytearray(f.read())
+    log = InputLog.load(args.log)
+    start = time.perf_counter()
+    machine = replay(code, log, args.engine)
+    elapsed = time.perf_counter() - start
+
+    ram_hash = hashlib.sha1(machine.ram).digest()
+    print(f'{machine.cycles} cycles, {len(log.events)} events in {elapsed:.3f}s '
+          f'({machine.cycles / max(elapsed, 1e-9):.0f} ips)')
+    print(f'frame {hashlib.sha1(machine.ram[0xf00:0x1000]).hexdigest()}')
+    if ram_hash == log.ram_hash:
+        print('RAM matches the recording')
+        return 0
+    print(f'RAM differs : {ram_hash.hex()} != {log.ram_hash.hex()}')
+    return 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+import collections
+import zlib
+
+DEFAULT_BUDGET = 4 * 1024 * 1024
+DEFAULT_INTERVAL = 2
+
+
+def _xor(a, b):
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+class RewindBuffer:
+    """Bounded history of machine snapshots for stepping backwards.
+
+    Only the newest snapshot is kept whole. Every older one is stored as
+    the zlib compressed XOR of itself and its successor, which is almost
+    all zeros since little of the 4 KB of RAM changes between frames.
+    When the stored bytes exceed budget the oldest deltas are dropped.
+    """
+    def __init__(self, budget=DEFAULT_BUDGET, interval=DEFAULT_INTERVAL):
+        self.budget = budget
+        self.interval = interval
+        self.size = 0
+        self._frames = 0
+        self._deltas = collections.deque()
+        self._latest = None
+
+    def __len__(self):
+        return len(self._deltas) + (self._latest is not None)
+
+    def clear(self):
+        self._deltas.clear()
+        self._latest = None
+        self.size = 0
+        self._frames = 0
+
+    def record_frame(self, machine):
+        """Call once per frame, records every interval frames."""
+        if self._frames % self.interval == 0:
+            self.record(machine.snapshot())
+        self._frames += 1
+
+    def record(self, snapshot):
+        snapshot = bytes(snapshot)
+        if self._latest is not None:
+            if len(snapshot) != len(self._latest):
+                self.clear()
+            else:
+                delta = zlib.compress(_xor(self._latest, snapshot), 1)
+                self._deltas.append(delta)
+                self.size += len(delta)
+                self.size -= len(self._latest)
+        self._latest = snapshot
+        self.size += len(snapshot)
+
+        while self._deltas and self.size > self.budget:
+            self.size -= len(self._deltas.popleft())
+
+    def rewind(self):
+        """Drop the newest snapshot and return the one before it, or None."""
+        if not self._deltas:
+            return None
+        delta = self._deltas.pop()
+        self.size -= len(delta) + len(self._latest)
+        self._latest = _xor(self._latest, zlib.decompress(delta))
+        self.size += len(self._latest)
+        self._frames = 0
+        return self._latest
@@ -0,0 +1,73 @@
+TIMER_HZ = 60
+DEFAULT_CPU_HZ = 600
+# Host time beyond this (e.g. after the window was dragged) is dropped
+# instead of being emulated in one long burst.
+MAX_LAG = 0.25
+
+
+class Scheduler:
+    """Runs a machine at an emulated CPU frequency.
+
+    The emulated clock is machine.cycles: the delay and sound timers tick
+    every cpu_hz / 60 instructions, independent of how often the host
+    renders or how the cycles are batched.
+    """
+    def __init__(self, machine, cpu_hz=DEFAULT_CPU_HZ, max_lag=MAX_LAG):
+        self.machine = machine
+        self.max_lag = max_lag
+        self.ticks = 0
+        self._owed_cycles = 0.0
+        self.set_cpu_hz(cpu_hz)
+
+    @property
+    def emulated_time(self):
+        return self.ticks / TIMER_HZ
+
+    def set_cpu_hz(self, cpu_hz):
+        if cpu_hz <= 0:
+            raise ValueError(f'Invalid cpu frequency : {cpu_hz}')
+        self.cpu_hz = cpu_hz
+        self.resync()
+
+    def resync(self):
+        """Restart timer tick accounting, e.g. after machine.cycles was restored."""
+        self._base_cycles = self.machine.cycles
+        self._base_ticks = self.ticks
+
+    def advance(self, seconds):
+        """Run as many cycles as cpu_hz allows in seconds of host time."""
+        self._owed_cycles += min(seconds, self.max_lag) * self.cpu_hz
+        count = int(self._owed_cycles)
+        self._owed_cycles -= count
+        self.run_cycles(count)
+        return count
+
+    def run_cycles(self, count):
+        machine = self.machine
+        end = machine.cycles + count
+        while True:
+            self._tick_due_timers()
+            remaining = end - machine.cycles
+            if remaining <= 0:
+                break
+            machine.run_cycles(min(remaining, self._next_tick_cycle() - machine.cycles))
+        return count
+
+    def run_ticks(self, ticks):
+        """Run until ticks more 60 Hz timer ticks have happened."""
+        machine = self.machine
+        end = self.ticks + ticks
+        while self.ticks < end:
+            batch = self._next_tick_cycle() - machine.cycles
+            if batch > 0:
+                machine.run_cycles(batch)
+            self._tick_due_timers()
+
+    def _next_tick_cycle(self):
+        ticks = self.ticks - self._base_ticks + 1
+        return self._base_cycles + ticks * self.cpu_hz // TIMER_HZ
+
+    def _tick_due_timers(self):
+        while self.machine.cycles >= self._next_tick_cycle():
+            self.machine.tick60Hz()
+            self.ticks += 1
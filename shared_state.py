@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# Shared block layout:
+# 0x00 generation (odd while the owner is running the machine)
+# 0x08 frame generation (bumped whenever the frame buffer changed)
+# 0x10 pc, I, sp, delay, sound, cycles, timer ticks
+# 0x30 registers
+# 0x40 ram
+_COUNTER = struct.Struct('<Q')
+_STATE = struct.Struct('<HHHBBQQ')
+GENERATION_OFFSET = 0x00
+FRAME_GENERATION_OFFSET = 0x08
+STATE_OFFSET = 0x10
+REGISTERS_OFFSET = 0x30
+RAM_OFFSET = 0x40
+RAM_SIZE = 0x1000
+SIZE = RAM_OFFSET + RAM_SIZE
+
+FRAME_START = 0xf00
+FRAME_END = 0x1000
+
+
+class SharedState:
+    """Owner side: ram and registers of a machine living in shared memory.
+
+    Pass ram and registers to Chip8Emulator, then wrap everything that runs
+    the machine in update() so readers can tell consistent copies apart:
+
+        state = SharedState('chip8')
+        machine = Chip8Emulator(code, ram=state.ram, registers=state.registers)
+        with state.update(machine):
+            scheduler.advance(elapsed)
+    """
+    def __init__(self, name=None):
+        self.shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.registers = buf[REGISTERS_OFFSET:REGISTERS_OFFSET + 16]
+        self.ram = buf[RAM_OFFSET:RAM_OFFSET + RAM_SIZE]
+        self.generation = 0
+        self.frame_generation = 0
+        self._last_frame = bytes(FRAME_END - FRAME_START)
+
+    @contextlib.contextmanager
+    def update(self, machine):
+        buf = self.shm.buf
+        self.generation += 1
+        _COUNTER.pack_into(buf, GENERATION_OFFSET, self.generation)
+        try:
+            yield
+        finally:
+            # Fx1E can carry I past 16 bits and runaway returns take sp below 0
+            _STATE.pack_into(buf, STATE_OFFSET, machine.pc & 0xffff, machine.I & 0xffff, machine.sp & 0xffff,
+                             machine.delay_count, machine.sound_count, machine.cycles, machine.timer_ticks)
+            if self.ram[FRAME_START:FRAME_END] != self._last_frame:
+                self._last_frame = bytes(self.ram[FRAME_START:FRAME_END])
+                self.frame_generation += 1
+                _COUNTER.pack_into(buf, FRAME_GENERATION_OFFSET, self.frame_generation)
+            self.generation += 1
+            _COUNTER.pack_into(buf, GENERATION_OFFSET, self.generation)
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        self.registers.release()
+        self.ram.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class StateCopy:
+    def __init__(self, generation, frame_generation, state, registers, ram):
+        self.generation = generation
+        self.frame_generation = frame_generation
+        self.pc, self.I, self.sp, self.delay_count, self.sound_count, self.cycles, self.timer_ticks = state
+        self.registers = registers
+        self.ram = ram
+
+    @property
+    def frame(self):
+        return self.ram[FRAME_START:FRAME_END]
+
+
+class SharedStateReader:
+    """Reader side, usable from any process that knows the block name.
+
+    Nothing is locked: read() copies the block and retries if the owner was
+    running the machine meanwhile (a seqlock on the generation counter).
+    """
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name)
+        # Before Python 3.13 attaching registers the block with this process'
+        # resource tracker, which would unlink it when the reader exits
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+    @property
+    def generation(self):
+        return _COUNTER.unpack_from(self.shm.buf, GENERATION_OFFSET)[0]
+
+    @property
+    def frame_generation(self):
+        return _COUNTER.unpack_from(self.shm.buf, FRAME_GENERATION_OFFSET)[0]
+
+    def read(self, timeout=1.0):
+        """Consistent StateCopy taken between two updates."""
+        buf = self.shm.buf
+        deadline = time.perf_counter() + timeout
+        while True:
+            before = self.generation
+            if before % 2 == 0:
+                data = bytes(buf[:SIZE])
+                if self.generation == before:
+                    return StateCopy(
+                        before,
+                        _COUNTER.unpack_from(data, FRAME_GENERATION_OFFSET)[0],
+                        _STATE.unpack_from(data, STATE_OFFSET),
+                        data[REGISTERS_OFFSET:REGISTERS_OFFSET + 16],
+                        data[RAM_OFFSET:RAM_OFFSET + RAM_SIZE])
+            if time.perf_counter() > deadline:
+                raise TimeoutError('Shared machine state stayed busy')
+            time.sleep(0)
+
+    def wait_frame(self, frame_generation, timeout=None, poll=0.001):
+        """Wait until a frame newer than frame_generation is out, return its copy or None."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.frame_generation <= frame_generation:
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            time.sleep(poll)
+        return self.read()
+
+    def close(self):
+        self.shm.close()
+
+
+def format_frame(frame):
+    lines = []
+    for y in range(32):
+        row = int.from_bytes(frame[y * 8:y * 8 + 8], 'little')
+        lines.append(''.join('#' if row >> x & 1 else '.' for x in range(64)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print frames of a machine shared by main.py --shared-memory')
+    parser.add_argument('name')
+    parser.add_argument('--frames', type=int, default=None, help='stop after this many frames')
+    args = parser.parse_args(argv)
+
+    reader = SharedStateReader(args.name)
+    try:
+        frame_generation = 0
+        shown = 0
+        while args.frames is None or shown < args.frames:
+            state = reader.wait_frame(frame_generation)
+            frame_generation = state.frame_generation
+            print(f'frame {frame_generation}  cycles {state.cycles}  pc {state.pc:03X}')
+            print(format_frame(state.frame))
+            shown += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import aot
+from aot import Chip8AotEmulator
+from chip8 import Chip8Emulator
+from test.helpers import load, make_code
+
+def run(chip, batches, batch_size=9):
+    for i in range(batches):
+        if i == batches // 2:
+            chip.key_down(5)
+        chip.run_cycles(batch_size)
+        chip.tick60Hz()
+    return chip
+
+class TestChip8AotEmulator(unittest.TestCase):
+    def setUp(self):
+        self.cache = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache.cleanup)
+
+    def assertSameMachine(self, a, b):
+        self.assertEqual(a.pc, b.pc)
+        self.assertEqual(a.I, b.I)
+        self.assertEqual(a.sp, b.sp)
+        self.assertEqual(a.registers, b.registers)
+        self.assertEqual(a.ram, b.ram)
+        self.assertEqual(a.cycles, b.cycles)
+
+    def test_programs_match_interpreter(self):
+        for name in ('BLINKY', 'BRIX', 'INVADERS', 'MAZE', 'PONG2', 'TETRIS'):
+            with self.subTest(program=name):
+                code = load(name)
+                self.assertSameMachine(run(Chip8Emulator(code, seed=1), 300),
+                                       run(Chip8AotEmulator(code, seed=1, cache_dir=self.cache.name), 300))
+
+    def test_translation_is_cached(self):
+        code = make_code(0x6001, 0x7001, 0x1202)
+        chip = Chip8AotEmulator(code, cache_dir=self.cache.name)
+        self.assertEqual(sorted(chip._translated), [0x200, 0x202])
+        self.assertEqual(len(os.listdir(self.cache.name)), 1)
+        with mock.patch.object(aot, 'translate', side_effect=AssertionError):
+            chip = Chip8AotEmulator(code, cache_dir=self.cache.name)
+        chip.run_cycles(7)
+        self.assertEqual(chip.registers[0], 4)
+
+    def test_stale_translations_are_pruned(self):
+        stale = os.path.join(self.cache.name, 'feed-32-0123456789abcdef.bin')
+        with open(stale, 'wb') as f:
+            f.write(aot.CACHE_MAGIC)
+        Chip8AotEmulator(make_code(0x1200), cache_dir=self.cache.name)
+        current = aot.cache_path(self.cache.name, bytes(make_code(0x1200)))
+        self.assertEqual(os.listdir(self.cache.name), [os.path.basename(current)])
+
+    def test_default_cache_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.cache.name}):
+            self.assertEqual(aot.default_cache_dir(), os.path.join(self.cache.name, 'chip8-aot'))
+
+    def test_undiscovered_code_runs_on_interpreter(self):
+        # V0 = 4, jump to 0x204 + V0, 0x208: V1 = 1
+        code = make_code(0x6004, 0xb204, 0x6102, 0x6103, 0x6101, 0x1208)
+        chip = Chip8AotEmulator(code, cache_dir=None)
+        self.assertNotIn(0x208, chip._translated)
+        chip.run_cycles(3)
+        self.assertEqual(chip.registers[1], 1)
+        self.assertEqual(chip.pc, 0x20a)
+
+    def test_restore_reinstalls_blocks(self):
+        # I = 0x202, V0 = 0x70, store V0 over the instruction at 0x202, jump to self
+        code = make_code(0xa202, 0x6070, 0xf055, 0x1206)
+        chip = Chip8AotEmulator(code, cache_dir=None)
+        snapshot = chip.snapshot()
+        chip.run_cycles(3)
+        self.assertNotIn(0x200, chip._blocks)
+        self.assertIsNone(chip._translate(0x200))
+        chip.restore(snapshot)
+        # Installed again on the next visit
+        self.assertEqual(chip._blocks, {})
+        self.assertIsNotNone(chip._translate(0x200))
+
+    def test_restore_keeps_untouched_blocks(self):
+        # call 0x208, 0x202: jump to self, 0x208: I = 0x20c, V0 = 0x70, store V0
+        # over the instruction at 0x20c, return
+        code = make_code(0x2208, 0x1202, 0x0000, 0x0000, 0xa20c, 0x6070, 0xf055, 0x00ee)
+        chip = Chip8AotEmulator(code, cache_dir=None)
+        self.assertEqual(sorted(chip._translated), [0x200, 0x202, 0x208, 0x20e])
+        chip.run_cycles(6)
+        self.assertEqual(sorted(chip._blocks), [0x200, 0x202, 0x20e])
+        snapshot = chip.snapshot()
+        chip.restore(snapshot)
+        self.assertEqual(chip.pc, 0x202)
+        chip.run_cycles(10)
+        self.assertEqual(sorted(chip._blocks), [0x202])
+        self.assertEqual([entry for entry in sorted(chip._translated) if chip._translate(entry) is not None],
+                         [0x200, 0x202, 0x20e])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from audio import RecordingAudio, create_audio_backend, NullAudio
+from chip8 import Chip8Emulator
+
+# V0 = 3, sound = V0, loop
+BEEP = bytes([0x60, 0x03, 0xf0, 0x18, 0x12, 0x04])
+
+class TestAudio(unittest.TestCase):
+    def test_recording_backend(self):
+        audio = RecordingAudio()
+        chip = Chip8Emulator(BEEP, audio=audio)
+        chip.tick60Hz()
+        chip.run_cycles(2)
+        self.assertEqual(audio.started_at, 1)
+        for _ in range(5):
+            chip.tick60Hz()
+        self.assertEqual(audio.intervals, [(1, 4)])
+        self.assertIsNone(audio.started_at)
+
+    def test_set_sound_to_zero_stops(self):
+        audio = RecordingAudio()
+        # V0 = 3, sound = V0, sound = V1(0)
+        chip = Chip8Emulator(bytes([0x60, 0x03, 0xf0, 0x18, 0xf1, 0x18]), audio=audio)
+        chip.run_cycles(3)
+        self.assertEqual(audio.intervals, [(0, 0)])
+
+    def test_default_backend(self):
+        self.assertIsInstance(Chip8Emulator(BEEP).audio, NullAudio)
+        self.assertIsInstance(create_audio_backend('null'), NullAudio)
+        with self.assertRaises(ValueError):
+            create_audio_backend('winsound')
+
+if __name__ == '__main__':
+    unittest.main()
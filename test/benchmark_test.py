@@ -0,0 +1,46 @@
+import unittest
+import os
+import tempfile
+from benchmark import OPCODES, bench_opcodes, bench_roms, bench_startup, compare
+
+class TestBenchmark(unittest.TestCase):
+    def test_opcode_suite_runs(self):
+        results = bench_opcodes(number=10, repeat=2)
+        self.assertEqual(len(results), len(OPCODES))
+        for result in results.values():
+            self.assertEqual(result.to_dict()['unit'], 'ns')
+
+    def test_startup_suite_runs(self):
+        results = bench_startup(repeat=1, names=['core'])
+        self.assertEqual(list(results), ['startup/core'])
+        self.assertEqual(results['startup/core'].unit, 'ms')
+
+    def test_rom_suite_reports_faults(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rom = os.path.join(directory, 'FAULT')
+            with open(rom, 'wb') as f:
+                # V0 = 1, unknown opcode
+                f.write(bytes([0x60, 0x01, 0x01, 0x23]))
+            results = bench_roms([rom], 'interpreter', 100, repeat=2)
+        result = results['rom/interpreter/FAULT'].to_dict()
+        self.assertTrue(result['fault'].startswith('Hard fault at cycle 2'))
+        self.assertEqual(len(result['samples']), 2)
+
+    def test_compare(self):
+        baseline = {
+            'opcode/6xnn': {'median': 100.0},
+            'rom/interpreter/PONG': {'median': 1000.0},
+            'draw/clear_screen': {'median': 50.0},
+        }
+        results = {
+            'opcode/6xnn': {'median': 120.0, 'higher_is_better': False},
+            'rom/interpreter/PONG': {'median': 850.0, 'higher_is_better': True},
+            'draw/clear_screen': {'median': 20.0, 'higher_is_better': False},
+            'draw/new': {'median': 1.0, 'higher_is_better': False},
+        }
+        regressions = compare(results, baseline, 0.10)
+        self.assertEqual([r[0] for r in regressions], ['opcode/6xnn', 'rom/interpreter/PONG'])
+        self.assertAlmostEqual(regressions[1][3], 0.15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+from chip8 import Chip8Emulator, HardFaultError
+from recompiler import Chip8Recompiler
+from test.helpers import make_code
+
+class TestChip8Emulator(unittest.TestCase):
+    def test_set_and_add(self):
+        chip = Chip8Emulator(make_code(0x6a12, 0x7a05, 0x7aff))
+        for _ in range(3):
+            chip.run_loop()
+        self.assertEqual(chip.registers[0xa], 0x16)
+        self.assertEqual(chip.pc, 0x206)
+
+    def test_misc_opcode(self):
+        chip = Chip8Emulator(make_code(0x6107, 0xf129))
+        chip.run_loop()
+        chip.run_loop()
+        self.assertEqual(chip.I, 7 * 5)
+
+    def test_cached_loop(self):
+        # V0 += 1 ; jump 0x200
+        chip = Chip8Emulator(make_code(0x7001, 0x1200))
+        for _ in range(20):
+            chip.run_loop()
+        self.assertEqual(chip.registers[0], 10)
+        self.assertEqual(chip.pc, 0x200)
+
+    def test_self_modifying_save(self):
+        # 0x200: V0 = 0x61, V1 = 0x42, I = 0x208, save V0..V1, 0x208: V1 = 0x00
+        chip = Chip8Emulator(make_code(0x6061, 0x6142, 0xa208, 0xf155, 0x6100))
+        for _ in range(3):
+            chip.run_loop()
+        # Decode 0x208 before it gets overwritten
+        chip.pc = 0x208
+        chip.run_loop()
+        self.assertEqual(chip.registers[1], 0x00)
+
+        chip.registers[1] = 0x42
+        chip.pc = 0x206
+        chip.run_loop()
+        chip.run_loop()
+        self.assertEqual(chip.registers[1], 0x42)
+
+    def test_self_modifying_bcd(self):
+        # V0 = 153, I = 0x20a, BCD writes 01 05 03 over the opcode at 0x20a
+        chip = Chip8Emulator(make_code(0x6099, 0xa20a, 0xf033, 0x1208, 0x1208, 0x6300))
+        chip.pc = 0x20a
+        chip.run_loop()
+        chip.pc = 0x200
+        for _ in range(3):
+            chip.run_loop()
+        self.assertEqual(chip.ram[0x20a:0x20d], bytes([1, 5, 3]))
+        # 0x0105 is not an opcode this emulator knows
+        chip.pc = 0x20a
+        with self.assertRaises(HardFaultError):
+            chip.run_loop()
+
+    def test_flush_decode_cache(self):
+        chip = Chip8Emulator(make_code(0x6001))
+        chip.run_loop()
+        chip.ram[0x201] = 0x02
+        chip.flush_decode_cache()
+        chip.pc = 0x200
+        chip.run_loop()
+        self.assertEqual(chip.registers[0], 2)
+
+    def test_stack_overwrites_code(self):
+        for engine in (Chip8Emulator, Chip8Recompiler):
+            # jump 0xe9e, 0xe9e: V1 = 5, call 0xe9e
+            chip = engine(make_code(0x1e9e))
+            chip.ram[0xe9e:0xea2] = make_code(0x6105, 0x2e9e)
+            chip.run_cycles(2)
+            # The return address 0x0ea2 lands on 0xe9e after an underflow
+            chip.sp = 0xe9e
+            with self.assertRaises(HardFaultError):
+                chip.run_cycles(2)
+            self.assertEqual(chip.ram[0xe9e:0xea0], bytes([0x0e, 0xa2]))
+
+    def test_draw_sprite_from_frame_buffer(self):
+        # I = 0xf00 (the top left of the screen), V0 = 8, V1 = 0, draw 2 rows at (V0, V1)
+        chip = Chip8Emulator(make_code(0xaf00, 0x6008, 0x6100, 0xd012))
+        chip.ram[0xf00] = 0x0f
+        chip.run_cycles(4)
+        # The first row lands in 0xf01, which the second row is then read from
+        self.assertEqual(chip.ram[0xf01], 0xf0)
+        self.assertEqual(chip.ram[0xf09], 0x0f)
+
+    def test_writes_into_frame_buffer_are_redrawn(self):
+        # V0 = 1, I = 0xf20, save V0, call 0x208, 0x208: jump to self
+        chip = Chip8Emulator(make_code(0x6001, 0xaf20, 0xf055, 0x2208, 0x1208))
+        chip.frame_buffer.take_dirty_rects()
+        chip.run_cycles(3)
+        self.assertEqual(chip.frame_buffer.take_dirty_rects(), [(0, 4, 64, 1)])
+        # A stack that overflowed into the last row
+        chip.sp = 0xffe
+        chip.run_cycles(1)
+        self.assertEqual(chip.ram[0xffe:0x1000], bytes([0x02, 0x08]))
+        self.assertEqual(chip.frame_buffer.take_dirty_rects(), [(0, 31, 64, 1)])
+
+    def assertSameAsSpinning(self, code, batches, setup=None):
+        chips = []
+        for skip in (False, True):
+            chip = Chip8Emulator(code, seed=0)
+            chip.skip_idle_loops = skip
+            if setup:
+                setup(chip)
+            for count in batches:
+                chip.run_cycles(count)
+                chip.tick60Hz()
+            chips.append(chip)
+        self.assertEqual(chips[0].snapshot(), chips[1].snapshot())
+        return chips[1]
+
+    def test_idle_delay_loop(self):
+        # delay = 5, 0x204: V0 = delay, skip if V0 == 0, jump 0x204, V1 = 1
+        code = make_code(0x6505, 0xf515, 0xf007, 0x3000, 0x1204, 0x6101, 0x120c)
+        for batches in ((10,) * 8, (7, 11, 13, 17, 19, 23), (1, 2, 3, 100, 50, 50, 50)):
+            chip = self.assertSameAsSpinning(code, batches)
+        self.assertEqual(chip.registers[1], 1)
+
+    def test_idle_jump_to_self(self):
+        chip = self.assertSameAsSpinning(make_code(0x6001, 0x1202), (5, 1000))
+        self.assertEqual(chip.cycles, 1005)
+        self.assertEqual(chip.pc, 0x202)
+
+    def test_idle_wait_for_key(self):
+        # wait for key into V3
+        code = make_code(0xf30a, 0x1202)
+        chip = self.assertSameAsSpinning(code, (10, 10))
+        self.assertEqual(chip.pc, 0x200)
+        self.assertEqual(chip.cycles, 20)
+        chip.key_down(7)
+        chip.run_cycles(2)
+        self.assertEqual(chip.registers[3], 7)
+
+    def test_idle_loop_body_rewritten(self):
+        # V0 = 0x31, I = 0x206, save V0 over the skip, 0x206: skip if V1 != 0
+        # (never taken), jump 0x206, V2 = 1
+        code = make_code(0x6031, 0xa206, 0xf055, 0x4100, 0x1206, 0x6201, 0x120c)
+        chip = Chip8Emulator(code)
+        chip.pc = 0x206
+        chip.run_cycles(10)
+        self.assertEqual(chip.pc, 0x206)
+        chip.pc = 0x200
+        # The skip becomes 3100 (skip if V1 == 0) and leaves the loop
+        chip.run_cycles(10)
+        self.assertEqual(chip.registers[2], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import threading
+import unittest
+from chip8 import Chip8Emulator
+from cpu_thread import CpuThread, FrameExchange
+from scheduler import Scheduler
+
+class TestFrameExchange(unittest.TestCase):
+    def test_publish_and_take(self):
+        machine = Chip8Emulator(b'')
+        frames = FrameExchange(machine.frame_buffer)
+        self.assertTrue(frames.publish())
+        self.assertFalse(frames.publish())
+        frame, rects = frames.take()
+        self.assertEqual(frame, bytes(256))
+        self.assertEqual(rects, [(0, 0, 64, 32)])
+        self.assertIsNone(frames.take())
+
+    def test_take_merges_skipped_frames(self):
+        machine = Chip8Emulator(b'')
+        frames = FrameExchange(machine.frame_buffer)
+        frames.publish()
+        frames.take()
+        machine.frame_buffer.draw(0, 0, [0x80])
+        frames.publish()
+        machine.frame_buffer.draw(0, 1, [0x80])
+        frames.publish()
+        frame, rects = frames.take()
+        self.assertEqual(rects, [(0, 0, 1, 2)])
+        self.assertEqual(frame[:9], bytes([1, 0, 0, 0, 0, 0, 0, 0, 1]))
+
+class TestCpuThread(unittest.TestCase):
+    def test_runs_commands_between_slices(self):
+        # Wait for a key into V0, then V1 = 1, jump to self
+        machine = Chip8Emulator(bytes([0xf0, 0x0a, 0x61, 0x01, 0x12, 0x04]))
+        scheduler = Scheduler(machine, 6000)
+        done = threading.Event()
+
+        def emulate(elapsed):
+            scheduler.advance(elapsed)
+            if machine.registers[1]:
+                done.set()
+
+        cpu = CpuThread(emulate, FrameExchange(machine.frame_buffer))
+        cpu.start()
+        try:
+            cpu.call(machine.key_down, 9)
+            self.assertTrue(done.wait(5))
+        finally:
+            cpu.stop()
+        self.assertFalse(cpu.is_alive())
+        self.assertEqual(machine.registers[0], 9)
+
+if __name__ == '__main__':
+    unittest.main()
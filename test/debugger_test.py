@@ -0,0 +1,103 @@
+import unittest
+from chip8 import Chip8Emulator
+from recompiler import Chip8Recompiler
+from debugger import Debugger, DebugBreak
+
+# 200: V0 += 1, 202: call 206, 204: jump 200,
+# 206: I = 300, 208: save V0 at I, 20A: return
+CODE = bytes([0x70, 0x01, 0x22, 0x06, 0x12, 0x00,
+              0xa3, 0x00, 0xf0, 0x55, 0x00, 0xee])
+
+class TestDebugger(unittest.TestCase):
+    def test_breakpoint_stops_before_instruction(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        debugger.add_breakpoint(0x206)
+        with self.assertRaises(DebugBreak) as context:
+            machine.run_cycles(100)
+        self.assertEqual(context.exception.address, 0x206)
+        self.assertEqual(machine.pc, 0x206)
+        self.assertEqual(machine.cycles, 2)
+
+        debugger.resume()
+        with self.assertRaises(DebugBreak):
+            machine.run_cycles(100)
+        self.assertEqual(machine.cycles, 8)
+        self.assertEqual(machine.registers[0], 2)
+
+    def test_conditional_breakpoint(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        self.assertEqual(debugger.command('b 204 v0 == 3'), 'break 204 if V0 == 0x3')
+        with self.assertRaises(DebugBreak):
+            machine.run_cycles(100)
+        self.assertEqual(machine.registers[0], 3)
+        self.assertEqual(machine.pc, 0x204)
+
+    def test_write_watchpoint(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        debugger.command('w 300')
+        with self.assertRaises(DebugBreak) as context:
+            machine.run_cycles(100)
+        self.assertEqual(context.exception.address, 0x208)
+        # Stops after the write
+        self.assertEqual(machine.pc, 0x20a)
+        self.assertEqual(machine.ram[0x300], 1)
+
+    def test_stack_watchpoint(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        debugger.add_watchpoint(0xea0, 0x20)
+        with self.assertRaises(DebugBreak) as context:
+            machine.run_cycles(100)
+        self.assertEqual(context.exception.address, 0x202)
+        debugger.command('d ea0')
+        self.assertFalse(debugger.armed)
+        machine.run_cycles(100)
+
+    def test_read_watchpoint_ignores_writes(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        debugger.command('r 300')
+        machine.run_cycles(100)
+        self.assertEqual(machine.cycles, 100)
+
+    def test_run_until_return(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        machine.run_cycles(3)
+        self.assertEqual(machine.pc, 0x208)
+        debugger.command('u')
+        with self.assertRaises(DebugBreak):
+            machine.run_cycles(100)
+        self.assertEqual(machine.pc, 0x204)
+        self.assertFalse(debugger.armed)
+
+    def test_disarmed_restores_fast_path(self):
+        machine = Chip8Recompiler(CODE)
+        handlers = machine.opcode_handler
+        debugger = Debugger(machine)
+        debugger.add_breakpoint(0x20a)
+        debugger.add_watchpoint(0xf00, 0x100)
+        self.assertIn('run_cycles', machine.__dict__)
+        debugger.clear()
+        self.assertIs(machine.opcode_handler, handlers)
+        self.assertNotIn('run_cycles', machine.__dict__)
+        self.assertNotIn('_decode', machine.__dict__)
+        machine.run_cycles(100)
+
+    def test_breakpoint_survives_code_rewrite(self):
+        machine = Chip8Emulator(CODE)
+        debugger = Debugger(machine)
+        debugger.add_breakpoint(0x200, None)
+        debugger.resume()
+        machine.run_cycles(1)
+        machine.ram[0x200:0x202] = bytes([0x71, 0x01])
+        machine._invalidate(0x200, 2)
+        machine.pc = 0x200
+        with self.assertRaises(DebugBreak):
+            machine.run_cycles(1)
+
+if __name__ == '__main__':
+    unittest.main()
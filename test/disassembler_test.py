@@ -0,0 +1,50 @@
+import unittest
+from chip8 import Chip8Emulator
+from disassembler import Disassembler, describe, is_valid
+
+class TestDisassembler(unittest.TestCase):
+    def test_trace_separates_code_and_data(self):
+        # 200: call 208, 202: skip if V0 == 0, 204: jump 204, 206: jump 206,
+        # 208: return, 20A: data
+        rom = bytes([0x22, 0x08, 0x30, 0x00, 0x12, 0x04, 0x12, 0x06, 0x00, 0xee, 0xff, 0xff])
+        disassembler = Disassembler.from_rom(rom)
+        self.assertEqual(disassembler.trace(), {0x200, 0x202, 0x204, 0x206, 0x208})
+        self.assertEqual(disassembler.calls, {0x208})
+        self.assertEqual(disassembler.jumps, {0x204, 0x206})
+        listing = disassembler.listing()
+        self.assertIn('sub_208:', listing)
+        self.assertEqual(listing[-1], '  20A  db 0xFF, 0xFF')
+
+    def test_indirect_jump_stops_trace(self):
+        rom = bytes([0xb3, 0x00, 0x60, 0x01])
+        disassembler = Disassembler.from_rom(rom)
+        self.assertEqual(disassembler.trace(), {0x200})
+        self.assertEqual(disassembler.indirect, {0x200})
+
+    def test_invalid_opcodes(self):
+        self.assertFalse(is_valid(0x0123))
+        self.assertFalse(is_valid(0x8018))
+        self.assertFalse(is_valid(0xf0ff))
+        self.assertTrue(is_valid(0x00e0))
+        self.assertTrue(is_valid(0xf065))
+
+    def test_describe_matches_machine(self):
+        machine = Chip8Emulator(b'')
+        for opcode in (0x00e0, 0x1234, 0x6a02, 0x8124, 0xd455, 0xe0a1, 0xf233, 0xf0ff):
+            self.assertEqual(describe(opcode), machine.get_description(opcode))
+
+    def test_cache_follows_ram_writes(self):
+        machine = Chip8Emulator(bytes([0x6a, 0x02]))
+        disassembler = Disassembler(machine.ram)
+        opcode, text = disassembler.describe(0x200)
+        self.assertEqual(opcode, 0x6a02)
+        self.assertIs(disassembler.describe(0x200)[1], text)
+        # I = 0x200, V0 = 0xa3, save V0 over the first byte
+        machine.ram[0x202:0x208] = bytes([0xa2, 0x00, 0x60, 0xa3, 0xf0, 0x55])
+        machine.flush_decode_cache()
+        machine.pc = 0x202
+        machine.run_cycles(3)
+        self.assertEqual(disassembler.describe(0x200), (0xa302, 'I = 302'))
+
+if __name__ == '__main__':
+    unittest.main()
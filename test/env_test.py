@@ -0,0 +1,82 @@
+import os
+import random
+import unittest
+import numpy as np
+from env import Chip8Env, RamDeltaReward, NOOP
+from test.helpers import PROGRAMS
+
+# V0 = font 0, I = V0 * 5, draw at (V1, V1), V1 += 1, I = 0x300, BCD(V1), jump 0x204
+CODE = bytes([0x60, 0x00, 0xf0, 0x29, 0xd1, 0x15, 0x71, 0x01,
+              0xa3, 0x00, 0xf1, 0x33, 0x12, 0x04])
+
+class TestChip8Env(unittest.TestCase):
+    def test_observation_is_a_view(self):
+        env = Chip8Env(CODE)
+        obs = env.reset()
+        self.assertEqual(obs.shape, (256,))
+        env.machine.ram[0xf00] = 0xaa
+        self.assertEqual(obs[0], 0xaa)
+
+    def test_unpacked_observation(self):
+        env = Chip8Env(CODE, unpacked=True)
+        env.reset()
+        obs, _, _, _ = env.step(NOOP)
+        self.assertEqual(obs.shape, (32, 64))
+        self.assertTrue(np.any(obs))
+
+    def test_frame_skip_and_reward(self):
+        env = Chip8Env(CODE, frame_skip=2, cpu_hz=600, reward_hooks=[RamDeltaReward(0x302)])
+        env.reset()
+        _, reward, done, _ = env.step(NOOP)
+        self.assertEqual(env.machine.cycles, 20)
+        self.assertEqual(reward, env.machine.ram[0x302])
+        self.assertFalse(done)
+
+    def test_keys(self):
+        env = Chip8Env(CODE)
+        env.reset()
+        env.step(3)
+        self.assertEqual(env.machine.get_key_status()[3], 1)
+        env.step(7)
+        self.assertEqual(env.machine.get_key_status()[3], 0)
+        self.assertEqual(env.machine.get_key_status()[7], 1)
+        env.step(NOOP)
+        self.assertEqual(sum(env.machine.get_key_status()), 0)
+        with self.assertRaises(ValueError):
+            env.step(NOOP + 1)
+
+    def test_reset_restores_initial_state(self):
+        env = Chip8Env.from_rom(os.path.join(PROGRAMS, 'BRIX'), max_steps=50)
+        first = env.reset().copy()
+        ram = bytes(env.machine.ram)
+        random.seed(3)
+        done = False
+        while not done:
+            _, _, done, _ = env.step(random.randrange(NOOP + 1))
+        self.assertEqual(env.steps, 50)
+        obs = env.reset()
+        self.assertEqual(bytes(env.machine.ram), ram)
+        self.assertTrue(np.array_equal(obs, first))
+        self.assertEqual(env.machine.pc, 0x200)
+        self.assertEqual(env.machine.cycles, 0)
+
+    def test_episode_seeds(self):
+        # V0 = rand(), I = 0x300, save V0, jump to self
+        code = bytes([0xc0, 0xff, 0xa3, 0x00, 0xf0, 0x55, 0x12, 0x06])
+
+        def episodes(env, seeds):
+            values = []
+            for seed in seeds:
+                env.reset(seed)
+                env.step(NOOP)
+                values.append(env.machine.ram[0x300])
+            return values
+
+        env = Chip8Env(code, seed=5)
+        values = episodes(env, [None] * 8)
+        self.assertGreater(len(set(values)), 1)
+        self.assertEqual(episodes(Chip8Env(code, seed=5), [None] * 8), values)
+        self.assertEqual(len(set(episodes(env, [11] * 3))), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import random
+import unittest
+from bit_buffer import BitBuffer
+from frame_buffer import FrameBuffer
+
+def draw_per_bit(buffer, start_x, start_y, sprite):
+    # The original per-pixel drawing loop
+    bits = BitBuffer(buffer, 0)
+    collision = False
+    for i, sprite_line in enumerate(sprite):
+        for bit in range(8):
+            x = (start_x + bit) % 64
+            y = (start_y + i) % 32
+            index = y * 64 + x
+            sprite_bit = (sprite_line >> (7 - bit)) & 1
+            old_bit = bits[index]
+            new_bit = old_bit ^ sprite_bit
+            bits[index] = new_bit
+            if old_bit != 0 and new_bit == 0:
+                collision = True
+    return collision
+
+class TestFrameBuffer(unittest.TestCase):
+    def test_matches_per_bit_drawing(self):
+        rng = random.Random(8)
+        expected = bytearray(256)
+        buffer = bytearray(256)
+        frame_buffer = FrameBuffer(buffer, 0, 64, 32)
+        for _ in range(500):
+            x = rng.randrange(256)
+            y = rng.randrange(256)
+            sprite = bytes(rng.randrange(256) for _ in range(rng.randrange(16)))
+            self.assertEqual(frame_buffer.draw(x, y, sprite),
+                             draw_per_bit(expected, x, y, sprite))
+            self.assertEqual(buffer, expected)
+
+    def test_wraparound(self):
+        buffer = bytearray(256)
+        frame_buffer = FrameBuffer(buffer, 0, 64, 32)
+        frame_buffer.draw(60, 31, [0xff, 0x81])
+        self.assertEqual(frame_buffer.get_row(31), 0xf000000000000000 | 0x0f)
+        self.assertEqual(frame_buffer.get_row(0), 0x1000000000000000 | 0x08)
+
+    def test_clear(self):
+        buffer = bytearray(b'\xff' * 258)
+        frame_buffer = FrameBuffer(buffer, 1, 64, 32)
+        frame_buffer.clear()
+        self.assertEqual(buffer[0], 0xff)
+        self.assertEqual(buffer[1:257], bytes(256))
+        self.assertEqual(buffer[257], 0xff)
+
+    def test_dirty_rects(self):
+        buffer = bytearray(256)
+        frame_buffer = FrameBuffer(buffer, 0, 64, 32)
+        self.assertEqual(frame_buffer.take_dirty_rects(), [(0, 0, 64, 32)])
+        self.assertEqual(frame_buffer.take_dirty_rects(), [])
+        frame_buffer.draw(10, 4, [0x80, 0x01])
+        frame_buffer.draw(20, 20, [0xf0])
+        self.assertEqual(frame_buffer.take_dirty_rects(), [(10, 4, 8, 2), (20, 20, 4, 1)])
+
+    def test_bytes_dirty(self):
+        buffer = bytearray(0x1000)
+        frame_buffer = FrameBuffer(buffer, 0xf00, 64, 32)
+        frame_buffer.take_dirty_rects()
+        # The last byte of row 1 and the first of row 2
+        frame_buffer.mark_bytes_dirty(0xf0f, 2)
+        self.assertEqual(frame_buffer.take_dirty_rects(), [(0, 1, 64, 2)])
+        frame_buffer.mark_bytes_dirty(0xefe, 2)
+        frame_buffer.mark_bytes_dirty(0x1000, 2)
+        self.assertEqual(frame_buffer.take_dirty_rects(), [])
+
+    def test_dirty_after_clear(self):
+        buffer = bytearray(256)
+        frame_buffer = FrameBuffer(buffer, 0, 64, 32)
+        frame_buffer.draw(3, 7, [0xc0])
+        frame_buffer.take_dirty_rects()
+        frame_buffer.clear()
+        self.assertEqual(frame_buffer.take_dirty_rects(), [(3, 7, 2, 1)])
+        frame_buffer.clear()
+        self.assertEqual(frame_buffer.take_dirty_rects(), [])
+
+if __name__ == '__main__':
+    unittest.main()
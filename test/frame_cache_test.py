@@ -0,0 +1,48 @@
+import unittest
+from frame_cache import FrameCache
+
+def frame(n):
+    return bytes([n]) * 256
+
+class TestFrameCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = FrameCache()
+        self.assertIsNone(cache.get(frame(1)))
+        cache.put(frame(1), 'one', 10)
+        self.assertEqual(cache.get(bytearray(frame(1))), 'one')
+        self.assertEqual(cache.get(memoryview(frame(1))), 'one')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_worth_keeping_after_second_miss(self):
+        cache = FrameCache()
+        cache.get(frame(1))
+        self.assertFalse(cache.worth_keeping(frame(1)))
+        cache.get(frame(1))
+        self.assertTrue(cache.worth_keeping(frame(1)))
+        cache.put(frame(1), 'one', 10)
+        self.assertFalse(cache.worth_keeping(frame(1)))
+
+    def test_budget_drops_least_recently_used(self):
+        cache = FrameCache(budget=30)
+        for n in range(3):
+            cache.put(frame(n), n, 10)
+        cache.get(frame(0))
+        cache.put(frame(3), 3, 10)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.size, 30)
+        self.assertIsNone(cache.get(frame(1)))
+        self.assertEqual(cache.get(frame(0)), 0)
+
+    def test_put_replaces_and_skips_oversized(self):
+        cache = FrameCache(budget=30)
+        cache.put(frame(0), 'a', 10)
+        cache.put(frame(0), 'b', 20)
+        self.assertEqual((len(cache), cache.size), (1, 20))
+        cache.put(frame(1), 'c', 31)
+        self.assertIsNone(cache.get(frame(1)))
+        self.assertEqual(cache.get(frame(0)), 'b')
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
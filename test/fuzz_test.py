@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+import fuzz
+from chip8 import Chip8Emulator
+
+class CarryingAdd(Chip8Emulator):
+    # 7xnn must not touch VF
+    def _add_x(self, data):
+        total = self.registers[data.X] + data.NN
+        self.registers[data.X] = total & 0xff
+        self.registers[0xf] = total >> 8
+
+class OvercountingFault(Chip8Emulator):
+    # Charges a whole block for an instruction that faulted inside it
+    def run_cycles(self, count):
+        try:
+            return super().run_cycles(count)
+        except IndexError:
+            self.cycles += 3
+            raise
+
+# V1 = 1, V2 = 2, V3 = FF, V3 += 2, V1 = V2, jump to self
+CODE = bytes([0x61, 0x01, 0x62, 0x02, 0x63, 0xff, 0x73, 0x02, 0x81, 0x20, 0x12, 0x0a])
+
+class TestFuzz(unittest.TestCase):
+    def test_engines_agree(self):
+        for engine in sorted(fuzz.ENGINES):
+            # VectorChip8 steps one instruction at a time through NumPy
+            cases = 10 if engine == 'vector' else 30
+            with self.subTest(engine=engine):
+                self.assertEqual(fuzz.fuzz(engine, cases, base_seed=7, jobs=1), [])
+
+    def test_cases_are_reproducible(self):
+        corpus = [CODE]
+        self.assertEqual(fuzz.generate_case(3, 11, corpus), fuzz.generate_case(3, 11, corpus))
+        self.assertNotEqual(fuzz.generate_case(3, 11, corpus), fuzz.generate_case(3, 12, corpus))
+
+    def test_finds_and_shrinks_divergence(self):
+        with mock.patch.dict(fuzz.ENGINES, {'carrying': CarryingAdd}):
+            self.assertIsNone(fuzz.run_case('interpreter', CODE, 0))
+            cycle, difference = fuzz.run_case('carrying', CODE, 0)
+            self.assertEqual(difference, 'VF 0x1 != 0x0')
+            code = fuzz.shrink('carrying', CODE, 0)
+        # Only the overflowing add and what keeps it running are left
+        self.assertLess(len(code.replace(fuzz.NOP, b'')), len(CODE))
+        self.assertIn(bytes([0x73, 0x02]), code)
+        self.assertNotIn(bytes([0x81, 0x20]), code)
+
+    def test_compares_after_fault(self):
+        # I = 0xfff, load V0..V1 past the end of RAM, V0 = 1, jump 0x200
+        code = bytes([0xaf, 0xff, 0xf1, 0x65, 0x60, 0x01, 0x12, 0x00])
+        with mock.patch.dict(fuzz.ENGINES, {'overcounting': OvercountingFault}):
+            self.assertIsNone(fuzz.run_case('interpreter', code, 0))
+            cycle, difference = fuzz.run_case('overcounting', code, 0)
+        self.assertEqual(cycle, 2)
+        self.assertEqual(difference, 'cycles 0x5 != 0x2')
+
+if __name__ == '__main__':
+    unittest.main()
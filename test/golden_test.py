@@ -0,0 +1,34 @@
+import json
+import unittest
+import golden
+
+# Keep test translations out of the user's cache
+ENGINE_OPTIONS = {'aot': {'cache_dir': None}}
+
+class TestGolden(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(golden.DEFAULT_MANIFEST) as f:
+            cls.manifest = json.load(f)
+
+    def test_engines_match_manifest(self):
+        for engine in sorted(golden.ENGINES):
+            with self.subTest(engine=engine):
+                differences = golden.check(self.manifest, engine=engine, engine_options=ENGINE_OPTIONS)
+                for name, difference in differences:
+                    self.assertIsNone(difference, name)
+
+    def test_first_difference(self):
+        expected = self.manifest['roms']['PONG']
+        actual = json.loads(json.dumps(expected))
+        self.assertIsNone(golden.first_difference(expected, actual))
+        actual['checkpoints'][3]['ram'] = '0' * 40
+        actual['checkpoints'][5]['frame'] = '0' * 40
+        self.assertEqual(golden.first_difference(expected, actual),
+                         f'ram differs at cycle {expected["checkpoints"][3]["cycle"]}')
+        actual = dict(expected, checkpoints=expected['checkpoints'][:2], fault='Hard fault')
+        self.assertEqual(golden.first_difference(expected, actual),
+                         f'stopped before cycle {expected["checkpoints"][2]["cycle"]} : Hard fault')
+
+if __name__ == '__main__':
+    unittest.main()
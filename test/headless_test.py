@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import unittest
+import headless
+
+PONG = os.path.join(headless.DEFAULT_PROGRAMS, 'PONG')
+# Keep test translations out of the user's cache
+ENGINE_OPTIONS = {'aot': {'cache_dir': None}}
+
+class TestHeadless(unittest.TestCase):
+    def test_parse_key_event(self):
+        self.assertEqual(headless.parse_key_event('120:a:down'), (120, 0xa, True))
+        self.assertEqual(headless.parse_key_event('0:0:up'), (0, 0, False))
+        with self.assertRaises(ValueError):
+            headless.parse_key_event('120:a')
+        with self.assertRaises(ValueError):
+            headless.parse_key_event('120:10:down')
+
+    def test_engines_agree(self):
+        inputs = [(300, 1, True), (900, 1, False)]
+        results = [headless.run_rom(PONG, frames=120, inputs=inputs, engine=engine,
+                                    engine_options=ENGINE_OPTIONS)
+                   for engine in sorted(headless.ENGINES)]
+        for result in results:
+            self.assertIsNone(result.fault)
+            self.assertEqual(result.cycles, 120 * headless.DEFAULT_CPU_HZ // 60)
+            self.assertEqual(result.frame_hash, results[0].frame_hash)
+
+    def test_default_cycles(self):
+        result = headless.run_rom(PONG, engine='recompiler')
+        self.assertIsNone(result.fault)
+        self.assertEqual(result.cycles, headless.DEFAULT_CYCLES)
+
+    def test_run_roms_on_pool(self):
+        results = headless.run_roms([PONG, PONG], jobs=2, cycles=1000)
+        self.assertEqual([result.rom for result in results], [PONG, PONG])
+        for result in results:
+            self.assertIsNone(result.fault)
+            self.assertEqual(result.cycles, 1000)
+        self.assertEqual(results[0].frame_hash, results[1].frame_hash)
+
+    def test_core_imports_without_frontend(self):
+        # Worker processes must not pay for pygame, numpy or the process pool
+        script = ('import sys, headless; '
+                  'print(sorted({"pygame", "numpy", "concurrent.futures", "argparse"} & set(sys.modules)))')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+if __name__ == '__main__':
+    unittest.main()
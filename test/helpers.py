@@ -0,0 +1,13 @@
+import os
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'programs')
+
+def load(name):
+    with open(os.path.join(PROGRAMS, name), 'rb') as f:
+        return bytearray(f.read())
+
+def make_code(*opcodes):
+    code = bytearray()
+    for opcode in opcodes:
+        code += opcode.to_bytes(2, 'big')
+    return code
@@ -0,0 +1,52 @@
+import unittest
+from chip8 import Chip8Emulator
+from recompiler import Chip8Recompiler
+from profiler import Profiler
+
+# 200: call 206, 202: jump 200, 206: V0 += 1, 208: return
+CODE = bytes([0x22, 0x06, 0x12, 0x00, 0x00, 0x00, 0x70, 0x01, 0x00, 0xee])
+
+class TestProfiler(unittest.TestCase):
+    def test_counts_and_histogram(self):
+        machine = Chip8Emulator(CODE)
+        with Profiler(machine) as profiler:
+            machine.run_cycles(40)
+        self.assertEqual(profiler.counts['call_subroutine'], 10)
+        self.assertEqual(profiler.counts['add_x'], 10)
+        self.assertEqual(profiler.counts['clear_or_return'], 10)
+        self.assertEqual(profiler.counts['jump'], 10)
+        self.assertEqual(profiler.pc_histogram[0x206], 10)
+        self.assertEqual(profiler.hot_pcs(1), [(0x200, 10)])
+        self.assertEqual(set(profiler.host_time), set(profiler.counts))
+        self.assertEqual(profiler.to_dict()['instructions'], 40)
+
+    def test_call_graph_and_folded_stacks(self):
+        machine = Chip8Emulator(CODE)
+        with Profiler(machine) as profiler:
+            machine.run_cycles(40)
+        self.assertEqual(profiler.call_edges, {(0x200, 0x206): 10})
+        self.assertEqual(profiler.folded_stacks(), '0x200 20\n0x200;0x206 20\n')
+
+    def test_detach_restores_dispatch(self):
+        machine = Chip8Emulator(CODE)
+        handlers = machine.opcode_handler
+        misc = machine.misc_opcode_handler
+        with Profiler(machine) as profiler:
+            machine.run_cycles(4)
+        machine.run_cycles(4)
+        self.assertIs(machine.opcode_handler, handlers)
+        self.assertIs(machine.misc_opcode_handler, misc)
+        self.assertEqual(sum(profiler.counts.values()), 4)
+        self.assertEqual(machine.registers[0], 2)
+
+    def test_recompiler_counts_every_instruction(self):
+        machine = Chip8Recompiler(CODE)
+        with Profiler(machine) as profiler:
+            machine.run_cycles(40)
+        self.assertEqual(profiler.counts['add_x'], 10)
+        self.assertNotIn('run_cycles', machine.__dict__)
+        machine.run_cycles(40)
+        self.assertEqual(machine.registers[0], 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from chip8 import Chip8Emulator, HardFaultError
+from recompiler import Chip8Recompiler
+from test.helpers import load, make_code
+
+def run(chip_type, code, batches, batch_size=9):
+    chip = chip_type(code, seed=1)
+    for i in range(batches):
+        if i == batches // 2:
+            chip.key_down(5)
+        chip.run_cycles(batch_size)
+        chip.tick60Hz()
+    return chip
+
+class TestChip8Recompiler(unittest.TestCase):
+    def assertSameMachine(self, a, b):
+        self.assertEqual(a.pc, b.pc)
+        self.assertEqual(a.I, b.I)
+        self.assertEqual(a.sp, b.sp)
+        self.assertEqual(a.registers, b.registers)
+        self.assertEqual(a.ram, b.ram)
+        self.assertEqual(a.cycles, b.cycles)
+
+    def test_programs_match_interpreter(self):
+        for name in ('BLINKY', 'BRIX', 'INVADERS', 'MAZE', 'PONG2', 'TETRIS'):
+            with self.subTest(program=name):
+                code = load(name)
+                self.assertSameMachine(run(Chip8Emulator, code, 300),
+                                       run(Chip8Recompiler, code, 300))
+
+    def test_jump_with_offset(self):
+        # V0 = 4, jump to 0x204 + V0, 0x208: V1 = 1
+        code = make_code(0x6004, 0xb204, 0x6102, 0x6103, 0x6101, 0x1208)
+        chip = Chip8Recompiler(code)
+        chip.run_cycles(3)
+        self.assertEqual(chip.registers[1], 1)
+        self.assertEqual(chip.pc, 0x20a)
+
+    def test_wait_for_key(self):
+        # Wait for a key into V2, then V3 = 1
+        chip = Chip8Recompiler(make_code(0xf20a, 0x6301, 0x1204))
+        chip.run_cycles(10)
+        self.assertEqual(chip.pc, 0x200)
+        self.assertEqual(chip.cycles, 10)
+        chip.key_down(0xb)
+        chip.run_cycles(2)
+        self.assertEqual(chip.registers[2], 0xb)
+        self.assertEqual(chip.registers[3], 1)
+
+    def test_self_modifying_block(self):
+        # 0x200: V1 += 1, V0 = 2, I = 0x201, save V0, jump 0x200
+        # The save rewrites 0x200 into V1 += 2 for the following iterations.
+        chip = Chip8Recompiler(make_code(0x7101, 0x6002, 0xa201, 0xf055, 0x1200))
+        chip.run_cycles(15)
+        self.assertEqual(chip.registers[1], 1 + 2 + 2)
+
+    def test_fault_inside_block(self):
+        # I = 0xfff, load V0..V1 runs past the end of RAM, V0 = 1, V0 = 2, V0 = 3
+        code = make_code(0xafff, 0xf165, 0x6001, 0x6002, 0x6003)
+        chips = []
+        for chip_type in (Chip8Emulator, Chip8Recompiler):
+            chip = chip_type(code)
+            with self.assertRaises(IndexError):
+                chip.run_cycles(10)
+            chips.append(chip)
+        self.assertSameMachine(*chips)
+        self.assertEqual(chips[1].cycles, 2)
+
+    def test_fault_in_last_instruction(self):
+        # V0 = 1, then an unknown opcode
+        chips = []
+        for chip_type in (Chip8Emulator, Chip8Recompiler):
+            chip = chip_type(make_code(0x6001, 0x0123))
+            with self.assertRaises(HardFaultError):
+                chip.run_cycles(10)
+            chips.append(chip)
+        self.assertSameMachine(*chips)
+        self.assertEqual(chips[1].cycles, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+from chip8 import Chip8Emulator
+from color import Color
+from main import Emulator
+from render import machine_screen_rects, panel_changed, paint_rects, scale_rect
+
+class TestRender(unittest.TestCase):
+    def test_panel_changed(self):
+        panel_state = {}
+        self.assertTrue(panel_changed(panel_state, 'main', (60, 1)))
+        self.assertFalse(panel_changed(panel_state, 'main', (60, 1)))
+        self.assertTrue(panel_changed(panel_state, 'keyboard', (60, 1)))
+        self.assertTrue(panel_changed(panel_state, 'main', (59, 1)))
+        panel_state.clear()
+        self.assertTrue(panel_changed(panel_state, 'main', (59, 1)))
+
+    def test_machine_screen_rects(self):
+        self.assertEqual(machine_screen_rects([(1, 2, 3, 4)], False, 64, 32), [(1, 2, 3, 4)])
+        self.assertEqual(machine_screen_rects([(1, 2, 3, 4)], True, 64, 32), [(0, 0, 64, 32)])
+        # Nothing changed, nothing to catch up on yet
+        self.assertEqual(machine_screen_rects([], True, 64, 32), [])
+
+    def test_scale_rect(self):
+        self.assertEqual(scale_rect((1, 2, 3, 4), 6), (6, 12, 18, 24))
+
+    def test_paint_rects(self):
+        frame = bytearray(4)
+        # Pixels (0, 0) and (9, 1) of a 16x2 frame
+        frame[0] = 0x01
+        frame[3] = 0x02
+        surface = np.full((16, 2), 7, np.uint32)
+        colors = np.array([0, 1], np.uint32)
+        paint_rects(surface, frame, 16, 2, [(8, 0, 8, 2)], colors)
+        expected = np.full((16, 2), 7, np.uint32)
+        expected[8:, :] = 0
+        expected[9, 1] = 1
+        np.testing.assert_array_equal(surface, expected)
+        paint_rects(surface, frame, 16, 2, [(0, 0, 16, 2)], colors)
+        expected[:8, :] = 0
+        expected[0, 0] = 1
+        np.testing.assert_array_equal(surface, expected)
+
+
+class TestEmulatorRendering(unittest.TestCase):
+    def setUp(self):
+        self.machine = Chip8Emulator(bytes(2), seed=0)
+        self.emulator = Emulator(self.machine, 1200, 600, 2, 'test')
+
+    def draw(self):
+        self.emulator.draw_machine_screen(self.emulator.chip_screen, self.emulator.chip_screen_scale)
+
+    def assertShows(self, frame_buffer):
+        # Every pixel of the scaled screen against the frame buffer
+        screen = self.emulator.chip_screen_scale
+        green = screen.map_rgb(Color.GREEN)
+        shown = pygame.surfarray.array2d(screen)[::2, ::2] == green
+        expected = np.array([[frame_buffer.get_row(y) >> x & 1 for y in range(frame_buffer.height)]
+                             for x in range(frame_buffer.width)], bool)
+        np.testing.assert_array_equal(shown, expected)
+
+    def show(self, x, y):
+        self.machine.frame_buffer.draw(x, y, b'\xff' * 4)
+        self.machine.needs_to_redraw = True
+        self.draw()
+        self.assertShows(self.machine.frame_buffer)
+
+    def test_dirty_rects_are_drawn(self):
+        self.draw()
+        self.show(3, 5)
+        self.show(60, 30)
+        self.show(3, 5)
+
+    def test_screen_repainted_after_cached_frame(self):
+        self.draw()
+        # Frames that keep coming back end up in the frame cache
+        for _ in range(3):
+            self.show(3, 5)
+            self.show(3, 5)
+        self.assertGreater(len(self.emulator.frame_cache), 0)
+        self.assertGreater(self.emulator.frame_cache.hits, 0)
+        # A cached frame leaves chip_screen behind, only part of the next one is dirty
+        self.show(3, 5)
+        self.assertTrue(self.emulator.chip_screen_stale)
+        self.show(40, 20)
+        self.assertFalse(self.emulator.chip_screen_stale)
+
+    def test_unchanged_panels_are_not_redrawn(self):
+        screen = self.emulator.main_screen
+        self.emulator.draw_main_screen(screen)
+        screen.fill(Color.RED)
+        self.emulator.draw_main_screen(screen)
+        self.assertEqual(screen.get_at((0, 0)), Color.RED)
+        self.emulator.fps = 30
+        self.emulator.draw_main_screen(screen)
+        self.assertEqual(screen.get_at((0, 0)), Color.BLACK)
+        screen.fill(Color.RED)
+        self.emulator.invalidate_panels()
+        self.emulator.draw_main_screen(screen)
+        self.assertEqual(screen.get_at((0, 0)), Color.BLACK)
+
+if __name__ == '__main__':
+    unittest.main()
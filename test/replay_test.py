@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import unittest
+from chip8 import Chip8Emulator
+from replay import InputLog, InputRecorder, replay
+from rewind import RewindBuffer
+from scheduler import Scheduler
+from test.helpers import load
+
+def play(code, seed, frames=300, rewind=False, switch_frame=None):
+    """Simulate a session with uneven frame times and random key presses."""
+    session = random.Random(seed)
+    chip = Chip8Emulator(code, seed=seed)
+    recorder = InputRecorder(chip, code, seed, 700)
+    scheduler = Scheduler(chip, 700)
+    rewind_buffer = RewindBuffer(interval=1)
+    for frame in range(frames):
+        if session.random() < 0.1:
+            key, pressed = session.randrange(16), session.random() < 0.5
+            if pressed:
+                chip.key_down(key)
+            else:
+                chip.key_up(key)
+            recorder.key(key, pressed)
+        if frame == (switch_frame if switch_frame is not None else frames // 2):
+            scheduler.set_cpu_hz(1400)
+            recorder.set_cpu_hz(1400)
+        if rewind and frame % 50 == 49:
+            for _ in range(10):
+                chip.restore(rewind_buffer.rewind())
+            scheduler.resync()
+            recorder.rewound()
+        scheduler.advance(session.uniform(0.005, 0.03))
+        rewind_buffer.record_frame(chip)
+    return chip, recorder
+
+class TestReplay(unittest.TestCase):
+    def test_replay_reproduces_session(self):
+        for name in ('BRIX', 'BLINKY', 'TETRIS'):
+            with self.subTest(program=name):
+                code = load(name)
+                chip, recorder = play(code, seed=len(name))
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, 'input.log')
+                    recorder.save(path)
+                    log = InputLog.load(path)
+                self.assertEqual(log.events, recorder.log.events)
+                for engine in ('interpreter', 'recompiler'):
+                    replayed = replay(code, log, engine)
+                    self.assertEqual(replayed.cycles, chip.cycles)
+                    self.assertEqual(replayed.ram, chip.ram)
+                    self.assertEqual(replayed.registers, chip.registers)
+
+    def test_replay_after_rewind(self):
+        for name in ('BRIX', 'PONG', 'TETRIS'):
+            # Rewinding to before the frequency change keeps the new frequency
+            for switch_frame in (150, 45):
+                with self.subTest(program=name, switch_frame=switch_frame):
+                    code = load(name)
+                    chip, recorder = play(code, seed=7, rewind=True, switch_frame=switch_frame)
+                    recorder.save(os.devnull)
+                    replayed = replay(code, recorder.log)
+                    self.assertEqual(replayed.cycles, chip.cycles)
+                    self.assertEqual(replayed.ram, chip.ram)
+
+    def test_key_change_on_snapshot_cycle(self):
+        code = load('BRIX')
+        chip = Chip8Emulator(code, seed=3)
+        recorder = InputRecorder(chip, code, 3, 700)
+        scheduler = Scheduler(chip, 700)
+        scheduler.run_cycles(500)
+        chip.key_down(4)
+        recorder.key(4, True)
+        snapshot = chip.snapshot()
+        # Released on the cycle the snapshot was taken at
+        chip.key_up(4)
+        recorder.key(4, False)
+        scheduler.run_cycles(500)
+        chip.restore(snapshot)
+        scheduler.resync()
+        recorder.rewound()
+        scheduler.run_cycles(500)
+        recorder.save(os.devnull)
+        replayed = replay(code, recorder.log)
+        self.assertEqual(replayed.key_buffer[4], 1)
+        self.assertEqual(replayed.ram, chip.ram)
+
+    def test_seeded_random(self):
+        # V0 = rand() & 0xff
+        a = Chip8Emulator(bytes([0xc0, 0xff]), seed=42)
+        b = Chip8Emulator(bytes([0xc0, 0xff]), seed=42)
+        a.run_loop()
+        b.run_loop()
+        self.assertEqual(a.registers[0], b.registers[0])
+
+    def test_wrong_rom(self):
+        _, recorder = play(load('PONG'), seed=1, frames=10)
+        with self.assertRaises(ValueError):
+            replay(load('PONG2'), recorder.log)
+
+if __name__ == '__main__':
+    unittest.main()
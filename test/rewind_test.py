@@ -0,0 +1,52 @@
+import unittest
+from chip8 import Chip8Emulator
+from rewind import RewindBuffer
+from test.helpers import load
+
+class TestRewindBuffer(unittest.TestCase):
+    def test_rewind_returns_snapshots_in_reverse(self):
+        chip = Chip8Emulator(load('BRIX'))
+        rewind = RewindBuffer(interval=1)
+        snapshots = []
+        for _ in range(30):
+            chip.run_cycles(10)
+            chip.tick60Hz()
+            rewind.record_frame(chip)
+            snapshots.append(chip.snapshot())
+        self.assertEqual(len(rewind), 30)
+        for expected in reversed(snapshots[:-1]):
+            self.assertEqual(rewind.rewind(), expected)
+        self.assertIsNone(rewind.rewind())
+        self.assertEqual(len(rewind), 1)
+
+    def test_interval(self):
+        chip = Chip8Emulator(load('PONG'))
+        rewind = RewindBuffer(interval=4)
+        for _ in range(16):
+            rewind.record_frame(chip)
+        self.assertEqual(len(rewind), 4)
+
+    def test_budget(self):
+        chip = Chip8Emulator(load('INVADERS'))
+        budget = 2 * len(chip.snapshot())
+        rewind = RewindBuffer(budget=budget, interval=1)
+        for _ in range(500):
+            chip.run_cycles(20)
+            chip.tick60Hz()
+            rewind.record_frame(chip)
+            self.assertLessEqual(rewind.size, budget)
+        self.assertGreater(len(rewind), 2)
+        while rewind.rewind() is not None:
+            self.assertLessEqual(rewind.size, budget)
+
+    def test_deltas_are_small(self):
+        chip = Chip8Emulator(load('BLINKY'))
+        rewind = RewindBuffer(interval=1)
+        for _ in range(100):
+            chip.run_cycles(10)
+            chip.tick60Hz()
+            rewind.record_frame(chip)
+        self.assertLess(rewind.size, 100 * len(chip.snapshot()) // 4)
+
+if __name__ == '__main__':
+    unittest.main()
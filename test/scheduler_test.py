@@ -0,0 +1,54 @@
+import unittest
+from chip8 import Chip8Emulator
+from scheduler import Scheduler
+
+# V0 = 60, delay = V0, loop: V1 += 1, jump loop
+LOOP = bytes([0x60, 0x3c, 0xf0, 0x15, 0x71, 0x01, 0x12, 0x04])
+
+class TestScheduler(unittest.TestCase):
+    def test_timers_follow_emulated_time(self):
+        for cpu_hz in (500, 600, 2000, 1_000_000):
+            with self.subTest(cpu_hz=cpu_hz):
+                chip = Chip8Emulator(LOOP)
+                scheduler = Scheduler(chip, cpu_hz)
+                scheduler.run_cycles(cpu_hz // 2)
+                self.assertEqual(scheduler.ticks, 30)
+                self.assertEqual(chip.delay_count, 30)
+                self.assertEqual(chip.cycles, cpu_hz // 2)
+
+    def test_batching_does_not_change_result(self):
+        a = Chip8Emulator(LOOP)
+        Scheduler(a, 700).run_cycles(7000)
+        b = Chip8Emulator(LOOP)
+        scheduler = Scheduler(b, 700)
+        for _ in range(1000):
+            scheduler.run_cycles(7)
+        self.assertEqual(a.cycles, b.cycles)
+        self.assertEqual(a.registers, b.registers)
+        self.assertEqual(a.delay_count, b.delay_count)
+
+    def test_advance(self):
+        chip = Chip8Emulator(LOOP)
+        scheduler = Scheduler(chip, 600, max_lag=1)
+        for _ in range(60):
+            scheduler.advance(1 / 60)
+        self.assertAlmostEqual(chip.cycles, 600, delta=1)
+        self.assertEqual(scheduler.advance(10), 600)
+
+    def test_run_ticks(self):
+        chip = Chip8Emulator(LOOP)
+        scheduler = Scheduler(chip, 900)
+        scheduler.run_ticks(6)
+        self.assertEqual(chip.cycles, 90)
+        self.assertEqual(chip.delay_count, 54)
+
+    def test_set_cpu_hz(self):
+        chip = Chip8Emulator(LOOP)
+        scheduler = Scheduler(chip, 600)
+        scheduler.run_ticks(1)
+        scheduler.set_cpu_hz(1200)
+        scheduler.run_ticks(1)
+        self.assertEqual(chip.cycles, 10 + 20)
+
+if __name__ == '__main__':
+    unittest.main()
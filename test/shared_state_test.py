@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import unittest
+from chip8 import Chip8Emulator
+from shared_state import SharedState, SharedStateReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# I = font 0, V1 = 7, draw at (V0, V0), jump to self
+CODE = bytes([0xa0, 0x00, 0x61, 0x07, 0xd0, 0x05, 0x12, 0x06])
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.state = SharedState()
+        self.machine = Chip8Emulator(CODE, ram=self.state.ram, registers=self.state.registers)
+
+    def tearDown(self):
+        del self.machine
+        self.state.close()
+
+    def test_reader_sees_machine(self):
+        reader = SharedStateReader(self.state.name)
+        try:
+            self.assertEqual(reader.read().frame_generation, 0)
+            with self.state.update(self.machine):
+                self.assertEqual(reader.generation % 2, 1)
+                self.machine.run_cycles(10)
+            copy = reader.read()
+            self.assertEqual(copy.generation, 2)
+            self.assertEqual(copy.frame_generation, 1)
+            self.assertEqual(copy.pc, 0x206)
+            self.assertEqual(copy.cycles, 10)
+            self.assertEqual(copy.registers[1], 7)
+            self.assertEqual(copy.ram, bytes(self.machine.ram))
+            self.assertEqual(copy.frame[0], 0x0f)
+
+            # Nothing new drawn
+            with self.state.update(self.machine):
+                self.machine.run_cycles(10)
+            self.assertEqual(reader.frame_generation, 1)
+            self.assertIsNone(reader.wait_frame(1, timeout=0.01))
+        finally:
+            reader.close()
+
+    def test_wide_registers(self):
+        reader = SharedStateReader(self.state.name)
+        try:
+            with self.state.update(self.machine):
+                self.machine.I = 0xfffe
+                self.machine.registers[1] = 7
+                # I += V1
+                self.machine.ram[0x200:0x202] = bytes([0xf1, 0x1e])
+                self.machine.run_cycles(1)
+            self.assertEqual(self.machine.I, 0x10005)
+            self.assertEqual(reader.read().I, 0x0005)
+        finally:
+            reader.close()
+
+    def test_snapshot_restore_in_place(self):
+        self.machine.run_cycles(3)
+        snapshot = self.machine.snapshot()
+        self.machine.run_cycles(3)
+        self.machine.restore(snapshot)
+        self.assertEqual(self.machine.snapshot(), snapshot)
+        self.assertIs(self.machine.ram, self.state.ram)
+
+    def test_viewer_in_other_process(self):
+        with self.state.update(self.machine):
+            self.machine.run_cycles(3)
+        output = subprocess.run(
+            [sys.executable, os.path.join(ROOT, 'shared_state.py'), self.state.name, '--frames', '1'],
+            capture_output=True, text=True, timeout=30, check=True).stdout
+        lines = output.splitlines()
+        self.assertTrue(lines[0].startswith('frame 1'))
+        self.assertEqual(lines[1][:8], '####....')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from chip8 import Chip8Emulator, SNAPSHOT_MAGIC
+from recompiler import Chip8Recompiler
+from test.helpers import load
+
+def state(chip):
+    return (bytes(chip.ram), bytes(chip.registers), chip.pc, chip.sp, chip.I,
+            chip.delay_count, chip.sound_count, chip.timer_ticks, chip.cycles)
+
+def run(chip, batches):
+    for _ in range(batches):
+        chip.run_cycles(10)
+        chip.tick60Hz()
+
+class TestSnapshot(unittest.TestCase):
+    def test_restore_replays_identically(self):
+        for chip_type in (Chip8Emulator, Chip8Recompiler):
+            with self.subTest(engine=chip_type.__name__):
+                chip = chip_type(load('BRIX'))
+                run(chip, 50)
+                snapshot = chip.snapshot()
+                self.assertTrue(snapshot.startswith(SNAPSHOT_MAGIC))
+                run(chip, 100)
+                expected = state(chip)
+
+                chip.rng.state = 12345
+                chip.restore(snapshot)
+                run(chip, 100)
+                self.assertEqual(state(chip), expected)
+
+    def test_restore_keeps_views(self):
+        chip = Chip8Emulator(load('PONG'))
+        ram = chip.ram
+        registers = chip.registers
+        snapshot = chip.snapshot()
+        run(chip, 20)
+        chip.restore(snapshot)
+        self.assertIs(chip.ram, ram)
+        self.assertIs(chip.registers, registers)
+        self.assertIs(chip.screen_buffer.buffer, ram)
+        self.assertEqual(chip.pc, 0x200)
+
+    def test_restore_flushes_decoded_code(self):
+        chip = Chip8Emulator(bytes([0x60, 0x01]))
+        other = Chip8Emulator(bytes([0x60, 0x02]))
+        chip.run_loop()
+        chip.restore(other.snapshot())
+        chip.run_loop()
+        self.assertEqual(chip.registers[0], 2)
+
+    def test_invalid_snapshot(self):
+        chip = Chip8Emulator(bytes())
+        with self.assertRaises(ValueError):
+            chip.restore(b'C8ST')
+        with self.assertRaises(ValueError):
+            chip.restore(b'XXXX' + chip.snapshot()[4:])
+
+    def test_save_and_load(self):
+        chip = Chip8Emulator(load('TETRIS'))
+        run(chip, 30)
+        expected = state(chip)
+        with tempfile.TemporaryDirectory() as directory:
+            for compress in (False, True):
+                path = os.path.join(directory, f'state{compress}')
+                chip.save_snapshot(path, compress=compress)
+                other = Chip8Emulator(bytes())
+                other.load_snapshot(path)
+                self.assertEqual(state(other), expected)
+            self.assertLess(os.path.getsize(os.path.join(directory, 'stateTrue')),
+                            os.path.getsize(os.path.join(directory, 'stateFalse')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import numpy as np
+from chip8 import Chip8Emulator
+from vector import VectorChip8
+from test.helpers import load
+
+NAMES = ('BLINKY', 'BRIX', 'INVADERS', 'MAZE', 'PONG2', 'TETRIS', 'UFO', 'WIPEOFF')
+
+class TestVectorChip8(unittest.TestCase):
+    def assertLaneMatches(self, machines, lane, chip):
+        self.assertEqual(machines.pc[lane], chip.pc)
+        self.assertEqual(machines.I[lane], chip.I)
+        self.assertEqual(machines.sp[lane], chip.sp)
+        self.assertEqual(machines.delay_count[lane], chip.delay_count)
+        self.assertEqual(bytes(machines.registers[lane]), bytes(chip.registers))
+        self.assertEqual(bytes(machines.ram[lane]), bytes(chip.ram))
+
+    def test_programs_match_interpreter(self):
+        codes = [load(name) for name in NAMES]
+        machines = VectorChip8(codes, seeds=range(len(codes)))
+
+        chips = []
+        for lane, code in enumerate(codes):
+            chip = Chip8Emulator(code, seed=lane)
+            for i in range(200):
+                if i == 100:
+                    chip.key_down(lane)
+                chip.run_cycles(10)
+                chip.tick60Hz()
+            chips.append(chip)
+
+        for i in range(200):
+            if i == 100:
+                for lane in range(len(codes)):
+                    machines.key_down([lane], lane)
+            machines.run_cycles(10)
+            machines.tick60Hz()
+
+        for lane, chip in enumerate(chips):
+            with self.subTest(program=NAMES[lane]):
+                self.assertIsNone(machines.faults[lane])
+                self.assertLaneMatches(machines, lane, chip)
+
+    def test_arithmetic_on_vf(self):
+        # Every 8xyN with x or y = 0xf
+        code = bytearray()
+        for n in (0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0xe):
+            for x, y in ((0xf, 0x1), (0x1, 0xf), (0xf, 0xf)):
+                code += bytes([0x6f, 0xc3, 0x61, 0x7d, 0x80 | x, (y << 4) | n])
+        chip = Chip8Emulator(code)
+        machines = VectorChip8(code)
+        for _ in range(len(code) // 2):
+            chip.run_loop()
+            machines.step()
+            self.assertLaneMatches(machines, 0, chip)
+
+    def test_fault_stops_lane(self):
+        machines = VectorChip8([bytes([0x80, 0x08]), bytes([0x12, 0x00])])
+        machines.run_cycles(5)
+        self.assertIsNotNone(machines.faults[0])
+        self.assertIsNone(machines.faults[1])
+        self.assertEqual(list(machines.cycles), [1, 5])
+
+    def test_partial_writes_before_fault(self):
+        # V0..V2 = 1, 2, 0xfe, I = 0xffe, then save V0..V2, load V0..V2 or BCD of V2,
+        # each running one byte past the end of RAM
+        setup = [0x6001, 0x6102, 0x62fe, 0xaffe]
+        for last in (0xf255, 0xf265, 0xf233):
+            code = b''.join(opcode.to_bytes(2, 'big') for opcode in setup + [last])
+            chip = Chip8Emulator(code)
+            with self.assertRaises(IndexError):
+                chip.run_cycles(len(setup) + 1)
+            machines = VectorChip8(code)
+            machines.run_cycles(len(setup) + 1)
+            self.assertIsNotNone(machines.faults[0])
+            self.assertLaneMatches(machines, 0, chip)
+
+    def test_pc_outside_ram(self):
+        for pc in (0xffe, 0xfff, 0x1000):
+            chip = Chip8Emulator(b'')
+            chip.pc = pc
+            with self.assertRaises(BaseException):
+                chip.run_cycles(1)
+            machines = VectorChip8(b'')
+            machines.pc[0] = pc
+            machines.step()
+            self.assertIsNotNone(machines.faults[0])
+            self.assertEqual(machines.pc[0], chip.pc)
+            self.assertEqual(machines.cycles[0], chip.cycles)
+
+    def test_pluggable_rnd(self):
+        # V3 = rand() & 0x0f
+        machines = VectorChip8(bytes([0xc3, 0x0f]), count=3, rnd=lambda lanes: [0xff, 0x12, 0x00])
+        machines.step()
+        self.assertEqual(list(machines.registers[:, 3]), [0x0f, 0x02, 0x00])
+
+    def test_get_screen(self):
+        # I = font 0, draw at (0, 0)
+        machines = VectorChip8(bytes([0xa0, 0x00, 0xd0, 0x05]), count=2)
+        machines.run_cycles(2)
+        screen = machines.get_screen(1)
+        self.assertEqual(screen.shape, (32, 64))
+        self.assertEqual(list(screen[0, :8]), [1, 1, 1, 1, 0, 0, 0, 0])
+        self.assertEqual(int(np.sum(screen)), 14)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,378 @@
+import numpy as np
+
+from chip8 import Chip8Emulator, HardFaultError
+from prng import XorShift32, seed_state
+
+# Same bit reversal FrameBuffer uses: sprite pixel 0 is bit 7, screen pixel
+# x is bit x of a little endian row.
+_REVERSED = np.array([int(f'{i:08b}'[::-1], 2) for i in range(256)], dtype=np.uint64)
+
+RAM_SIZE = 0x1000
+FRAME_BUFFER = 0xf00
+KEY_BUFFER = 0x50
+
+
+class VectorChip8:
+    """N CHIP-8 machines stepped together as NumPy arrays.
+
+    Every step fetches one opcode per lane, groups the lanes by opcode
+    family and runs each family once for all of its lanes, following
+    Chip8Emulator's handlers statement by statement. A lane that would
+    raise in Chip8Emulator is marked in `faults` and stops executing.
+
+    Cxnn draws from rnd(lanes), which must return one byte per lane. The
+    default runs Chip8Emulator's XorShift32 per lane, so a lane seeded
+    with seeds[lane] matches Chip8Emulator(code, seed=seeds[lane]).
+    """
+    def __init__(self, codes, count=None, rnd=None, seeds=None):
+        if isinstance(codes, (bytes, bytearray)):
+            codes = [codes] * (count or 1)
+        self.count = len(codes)
+        self.screen_width = 64
+        self.screen_height = 32
+
+        self.ram = np.zeros((self.count, RAM_SIZE), dtype=np.uint8)
+        for lane, code in enumerate(codes):
+            self.ram[lane] = np.frombuffer(bytes(Chip8Emulator(code).ram), dtype=np.uint8)
+        self.registers = np.zeros((self.count, 16), dtype=np.uint8)
+        self.I = np.zeros(self.count, dtype=np.int64)
+        self.pc = np.full(self.count, 0x200, dtype=np.int64)
+        self.sp = np.full(self.count, 0xea0, dtype=np.int64)
+        self.delay_count = np.zeros(self.count, dtype=np.int64)
+        self.sound_count = np.zeros(self.count, dtype=np.int64)
+        self.cycles = np.zeros(self.count, dtype=np.int64)
+        self.faults = [None] * self.count
+        self.running = np.ones(self.count, dtype=bool)
+        # Each frame buffer row as one little endian 64-bit word, a view into ram
+        self.screen_rows = self.ram[:, FRAME_BUFFER:].view('<u8')
+
+        if seeds is None:
+            self.rng_state = np.array([XorShift32().state for _ in range(self.count)], dtype=np.uint32)
+        else:
+            self.rng_state = np.array([seed_state(seed) for seed in seeds], dtype=np.uint32)
+        self.rnd = rnd if rnd is not None else self._randbyte
+
+        self.opcode_handler = {
+            0x0: self._clear_or_return,
+            0x1: self._jump,
+            0x2: self._call_subroutine,
+            0x3: self._skip_if_x_equal,
+            0x4: self._skip_if_x_not_equal,
+            0x5: self._skip_if_x_equal_to_y,
+            0x6: self._set_x,
+            0x7: self._add_x,
+            0x8: self._arithmetic,
+            0x9: self._skip_if_x_not_equal_to_y,
+            0xa: self._set_I,
+            0xb: self._jump_with_offset,
+            0xc: self._rnd,
+            0xd: self._draw_sprite,
+            0xe: self._skip_on_key,
+            0xf: self._misc,
+        }
+
+        self.misc_opcode_handler = {
+            0x07: self._set_x_to_delay,
+            0x0a: self._wait_for_key,
+            0x15: self._set_delay,
+            0x18: self._set_sound,
+            0x1e: self._add_to_I,
+            0x29: self._set_I_for_char,
+            0x33: self._binary_coded_decimal,
+            0x55: self._save_x,
+            0x65: self._load_x,
+        }
+
+    def key_down(self, lanes, key):
+        self.ram[lanes, KEY_BUFFER + key // 8] |= np.uint8(1 << (key % 8))
+
+    def key_up(self, lanes, key):
+        self.ram[lanes, KEY_BUFFER + key // 8] &= np.uint8(~(1 << (key % 8)) & 0xff)
+
+    def get_screen(self, lane):
+        """Unpacked 32x64 array of the lane's screen."""
+        screen = self.ram[lane, FRAME_BUFFER:]
+        return np.unpackbits(screen, bitorder='little').reshape(self.screen_height, self.screen_width)
+
+    def tick60Hz(self):
+        np.subtract(self.delay_count, 1, out=self.delay_count, where=self.delay_count > 0)
+        np.subtract(self.sound_count, 1, out=self.sound_count, where=self.sound_count > 0)
+
+    def run_cycles(self, count):
+        for _ in range(count):
+            self.step()
+        return count
+
+    def step(self):
+        lanes = np.flatnonzero(self.running)
+        if len(lanes) == 0:
+            return
+        pc = self.pc[lanes]
+        outside = pc + 1 >= RAM_SIZE
+        if outside.any():
+            # Charged like in the interpreter, which also moves on a PC
+            # that starts inside RAM
+            faulted = lanes[outside]
+            self.cycles[faulted] += 1
+            self.pc[faulted] = np.where(pc[outside] < RAM_SIZE, pc[outside] + 2, pc[outside])
+            self._fault(faulted, 'PC outside of RAM')
+            lanes = lanes[~outside]
+            pc = pc[~outside]
+
+        opcode = (self.ram[lanes, pc].astype(np.int64) << 8) | self.ram[lanes, pc + 1]
+        self.pc[lanes] = pc + 2
+        self.cycles[lanes] += 1
+        family = opcode >> 12
+        for something in np.unique(family):
+            selected = family == something
+            self.opcode_handler[int(something)](lanes[selected], opcode[selected])
+
+    def _randbyte(self, lanes):
+        x = self.rng_state[lanes]
+        x ^= x << 13
+        x ^= x >> 17
+        x ^= x << 5
+        self.rng_state[lanes] = x
+        return x >> 24
+
+    def _fault(self, lanes, msg):
+        for lane in lanes:
+            self.faults[lane] = msg
+        self.running[lanes] = False
+
+    def _pop(self, lanes):
+        self.sp[lanes] -= 2
+        sp = self.sp[lanes]
+        return (self.ram[lanes, sp].astype(np.int64) << 8) | self.ram[lanes, sp + 1]
+
+    def _clear_or_return(self, lanes, opcode):
+        NN = opcode & 0xff
+        clear = lanes[NN == 0xe0]
+        self.ram[clear, FRAME_BUFFER:] = 0
+        ret = lanes[NN == 0xee]
+        self.pc[ret] = self._pop(ret)
+        self._fault(lanes[(NN != 0xe0) & (NN != 0xee)], 'Unknown opcode')
+
+    def _jump(self, lanes, opcode):
+        self.pc[lanes] = opcode & 0xfff
+
+    def _call_subroutine(self, lanes, opcode):
+        sp = self.sp[lanes]
+        overflow = sp + 1 >= RAM_SIZE
+        self._fault(lanes[overflow], 'Stack overflow')
+        lanes, opcode, sp = lanes[~overflow], opcode[~overflow], sp[~overflow]
+        pc = self.pc[lanes]
+        self.ram[lanes, sp] = pc >> 8
+        self.ram[lanes, sp + 1] = pc & 0xff
+        self.sp[lanes] = sp + 2
+        self.pc[lanes] = opcode & 0xfff
+
+    def _skip_if(self, lanes, condition):
+        self.pc[lanes[condition]] += 2
+
+    def _skip_if_x_equal(self, lanes, opcode):
+        self._skip_if(lanes, self.registers[lanes, (opcode >> 8) & 0xf] == (opcode & 0xff))
+
+    def _skip_if_x_not_equal(self, lanes, opcode):
+        self._skip_if(lanes, self.registers[lanes, (opcode >> 8) & 0xf] != (opcode & 0xff))
+
+    def _skip_if_x_equal_to_y(self, lanes, opcode):
+        reg = self.registers
+        self._skip_if(lanes, reg[lanes, (opcode >> 8) & 0xf] == reg[lanes, (opcode >> 4) & 0xf])
+
+    def _skip_if_x_not_equal_to_y(self, lanes, opcode):
+        reg = self.registers
+        self._skip_if(lanes, reg[lanes, (opcode >> 8) & 0xf] != reg[lanes, (opcode >> 4) & 0xf])
+
+    def _set_x(self, lanes, opcode):
+        self.registers[lanes, (opcode >> 8) & 0xf] = opcode & 0xff
+
+    def _add_x(self, lanes, opcode):
+        X = (opcode >> 8) & 0xf
+        self.registers[lanes, X] = (self.registers[lanes, X] + (opcode & 0xff)) & 0xff
+
+    def _arithmetic(self, lanes, opcode):
+        reg = self.registers
+        N = opcode & 0xf
+        for n in np.unique(N):
+            selected = N == n
+            l = lanes[selected]
+            X = (opcode[selected] >> 8) & 0xf
+            Y = (opcode[selected] >> 4) & 0xf
+            # Registers are re-read after VF is written, exactly like the
+            # interpreter, so X or Y being 0xf behaves the same.
+            if n == 0x0:
+                reg[l, X] = reg[l, Y]
+            elif n == 0x1:
+                reg[l, X] = reg[l, X] | reg[l, Y]
+            elif n == 0x2:
+                reg[l, X] = reg[l, X] & reg[l, Y]
+            elif n == 0x3:
+                reg[l, X] = reg[l, X] ^ reg[l, Y]
+            elif n == 0x4:
+                reg[l, 0xf] = reg[l, X].astype(np.int64) + reg[l, Y] > 0xff
+                reg[l, X] = (reg[l, X].astype(np.int64) + reg[l, Y]) & 0xff
+            elif n == 0x5:
+                reg[l, 0xf] = reg[l, X] > reg[l, Y]
+                reg[l, X] = (reg[l, X].astype(np.int64) - reg[l, Y]) & 0xff
+            elif n == 0x6:
+                reg[l, 0xf] = reg[l, X] & 0x01
+                reg[l, Y] = reg[l, Y] >> 1
+            elif n == 0x7:
+                reg[l, 0xf] = reg[l, Y] > reg[l, X]
+                reg[l, Y] = (reg[l, Y].astype(np.int64) - reg[l, X]) & 0xff
+            elif n == 0xe:
+                reg[l, 0xf] = (reg[l, X] & 0xf) != 0
+                reg[l, X] = (reg[l, X].astype(np.int64) << 1) & 0xff
+            else:
+                self._fault(l, f'Invalid data.N({n} in arithmetic')
+
+    def _set_I(self, lanes, opcode):
+        self.I[lanes] = opcode & 0xfff
+
+    def _jump_with_offset(self, lanes, opcode):
+        self.pc[lanes] = (opcode & 0xfff) + self.registers[lanes, 0]
+
+    def _rnd(self, lanes, opcode):
+        values = np.asarray(self.rnd(lanes), dtype=np.int64)
+        self.registers[lanes, (opcode >> 8) & 0xf] = values & (opcode & 0xff)
+
+    def _draw_sprite(self, lanes, opcode):
+        reg = self.registers
+        x = (reg[lanes, (opcode >> 8) & 0xf] % self.screen_width).astype(np.uint64)
+        y = reg[lanes, (opcode >> 4) & 0xf].astype(np.int64)
+        N = opcode & 0xf
+        I = self.I[lanes]
+        collision = np.zeros(len(lanes), dtype=bool)
+        for i in range(int(N.max(initial=0))):
+            address = I + i
+            drawing = (i < N) & (address < RAM_SIZE)
+            if not drawing.any():
+                break
+            line = np.zeros(len(lanes), dtype=np.int64)
+            line[drawing] = self.ram[lanes[drawing], address[drawing]]
+            sprite = _REVERSED[line]
+            bits = (sprite << x) | np.where(x == 0, np.uint64(0), sprite >> (np.uint64(64) - x))
+
+            row = (y + i) % self.screen_height
+            old = self.screen_rows[lanes, row]
+            collision |= (old & bits) != 0
+            self.screen_rows[lanes, row] = old ^ bits
+        reg[lanes, 0xf] = collision
+        self._fault(lanes[I + N > RAM_SIZE], 'sprite runs past the end of RAM')
+
+    def _key_pressed(self, lanes, keys):
+        return (self.ram[lanes, KEY_BUFFER + keys // 8] >> (keys % 8)) & 1 != 0
+
+    def _skip_on_key(self, lanes, opcode):
+        keys = self.registers[lanes, (opcode >> 8) & 0xf].astype(np.int64)
+        pressed = self._key_pressed(lanes, keys)
+        NN = opcode & 0xff
+        self._skip_if(lanes, ((NN == 0x9e) & pressed) | ((NN == 0xa1) & ~pressed))
+
+    def _misc(self, lanes, opcode):
+        NN = opcode & 0xff
+        for nn in np.unique(NN):
+            selected = NN == nn
+            if int(nn) in self.misc_opcode_handler:
+                self.misc_opcode_handler[int(nn)](lanes[selected], (opcode[selected] >> 8) & 0xf)
+            else:
+                self._fault(lanes[selected], f'Unknow misc opcode, data.NN = {nn}')
+
+    def _set_x_to_delay(self, lanes, X):
+        self.registers[lanes, X] = self.delay_count[lanes]
+
+    def _wait_for_key(self, lanes, X):
+        keys = self.ram[lanes, KEY_BUFFER].astype(np.int64) | (self.ram[lanes, KEY_BUFFER + 1].astype(np.int64) << 8)
+        found = keys != 0
+        # Index of the lowest pressed key
+        lowest = keys & -keys
+        self.registers[lanes[found], X[found]] = np.log2(lowest[found]).astype(np.int64)
+        self.pc[lanes[~found]] -= 2
+
+    def _set_delay(self, lanes, X):
+        self.delay_count[lanes] = self.registers[lanes, X]
+
+    def _set_sound(self, lanes, X):
+        self.sound_count[lanes] = self.registers[lanes, X]
+
+    def _add_to_I(self, lanes, X):
+        self.I[lanes] += self.registers[lanes, X]
+
+    def _set_I_for_char(self, lanes, X):
+        self.I[lanes] = self.registers[lanes, X].astype(np.int64) * 5
+
+    def _fault_past_ram(self, lanes, length):
+        # Like the interpreter, whatever fits in RAM has been done by then
+        self._fault(lanes[self.I[lanes] + length > RAM_SIZE], 'bytearray index out of range')
+
+    def _binary_coded_decimal(self, lanes, X):
+        value = self.registers[lanes, X]
+        I = self.I[lanes]
+        for i, digit in enumerate(((value // 100) % 10, (value // 10) % 10, value % 10)):
+            selected = I + i < RAM_SIZE
+            self.ram[lanes[selected], I[selected] + i] = digit[selected]
+        self._fault_past_ram(lanes, 3)
+
+    def _save_x(self, lanes, X):
+        I = self.I[lanes]
+        for i in range(16):
+            selected = (X >= i) & (I + i < RAM_SIZE)
+            self.ram[lanes[selected], I[selected] + i] = self.registers[lanes[selected], i]
+        self._fault_past_ram(lanes, X + 1)
+
+    def _load_x(self, lanes, X):
+        I = self.I[lanes]
+        for i in range(16):
+            selected = (X >= i) & (I + i < RAM_SIZE)
+            self.registers[lanes[selected], i] = self.ram[lanes[selected], I[selected] + i]
+        self._fault_past_ram(lanes, X + 1)
+
+
+def _lane_value(name):
+    return property(lambda self: int(getattr(self.machines, name)[0]))
+
+
+class VectorLane:
+    """A single VectorChip8 lane behind Chip8Emulator's interface, for the fuzzer.
+
+    Faults raise HardFaultError and, as with the interpreter, running again
+    carries on after the faulting instruction.
+    """
+    def __init__(self, code, seed=None):
+        self.machines = VectorChip8([code], seeds=None if seed is None else [seed])
+
+    def run_cycles(self, count):
+        machines = self.machines
+        for _ in range(count):
+            machines.step()
+            if machines.faults[0] is not None:
+                msg = machines.faults[0]
+                machines.faults[0] = None
+                machines.running[0] = True
+                raise HardFaultError(msg)
+        return count
+
+    def tick60Hz(self):
+        self.machines.tick60Hz()
+
+    def key_down(self, key):
+        self.machines.key_down([0], key)
+
+    def key_up(self, key):
+        self.machines.key_up([0], key)
+
+    pc = _lane_value('pc')
+    I = _lane_value('I')
+    sp = _lane_value('sp')
+    cycles = _lane_value('cycles')
+    delay_count = _lane_value('delay_count')
+    sound_count = _lane_value('sound_count')
+
+    @property
+    def registers(self):
+        return bytes(self.machines.registers[0])
+
+    @property
+    def ram(self):
+        return bytes(self.machines.ram[0])